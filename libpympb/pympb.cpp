@@ -2137,6 +2137,28 @@ void mode_solver::set_eigenvectors(int b_start, std::complex<mpb_real> *cdata, i
   curfield_reset();
 }
 
+/* Hash (FNV-1a) of the inverse dielectric (and permeability) data of the
+   current init(), which identifies the structure that eigenvectors were
+   computed for, e.g. for reusing them as a starting guess. */
+static size_t hash_bytes(size_t h, const void *data, size_t n) {
+  const unsigned char *bytes = (const unsigned char *)data;
+  for (size_t i = 0; i < n; ++i)
+    h = (h ^ bytes[i]) * (size_t)1099511628211ULL;
+  return h;
+}
+
+size_t mode_solver::get_dielectric_hash() {
+  size_t h = (size_t)14695981039346656037ULL;
+  if (!mdata) return h;
+  int dims[3] = {mdata->nx, mdata->ny, mdata->nz};
+  h = hash_bytes(h, dims, sizeof(dims));
+  if (mdata->eps_inv)
+    h = hash_bytes(h, mdata->eps_inv, mdata->fft_output_size * sizeof(symmetric_matrix));
+  if (mdata->mu_inv)
+    h = hash_bytes(h, mdata->mu_inv, mdata->fft_output_size * sizeof(symmetric_matrix));
+  return h;
+}
+
 double mode_solver::get_eigensolver_flops() { return eigensolver_flops; }
 
 int mode_solver::get_iterations() { return iterations; }
@@ -147,6 +147,7 @@ struct mode_solver {
   void get_eigenvectors(int p_start, int p, std::complex<mpb_real> *cdata, int size);
   std::vector<int> get_eigenvectors_slice_dims(int num_bands);
   void set_eigenvectors(int b_start, std::complex<mpb_real> *cdata, int size);
+  size_t get_dielectric_hash();
 
   std::vector<mpb_real> compute_field_energy();
   double compute_energy_in_objects(geometric_object_list objects);
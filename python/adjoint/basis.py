@@ -96,12 +96,41 @@ class BilinearInterpolationBasis(Basis):
             self.rho_vector = np.ones((self.num_design_params, ))
 
     def __call__(self, p):
-        x = 2 * self.volume.center.x - p.x if self.mirror_X and p.x < self.volume.center.x else p.x
-        y = 2 * self.volume.center.y - p.y if self.mirror_Y and p.y < self.volume.center.y else p.y
+        '''
+        Evaluates the basis at the point p. The x and y coordinates of p can
+        also be arrays (of the same shape), to evaluate many points at once.
+        '''
+        x, y = self.mirror_points(np.asarray(p.x, dtype=np.float64),
+                                  np.asarray(p.y, dtype=np.float64))
+        A = self.get_bilinear_matrix(x.ravel(), y.ravel(), self.rho_x,
+                                     self.rho_y)  # ignore z coordinate
+        rho = A @ self.rho_vector
+        return rho[0] if x.ndim == 0 else rho.reshape(x.shape)
+
+    def interpolate(self, design_grid):
+        '''
+        Evaluates the basis at all points of the design grid (an object with
+        x and y coordinate arrays, e.g. from get_array_metadata) at once with
+        the cached interpolation matrix, returning an [Nx,Ny] array.
+        '''
+        x_grid, y_grid = self.mirror_points(
+            np.asarray(design_grid.x, dtype=np.float64),
+            np.asarray(design_grid.y, dtype=np.float64))
+        A = self.get_interpolation_matrix(x_grid, y_grid)
+        return (A @ self.rho_vector).reshape(x_grid.size, y_grid.size)
 
-        weights, interp_idx = self.get_bilinear_row(
-            x, y, self.rho_x, self.rho_y)  # ignore z coordinate
-        return np.dot(self.rho_vector[interp_idx], weights)
+    def mirror_points(self, x, y):
+        '''
+        Maps the coordinates x and y onto the half of the design region
+        covered by the basis, for mirror symmetries.
+        '''
+        if self.mirror_X:
+            x = np.where(x < self.volume.center.x,
+                         2 * self.volume.center.x - x, x)
+        if self.mirror_Y:
+            y = np.where(y < self.volume.center.y,
+                         2 * self.volume.center.y - y, y)
+        return x, y
 
     def get_basis_vjp(self, dJ_deps, design_grid):
         ''' get vector jacobian product of interpolator'''
@@ -109,7 +138,6 @@ class BilinearInterpolationBasis(Basis):
         dg_Nx, dg_Ny, Nz, Nf = dJ_deps.shape  # get important design grid dimensions
         x_grid = design_grid.x
         y_grid = design_grid.y
-        z_grid = design_grid.z
 
         # take care of symmetries
         if self.mirror_X:
@@ -120,24 +148,34 @@ class BilinearInterpolationBasis(Basis):
             y_grid = y_grid[int(dg_Ny / 2):]
 
         dg_Nx, dg_Ny, Nz, Nf = dJ_deps.shape  # recalculate
-        Nx, Ny = self.rho_x.size, self.rho_y.size  # get important interpolator dimensions
-
-        # same interpolation matrix for all frequencies and all coordinates in Z direction
-        A = self.gen_interpolation_matrix(self.rho_x, self.rho_y, x_grid,
-                                          y_grid, z_grid)
-        # TODO ditch the for loops
-        dJ_dp = np.zeros((Nx * Ny, Nf))
-        for fi in range(Nf):
-            for zi in range(Nz):
-                dJ_dp[:, fi] += np.matmul(
-                    dJ_deps[:, :, zi, fi].reshape(dg_Nx * dg_Ny, order='C'), A)
-        return dJ_dp
+
+        # same interpolation matrix for all frequencies and all coordinates in Z direction,
+        # so all of them are handled by a single sparse matrix product
+        A = self.get_interpolation_matrix(x_grid, y_grid)
+        dJ_dp = A.T @ dJ_deps.reshape(dg_Nx * dg_Ny, Nz * Nf)
+        return dJ_dp.reshape(-1, Nz, Nf).sum(axis=1)
+
+    def get_interpolation_matrix(self, rho_x_interp, rho_y_interp):
+        '''
+        Returns the interpolation matrix from the basis to the grid given by
+        rho_x_interp and rho_y_interp, which is cached for the most recent grid
+        (the design grid normally stays the same between optimization steps).
+        '''
+        rho_x_interp = np.asarray(rho_x_interp, dtype=np.float64)
+        rho_y_interp = np.asarray(rho_y_interp, dtype=np.float64)
+        key = (rho_x_interp.tobytes(), rho_y_interp.tobytes())
+        if getattr(self, '_interpolation_cache', (None, ))[0] != key:
+            A = self.gen_interpolation_matrix(self.rho_x, self.rho_y,
+                                              rho_x_interp, rho_y_interp, None)
+            self._interpolation_cache = (key, A)
+        return self._interpolation_cache[1]
 
     def get_bilinear_coefficients(self, x, x1, x2, y, y1, y2):
         '''
         Calculates the bilinear interpolation coefficients for a single point at (x,y).
         Assumes that the user already knows the four closest points and provides the corresponding
-        (x1,x2) and(y1,y2) coordinates.
+        (x1,x2) and(y1,y2) coordinates. All of the arguments can also be arrays,
+        for the coefficients of many points at once.
         '''
         b11 = ((x - x2) * (y - y2)) / ((x1 - x2) * (y1 - y2))
         b12 = -((x - x2) * (y - y1)) / ((x1 - x2) * (y1 - y2))
@@ -149,51 +187,48 @@ class BilinearInterpolationBasis(Basis):
         '''
         Calculates a vector of bilinear interpolation weights that can be used
         in an inner product with the neighboring function values, or placed
-        inside of an interpolation matrix.
+        inside of an interpolation matrix. If rx and ry are arrays (of the same
+        shape), the weights and indices of all the points are returned as
+        arrays with an additional last dimension of length 4.
         '''
 
         Nx = rho_x.size
         Ny = rho_y.size
 
-        # binary search in x direction to get x1 and x2
-        xi2 = np.searchsorted(rho_x, rx, side='left')
-        if xi2 <= 0:  # extrapolation (be careful!)
-            xi1 = 0
-            xi2 = 1
-        elif xi2 >= Nx - 1:  # extrapolation (be careful!)
-            xi1 = Nx - 2
-            xi2 = Nx - 1
-        else:
-            xi1 = xi2 - 1
-
-        x1 = rho_x[xi1]
-        x2 = rho_x[xi2]
-
-        # binary search in y direction to get y1 and y2
-        yi2 = np.searchsorted(rho_y, ry, side='left')
-        if yi2 <= 0:  # extrapolation (be careful!)
-            yi1 = 0
-            yi2 = 1
-        elif yi2 >= Ny - 1:  # extrapolation (be careful!)
-            yi1 = Ny - 2
-            yi2 = Ny - 1
-        else:
-            yi1 = yi2 - 1
-
-        y1 = rho_y[yi1]
-        y2 = rho_y[yi2]
+        # binary search in x and y directions to get x1, x2 and y1, y2
+        # (extrapolating from the first/last two points outside the grid -- be careful!)
+        xi2 = np.clip(np.searchsorted(rho_x, rx, side='left'), 1, Nx - 1)
+        xi1 = xi2 - 1
+        yi2 = np.clip(np.searchsorted(rho_y, ry, side='left'), 1, Ny - 1)
+        yi1 = yi2 - 1
 
         # get weights
-        weights = self.get_bilinear_coefficients(rx, x1, x2, ry, y1, y2)
+        weights = np.stack(self.get_bilinear_coefficients(
+            rx, rho_x[xi1], rho_x[xi2], ry, rho_y[yi1], rho_y[yi2]), axis=-1)
 
         # get location of nearest neigbor interpolation points
-        interp_idx = np.array([
-            xi1 * Ny + yi1, xi1 * Ny + yi2, (xi2) * Ny + yi1, (xi2) * Ny + yi2
-        ],
-                              dtype=np.int64)
+        interp_idx = np.stack([
+            xi1 * Ny + yi1, xi1 * Ny + yi2, xi2 * Ny + yi1, xi2 * Ny + yi2
+        ], axis=-1).astype(np.int64)
 
         return weights, interp_idx
 
+    def get_bilinear_matrix(self, rx, ry, rho_x, rho_y):
+        '''
+        Returns the sparse matrix of the bilinear interpolation weights from
+        the basis grid (rho_x,rho_y) to the points (rx,ry), one row per point.
+        '''
+        weights, interp_idx = self.get_bilinear_row(rx, ry, rho_x, rho_y)
+
+        # each row has 4 entries, so the CSR matrix can be built directly
+        A = sparse.csr_matrix(
+            (weights.ravel(), interp_idx.ravel(),
+             np.arange(0, 4 * rx.size + 1, 4)),
+            shape=(rx.size, rho_x.size * rho_y.size))
+        A.sum_duplicates()
+
+        return A
+
     def gen_interpolation_matrix(
         self,
         rho_x,
@@ -215,36 +250,11 @@ class BilinearInterpolationBasis(Basis):
         A .................... [N,M] sparse matrix - interpolation matrix
         '''
 
-        Nx = rho_x.size
-        Ny = rho_y.size
-        Nx_interp = np.array(rho_x_interp).size
-        Ny_interp = np.array(rho_y_interp).size
-        Nz_interp = np.array(rho_y_interp).size
-
-        input_dimension = Nx * Ny
-        output_dimension = Nx_interp * Ny_interp
-
-        interp_weights = np.zeros(4 * output_dimension)
-        row_ind = np.zeros(4 * output_dimension, dtype=np.int64)
-        col_ind = np.zeros(4 * output_dimension, dtype=np.int64)
-
-        ri = 0
-        for rx in rho_x_interp:
-            for ry in rho_y_interp:
-                # get weights
-                weights, interp_idx = self.get_bilinear_row(
-                    rx, ry, rho_x, rho_y)
-
-                # populate sparse matrix vectors
-                interp_weights[4 * ri:4 * (ri + 1)] = weights
-                row_ind[4 * ri:4 * (ri + 1)] = np.array([ri, ri, ri, ri],
-                                                        dtype=np.int64)
-                col_ind[4 * ri:4 * (ri + 1)] = interp_idx
-
-                ri += 1
-
-        # From matrix vectors, populate the sparse matrix
-        A = sparse.coo_matrix((interp_weights, (row_ind, col_ind)),
-                              shape=(output_dimension, input_dimension))
+        rho_x_interp = np.asarray(rho_x_interp, dtype=np.float64).ravel()
+        rho_y_interp = np.asarray(rho_y_interp, dtype=np.float64).ravel()
+
+        # all the points of the (row-major) interpolation grid at once
+        rx, ry = np.meshgrid(rho_x_interp, rho_y_interp, indexing='ij')
+        A = self.get_bilinear_matrix(rx.ravel(), ry.ravel(), rho_x, rho_y)
 
         return A
@@ -16,10 +16,14 @@ class ObjectiveQuantity(abc.ABC):
         frequencies: the frequencies at which the objective quantity is evaluated.
         num_freq: the number of frequencies at which the objective quantity is evaluated.
     """
+    # attributes set by the forward run that place_adjoint_source depends on
+    _forward_attributes = ('_eval', )
+
     def __init__(self, sim):
         self.sim = sim
         self._eval = None
         self._frequencies = None
+        self._forward_time = None
 
     @property
     def frequencies(self):
@@ -41,6 +45,25 @@ class ObjectiveQuantity(abc.ABC):
     def place_adjoint_source(self, dJ):
         """Places appropriate sources for the adjoint simulation."""
 
+    def adjoint_frequencies(self, dJ):
+        """Frequencies at which the adjoint source for dJ is nonzero.
+
+        Returns a boolean array of length num_freq. Objective quantities that
+        do not know how dJ depends on the frequencies assume all of them.
+        """
+        return np.ones(self.num_freq, dtype=bool)
+
+    def get_forward_state(self):
+        """Returns the results of the forward run that the adjoint source depends on."""
+        state = {a: getattr(self, a) for a in self._forward_attributes}
+        state['_forward_time'] = self.sim.meep_time()
+        return state
+
+    def set_forward_state(self, state):
+        """Restores the results of a forward run returned by get_forward_state."""
+        for a, v in state.items():
+            setattr(self, a, v)
+
     def get_evaluation(self):
         """Evaluates the objective quantity."""
         if self._eval:
@@ -52,7 +75,10 @@ class ObjectiveQuantity(abc.ABC):
 
     def _adj_src_scale(self, include_resolution=True):
         """Calculates the scale for the adjoint sources."""
-        T = self.sim.meep_time()
+        # the duration of the forward run, which is restored with its results
+        T = self._forward_time
+        if T is None:
+            T = self.sim.meep_time()
         dt = self.sim.fields.dt
         src = self._create_time_profile()
 
@@ -111,6 +137,8 @@ class ObjectiveQuantity(abc.ABC):
 
 
 class EigenmodeCoefficient(ObjectiveQuantity):
+    _forward_attributes = ('_eval', '_cscale')
+
     def __init__(self,
                  sim,
                  volume,
@@ -183,6 +211,12 @@ class EigenmodeCoefficient(ObjectiveQuantity):
         )
         return [source]
 
+    def adjoint_frequencies(self, dJ):
+        dJ = np.atleast_1d(dJ)
+        if dJ.ndim == 2:
+            dJ = np.sum(dJ, axis=1)
+        return np.broadcast_to(dJ != 0, (self.num_freq, ))
+
     def __call__(self):
         direction = mp.NO_DIRECTION if self.kpoint_func else mp.AUTOMATIC
         ob = self.sim.get_eigenmode_coefficients(
@@ -199,6 +233,8 @@ class EigenmodeCoefficient(ObjectiveQuantity):
 
 
 class FourierFields(ObjectiveQuantity):
+    _forward_attributes = ('_eval', '_dg')
+
     def __init__(self, sim, volume, component):
         super().__init__(sim)
         self.volume = volume
@@ -222,23 +258,7 @@ class FourierFields(ObjectiveQuantity):
         x_dim, y_dim, z_dim = len(self._dg.x), len(self._dg.y), len(self._dg.z)
 
         if self.num_freq == 1:
-            amp = -dJ[0].copy().reshape(x_dim, y_dim, z_dim) * scale
-            if self.component in [mp.Hx, mp.Hy, mp.Hz]:
-                amp = -amp
-            for zi in range(z_dim):
-                for yi in range(y_dim):
-                    for xi in range(x_dim):
-                        if amp[xi, yi, zi] != 0:
-                            sources += [
-                                mp.Source(
-                                    time_src,
-                                    component=self.component,
-                                    amplitude=amp[xi, yi, zi],
-                                    center=mp.Vector3(self._dg.x[xi],
-                                                      self._dg.y[yi],
-                                                      self._dg.z[zi]),
-                                )
-                            ]
+            amp = -np.reshape(dJ[0], (x_dim, y_dim, z_dim, 1)) * scale
         else:
             '''The adjoint solver requires the objective function
             to be scalar valued with regard to objective arguments
@@ -252,41 +272,54 @@ class FourierFields(ObjectiveQuantity):
             dJ = np.sum(
                 dJ,
                 axis=1)  # sum along first dimension bc Jacobian is always diag
-            dJ_4d = np.array([
-                dJ[f].copy().reshape(x_dim, y_dim, z_dim)
-                for f in range(self.num_freq)
-            ])
-            if self.component in [mp.Hx, mp.Hy, mp.Hz]:
-                dJ_4d = -dJ_4d
-            for zi in range(z_dim):
-                for yi in range(y_dim):
-                    for xi in range(x_dim):
-                        '''We only need to add a current source if the
-                        jacobian is nonzero for all frequencies at 
-                        that particular point. Otherwise, the fitting
-                        algorithm is going to fail.
-                        '''
-                        if not np.all((dJ_4d[:, xi, yi, zi] == 0)):
-                            final_scale = -dJ_4d[:, xi, yi, zi] * scale
-                            src = FilteredSource(
-                                time_src.frequency,
-                                self._frequencies,
-                                final_scale,
-                                self.sim.fields.dt,
-                            )
-                            sources += [
-                                mp.Source(
-                                    src,
-                                    component=self.component,
-                                    amplitude=1,
-                                    center=mp.Vector3(self._dg.x[xi],
-                                                      self._dg.y[yi],
-                                                      self._dg.z[zi]),
-                                )
-                            ]
+            amp = -np.moveaxis(
+                np.reshape(dJ, (self.num_freq, x_dim, y_dim, z_dim)), 0,
+                -1) * scale
+        if self.component in [mp.Hx, mp.Hy, mp.Hz]:
+            amp = -amp
+
+        # We only need a current source at the points where the jacobian
+        # is nonzero for some frequency (otherwise the fitting algorithm
+        # of the FilteredSource fails), and all of those point sources are
+        # merged into a single source per chunk.
+        X, Y, Z = np.meshgrid(self._dg.x, self._dg.y, self._dg.z, indexing='ij')
+        nonzero = np.any(amp != 0, axis=-1)
+        pts = np.column_stack((X[nonzero], Y[nonzero], Z[nonzero]))
+        amp = np.asarray(amp[nonzero], dtype=np.complex128)
+        if amp.shape[0] == 0:
+            return sources
+
+        if self.num_freq == 1:
+            time_srcs = [time_src]
+        else:
+            src = FilteredSource(
+                time_src.frequency,
+                self._frequencies,
+                amp,
+                self.sim.fields.dt,
+            )
+            time_srcs = src.time_src_bf
+            amp = np.ascontiguousarray(src.nodes.T, dtype=np.complex128)
+
+        all_srcdata = self.sim.fields.point_sourcedata(
+            self.component, np.ascontiguousarray(pts.flatten()), pts.shape[0],
+            amp.flatten(), len(time_srcs))
+        for src_data in all_srcdata:
+            amp_arr = np.ascontiguousarray(
+                np.reshape(src_data.amp_arr, (-1, len(time_srcs))).T)
+            sources += [
+                mp.IndexedSource(time_srcs[i], src_data, amp_arr[i])
+                for i in range(len(time_srcs))
+            ]
 
         return sources
 
+    def adjoint_frequencies(self, dJ):
+        if self.num_freq == 1:
+            return np.array([np.any(dJ)])
+        dJ = np.reshape(np.sum(dJ, axis=1), (self.num_freq, -1))
+        return np.any(dJ != 0, axis=1)
+
     def __call__(self):
         self._dg = Grid(*self.sim.get_array_metadata(dft_cell=self._monitor))
         self._eval = np.array([
@@ -354,6 +387,12 @@ class Near2FarFields(ObjectiveQuantity):
 
         return sources
 
+    def adjoint_frequencies(self, dJ):
+        if dJ.ndim == 4:
+            dJ = np.sum(dJ, axis=0)
+        dJ = np.reshape(dJ, (self._nfar_pts, self.num_freq, -1))
+        return np.any(dJ != 0, axis=(0, 2))
+
     def __call__(self):
         self._eval = np.array([
             self.sim.get_farfield(self._monitor, far_pt)
@@ -1,12 +1,37 @@
+import hashlib
+import os
+import pickle
 import meep as mp
 import numpy as np
 from autograd import grad, jacobian
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 
 Grid = namedtuple('Grid', ['x', 'y', 'z', 'w'])
 YeeDims = namedtuple('YeeDims', ['Ex', 'Ey', 'Ez'])
 
 
+class DesignFields(list):
+    """The arrays of the field components of a design region, which are
+    consecutive views into the 1d array buffer (in the order of the list).
+    """
+    def __init__(self, buffer, arrays):
+        super(DesignFields, self).__init__(arrays)
+        self.buffer = buffer
+
+
+def flat_fields(fields):
+    """Concatenate the flattened arrays of a list of field components.
+
+    The buffer of a DesignFields, which already holds its arrays one after
+    the other, is returned without copying. A single array is just flattened.
+    """
+    if isinstance(fields, np.ndarray):
+        return fields.ravel()
+    if isinstance(fields, DesignFields):
+        return fields.buffer
+    return np.concatenate([np.ravel(f) for f in fields])
+
+
 class DesignRegion(object):
     def __init__(
             self,
@@ -27,11 +52,8 @@ class DesignRegion(object):
         self.design_parameters.update_weights(design_parameters)
 
     def get_gradient(self, sim, fields_a, fields_f, frequencies):
-        for c in range(3):
-            fields_a[c] = fields_a[c].flatten(order='C')
-            fields_f[c] = fields_f[c].flatten(order='C')
-        fields_a = np.concatenate(fields_a)
-        fields_f = np.concatenate(fields_f)
+        fields_a = flat_fields(fields_a)
+        fields_f = flat_fields(fields_f)
         num_freqs = np.array(frequencies).size
 
         grad = np.zeros((num_freqs, self.num_design_params))  # preallocate
@@ -45,6 +67,80 @@ class DesignRegion(object):
 
         return np.squeeze(grad).T
 
+    def get_gradient_from_chunks(self, sim, fields_a, fields_f, dft_fields,
+                                 frequencies):
+        """As get_gradient, but with the fields given by the process-local data
+        of the DFT chunks of dft_fields (see local_dft_data), so that no process
+        stores the fields of the whole design region.
+        """
+        num_freqs = np.array(frequencies).size
+
+        grad = np.zeros((num_freqs, self.num_design_params))  # preallocate
+
+        geom_list = sim.geometry
+        vol = sim._fit_volume_to_simulation(self.volume)
+        # compute the gradient, summed over all of the processes
+        mp._get_gradient_chunks(grad, fields_a, fields_f, dft_fields.chunks,
+                                vol, np.array(frequencies), geom_list)
+
+        return np.squeeze(grad).T
+
+
+def local_dft_data(dft_fields, out=None):
+    """The DFT data of the chunks of dft_fields owned by this process, as a 1d
+    array with the frequency index varying fastest. The data is written to out
+    if it is given.
+    """
+    n = mp._get_local_dft_data_size(dft_fields.chunks)
+    if out is None:
+        out = np.zeros(n, dtype=np.complex128)
+    mp._get_local_dft_data(dft_fields.chunks, out)
+    return out
+
+
+class ForwardCache(object):
+    """Least-recently-used cache of forward-run results keyed by the design.
+
+    At most size entries are kept in memory. If directory is given, the
+    entries evicted from memory are pickled there instead of discarded,
+    and loaded back when they are requested again.
+    """
+    def __init__(self, size=1, directory=None):
+        self.size = size
+        self.directory = directory
+        self._entries = OrderedDict()
+        if directory is not None:
+            if mp.am_master():
+                os.makedirs(directory, exist_ok=True)
+            mp.all_wait()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self.directory is not None and os.path.isfile(self._path(key)):
+            with open(self._path(key), 'rb') as f:
+                entry = pickle.load(f)
+            self.put(key, entry)
+            return entry
+        return None
+
+    def put(self, key, entry):
+        if self.size <= 0 and self.directory is None:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            old_key, old_entry = self._entries.popitem(last=False)
+            if self.directory is not None:
+                if mp.am_master():
+                    with open(self._path(old_key), 'wb') as f:
+                        pickle.dump(old_entry, f)
+                mp.all_wait()
+
 
 class OptimizationProblem(object):
     """Top-level class in the MEEP adjoint module.
@@ -74,6 +170,11 @@ class OptimizationProblem(object):
         decay_by=1e-6,
         minimum_run_time=0,
         maximum_run_time=None,
+        batch_adjoint_runs=True,
+        num_adjoint_groups=1,
+        forward_cache_size=1,
+        forward_cache_dir=None,
+        distributed_gradient=False,
     ):
 
         self.sim = simulation
@@ -131,9 +232,29 @@ class OptimizationProblem(object):
         self.minimum_run_time = minimum_run_time
         self.maximum_run_time = maximum_run_time
 
+        # objectives whose adjoint sources occupy disjoint frequencies share
+        # an adjoint run, and the remaining adjoint runs can be distributed
+        # over groups of processes as in mp.divide_parallel_processes
+        self.batch_adjoint_runs = batch_adjoint_runs
+        self.num_adjoint_groups = num_adjoint_groups
+
+        # results of the forward runs (with the forward fields of the design
+        # regions, and gradients) for the most recently evaluated designs, so
+        # that repeated evaluations are not re-simulated
+        self.forward_cache = ForwardCache(forward_cache_size, forward_cache_dir)
+        self._forward_key = None
+
+        # keep only the DFT data of the design regions owned by each process,
+        # rather than the fields of the whole design regions, and reduce the
+        # gradient over the processes (not compatible with num_adjoint_groups)
+        self.distributed_gradient = distributed_gradient
+
         # store sources for finite difference estimations
         self.forward_sources = self.sim.sources
 
+        # design weights with which the structure of self.sim was last initialized
+        self._structure_weights = None
+
         # The optimizer has three allowable states : "INIT", "FWD", and "ADJ".
         #    INIT - The optimizer is initialized and ready to run a forward simulation
         #    FWD  - The optimizer has already run a forward simulation
@@ -148,6 +269,23 @@ class OptimizationProblem(object):
         if rho_vector:
             self.update_design(rho_vector=rho_vector)
 
+        # Reuse the results of an earlier evaluation of the same design
+        if self.current_state == "INIT" and (need_value or need_gradient):
+            key = self._design_key()
+            cached = self.forward_cache.get(key)
+            if cached is not None and (not need_gradient
+                                       or cached['gradient'] is not None):
+                # the gradient is None if it was not computed for this design
+                self.f0 = cached['f0']
+                self.results_list = cached['results_list']
+                self.gradient = cached['gradient']
+                self.f_bank.append(self.f0)
+                return self.f0, self.gradient
+            if cached is not None and cached.get('d_E') is not None:
+                # only the adjoint runs are needed for the gradient, with the
+                # forward fields of the design regions from the cache
+                self._restore_forward_run(key, cached)
+
         # Run forward run if requested
         if need_value and self.current_state == "INIT":
             print("Starting forward run...")
@@ -190,14 +328,103 @@ class OptimizationProblem(object):
             return fq
 
         def _df(x=None):
-            (_, df) = self.__call__(need_value=False)
+            (_, df) = self.__call__(rho_vector=x, need_value=False)
             return df
 
         return _f, _df
 
+    def _allocate_design_fields(self):
+        """Zero Ex, Ey, Ez arrays of shape (nf, nx, ny, nz) for every design region.
+
+        The arrays of each design region are a DesignFields, which
+        Simulation.get_dft_arrays fills in place. With distributed_gradient,
+        the fields of each design region are instead a 1d array shaped as the
+        local DFT data of the forward run.
+        """
+        if self.distributed_gradient:
+            return [np.zeros_like(d) for d in self.d_E]
+        fields = []
+        for dg in self.design_grids:
+            shapes = [(self.nf, c[0], c[1], c[2]) for c in dg]
+            sizes = [int(np.prod(shape)) for shape in shapes]
+            buf = np.zeros(sum(sizes), dtype=np.complex128)
+            offsets = np.cumsum([0] + sizes)
+            fields.append(
+                DesignFields(buf, [
+                    buf[offsets[i]:offsets[i + 1]].reshape(shape)
+                    for i, shape in enumerate(shapes)
+                ]))
+        return fields
+
+    def _get_design_fields(self, fields):
+        """Fill fields (as allocated by _allocate_design_fields) from the design region monitors."""
+        for nb, dgm in enumerate(self.design_region_monitors):
+            if self.distributed_gradient:
+                local_dft_data(dgm, out=fields[nb])
+            else:
+                self.sim.get_dft_arrays(dgm, [mp.Ex, mp.Ey, mp.Ez],
+                                        out=fields[nb])
+
+    def _design_key(self):
+        """Hash of the design variables, used as the key of the forward cache."""
+        h = hashlib.sha1()
+        for dr in self.design_regions:
+            dp = dr.design_parameters
+            h.update(
+                np.ascontiguousarray(dp.weights, dtype=np.float64).tobytes())
+            h.update(
+                repr((getattr(dp, 'beta', None),
+                      getattr(dp, 'eta', None))).encode())
+        return h.hexdigest()
+
+    def _reset_sim(self):
+        """Reset the fields, keeping the structure if possible.
+
+        Only the design regions whose weights changed since the structure
+        was initialized are re-voxelized, via Simulation.update_materials.
+        The structure is re-initialized from scratch if the volume covered
+        by a changed MaterialGrid is not known.
+        """
+        weights = [
+            np.copy(dr.design_parameters.weights) for dr in self.design_regions
+        ]
+        if self.sim.structure is not None and self._structure_weights is None:
+            self.sim.reset_meep()
+        else:
+            self.sim._reset_fields()
+            if self.sim.structure is not None:
+                changed = [
+                    dr for dr, w0, w in zip(self.design_regions,
+                                            self._structure_weights, weights)
+                    if not np.array_equal(w0, w)
+                ]
+                volumes = [self._design_volumes(dr) for dr in changed]
+                if any(v is None for v in volumes):
+                    self.sim.reset_meep()
+                else:
+                    for vol in [v for vs in volumes for v in vs]:
+                        self.sim.update_materials(vol)
+        self._structure_weights = weights
+
+    def _design_volumes(self, design_region):
+        """Volumes covered by the MaterialGrid of a design region, or None if unknown."""
+        mg = design_region.design_parameters
+        if self.sim.default_material is mg:
+            return None
+        volumes = [design_region.volume]
+        for g in self.sim.geometry:
+            if g.material is mg:
+                if not isinstance(g, mp.Block) or (
+                        g.e1, g.e2, g.e3) != (mp.Vector3(1, 0, 0),
+                                              mp.Vector3(0, 1, 0),
+                                              mp.Vector3(0, 0, 1)):
+                    return None
+                volumes.append(mp.Volume(center=g.center, size=g.size))
+        return volumes
+
     def prepare_forward_run(self):
         # prepare forward run
-        self.sim.reset_meep()
+        self._reset_sim()
 
         # add forward sources
         self.sim.change_sources(self.forward_sources)
@@ -227,6 +454,23 @@ class OptimizationProblem(object):
             ]
             self.design_grids += [YeeDims(*s)]
 
+    def _restore_forward_run(self, key, cached):
+        """Set up the state after a forward run of the design with the given
+        key from its forward cache entry, without running the simulation.
+        """
+        # the monitors of the objective quantities are set up as for a
+        # forward run, since their adjoint sources are placed with them
+        self.prepare_forward_run()
+        self.sim.init_sim()
+
+        self.f0 = cached['f0']
+        self.results_list = cached['results_list']
+        self.forward_states = cached['forward_states']
+        self.d_E = cached['d_E']
+        self.f_bank.append(self.f0)
+        self._forward_key = key
+        self.current_state = "FWD"
+
     def forward_run(self):
         # set up monitors
         self.prepare_forward_run()
@@ -248,6 +492,9 @@ class OptimizationProblem(object):
         self.results_list = []
         for m in self.objective_arguments:
             self.results_list.append(m())
+        self.forward_states = [
+            m.get_forward_state() for m in self.objective_arguments
+        ]
 
         # evaluate objectives
         self.f0 = [fi(*self.results_list) for fi in self.objective_functions]
@@ -255,26 +502,42 @@ class OptimizationProblem(object):
             self.f0 = self.f0[0]
 
         # Store forward fields for each set of design variables in array (x,y,z,field_components,frequencies)
-        self.d_E = [[
-            np.zeros((self.nf, c[0], c[1], c[2]), dtype=np.complex128)
-            for c in dg
-        ] for dg in self.design_grids]
-        for nb, dgm in enumerate(self.design_region_monitors):
-            for ic, c in enumerate([mp.Ex, mp.Ey, mp.Ez]):
-                for f in range(self.nf):
-                    self.d_E[nb][ic][f, :, :, :] = atleast_3d(
-                        self.sim.get_dft_array(dgm, c, f))
+        if self.distributed_gradient:
+            self.d_E = [local_dft_data(dgm) for dgm in self.design_region_monitors]
+        else:
+            self.d_E = self._allocate_design_fields()
+            self._get_design_fields(self.d_E)
 
         # store objective function evaluation in memory
         self.f_bank.append(self.f0)
+        self._forward_key = self._design_key()
+        # (the local DFT data of distributed_gradient would only be written
+        # to the cache directory by the master process, so it is not kept)
+        self.forward_cache.put(
+            self._forward_key, {
+                'f0': self.f0,
+                'results_list': self.results_list,
+                'forward_states': self.forward_states,
+                'd_E': None if self.distributed_gradient
+                and self.forward_cache.directory is not None else self.d_E,
+                'gradient': None,
+            })
 
         # update solver's current state
         self.current_state = "FWD"
 
     def prepare_adjoint_run(self):
-        # Compute adjoint sources
+        # the adjoint sources depend on the results of the forward run
+        for m, state in zip(self.objective_arguments, self.forward_states):
+            m.set_forward_state(state)
+
+        # Compute adjoint sources and the frequencies at which they are nonzero
         self.adjoint_sources = [[]
                                 for i in range(len(self.objective_functions))]
+        self.adjoint_frequencies = [
+            np.zeros(self.nf, dtype=bool)
+            for i in range(len(self.objective_functions))
+        ]
         for ar in range(len(self.objective_functions)):
             for mi, m in enumerate(self.objective_arguments):
                 dJ = jacobian(self.objective_functions[ar],
@@ -283,64 +546,150 @@ class OptimizationProblem(object):
                 if np.any(dJ):
                     self.adjoint_sources[ar] += m.place_adjoint_source(
                         dJ)  # place the appropriate adjoint sources
+                    self.adjoint_frequencies[ar] |= m.adjoint_frequencies(dJ)
+
+        # Group the objectives into adjoint runs. The adjoint fields are linear
+        # in the sources, and the adjoint source of each objective vanishes at
+        # the frequencies it does not depend on, so objectives depending on
+        # disjoint sets of frequencies can share a single run.
+        self.adjoint_batches = []
+        batch_frequencies = []
+        for ar in range(len(self.objective_functions)):
+            if not np.any(self.adjoint_frequencies[ar]):
+                continue  # the adjoint fields are zero
+            for b, bf in enumerate(batch_frequencies):
+                if self.batch_adjoint_runs and self.nf > 1 and not np.any(
+                        bf & self.adjoint_frequencies[ar]):
+                    self.adjoint_batches[b].append(ar)
+                    bf |= self.adjoint_frequencies[ar]
+                    break
+            else:
+                self.adjoint_batches.append([ar])
+                batch_frequencies.append(self.adjoint_frequencies[ar].copy())
 
     def adjoint_run(self):
         # set up adjoint sources and monitors
         self.prepare_adjoint_run()
-        for ar in range(len(self.objective_functions)):
-            # Reset the fields
-            self.sim.reset_meep()
-
-            # Update the sources
-            self.sim.change_sources(self.adjoint_sources[ar])
 
-            # register design flux
-            self.design_region_monitors = [
-                self.sim.add_dft_fields(
-                    [mp.Ex, mp.Ey, mp.Ez],
-                    self.frequencies,
-                    where=dr.volume,
-                    yee_grid=True,
-                ) for dr in self.design_regions
-            ]
-
-            # Adjoint run
-            self.sim.run(until_after_sources=stop_when_dft_decayed(
-                self.sim,
-                self.design_region_monitors,
-                self.decay_dt,
-                self.decay_fields,
-                self.fcen_idx,
-                self.decay_by,
-                True,
-                self.minimum_run_time,
-                self.maximum_run_time,
-            ))
+        # Store adjoint fields for each design set of design variables in array (x,y,z,field_components,frequencies)
+        self.a_E = [
+            self._allocate_design_fields()
+            for ar in range(len(self.objective_functions))
+        ]
 
-            # Store adjoint fields for each design set of design variables in array (x,y,z,field_components,frequencies)
-            self.a_E.append([[
-                np.zeros((self.nf, c[0], c[1], c[2]), dtype=np.complex128)
-                for c in dg
-            ] for dg in self.design_grids])
-            for nb, dgm in enumerate(self.design_region_monitors):
-                for ic, c in enumerate([mp.Ex, mp.Ey, mp.Ez]):
-                    for f in range(self.nf):
-                        self.a_E[ar][nb][ic][f, :, :, :] = atleast_3d(
-                            self.sim.get_dft_array(dgm, c, f))
+        num_groups = min(self.num_adjoint_groups, len(self.adjoint_batches))
+        # the chunks of the process groups do not match those of the forward run
+        if num_groups > 1 and mp.count_processors(
+        ) > 1 and not self.distributed_gradient:
+            self._adjoint_run_parallel(num_groups)
+        else:
+            for batch in self.adjoint_batches:
+                self._adjoint_batch_run(batch)
 
         # update optimizer's state
         self.current_state = "ADJ"
 
+    def _adjoint_batch_run(self, batch):
+        """Run one adjoint simulation for the objectives in batch and store their fields."""
+        # Reset the fields
+        self._reset_sim()
+
+        # Update the sources
+        self.sim.change_sources(
+            [src for ar in batch for src in self.adjoint_sources[ar]])
+
+        # register design flux
+        self.design_region_monitors = [
+            self.sim.add_dft_fields(
+                [mp.Ex, mp.Ey, mp.Ez],
+                self.frequencies,
+                where=dr.volume,
+                yee_grid=True,
+            ) for dr in self.design_regions
+        ]
+
+        # Adjoint run
+        self.sim.run(until_after_sources=stop_when_dft_decayed(
+            self.sim,
+            self.design_region_monitors,
+            self.decay_dt,
+            self.decay_fields,
+            self.fcen_idx,
+            self.decay_by,
+            True,
+            self.minimum_run_time,
+            self.maximum_run_time,
+        ))
+
+        # each objective of a shared run only keeps the frequencies it depends on
+        fields = self.a_E[batch[0]] if len(
+            batch) == 1 else self._allocate_design_fields()
+        self._get_design_fields(fields)
+        if len(batch) > 1:
+            for ar in batch:
+                freqs = np.flatnonzero(self.adjoint_frequencies[ar])
+                for nb in range(len(fields)):
+                    if self.distributed_gradient:
+                        a = self.a_E[ar][nb].reshape(-1, self.nf)
+                        a[:, freqs] = fields[nb].reshape(-1, self.nf)[:, freqs]
+                        continue
+                    for ic in range(3):
+                        self.a_E[ar][nb][ic][freqs] = fields[nb][ic][freqs]
+
+    def _adjoint_run_parallel(self, num_groups):
+        """Distribute the adjoint runs over num_groups groups of processes.
+
+        Every group runs the batches self.adjoint_batches[n::num_groups] with
+        its own copy of the structure, and the adjoint fields are then merged
+        across the groups. The simulation is re-initialized on all of the
+        processes afterwards.
+        """
+        self.sim.reset_meep()
+        self._structure_weights = None
+        n = mp.divide_parallel_processes(num_groups)
+        for batch in self.adjoint_batches[n::num_groups]:
+            self._adjoint_batch_run(batch)
+
+        # every field is computed by exactly one group and is zero in the others
+        fields = [a for aE in self.a_E for dE in aE for a in dE]
+        data = mp.merge_subgroup_data(
+            np.concatenate([a.ravel() for a in fields]))
+        data = np.sum(data, axis=-1)
+        mp.end_divide_parallel()
+        offset = 0
+        for a in fields:
+            a[...] = data[offset:offset + a.size].reshape(a.shape)
+            offset += a.size
+
+        self.sim.reset_meep()
+        self.sim.init_sim()
+        self._structure_weights = [
+            np.copy(dr.design_parameters.weights) for dr in self.design_regions
+        ]
+
     def calculate_gradient(self):
         # Iterate through all design regions and calculate gradient
-        self.gradient = [[
-            dr.get_gradient(
-                self.sim,
-                self.a_E[ar][dri],
-                self.d_E[dri],
-                self.frequencies,
-            ) for dri, dr in enumerate(self.design_regions)
-        ] for ar in range(len(self.objective_functions))]
+        if self.distributed_gradient:
+            # the design region monitors of the adjoint runs have the same
+            # chunks as those of the forward run
+            self.gradient = [[
+                dr.get_gradient_from_chunks(
+                    self.sim,
+                    self.a_E[ar][dri],
+                    self.d_E[dri],
+                    self.design_region_monitors[dri],
+                    self.frequencies,
+                ) for dri, dr in enumerate(self.design_regions)
+            ] for ar in range(len(self.objective_functions))]
+        else:
+            self.gradient = [[
+                dr.get_gradient(
+                    self.sim,
+                    self.a_E[ar][dri],
+                    self.d_E[dri],
+                    self.frequencies,
+                ) for dri, dr in enumerate(self.design_regions)
+            ] for ar in range(len(self.objective_functions))]
 
         # Cleanup list of lists
         if len(self.gradient) == 1:
@@ -353,6 +702,12 @@ class OptimizationProblem(object):
                 self.gradient = [
                     g[0] for g in self.gradient
                 ]  # multiple objective functions bu one design region
+        # Store the gradient along with the forward results of this design
+        cached = self.forward_cache.get(self._forward_key)
+        if cached is not None:
+            cached['gradient'] = self.gradient
+            self.forward_cache.put(self._forward_key, cached)
+
         # Return optimizer's state to initialization
         self.current_state = "INIT"
 
@@ -391,6 +746,8 @@ class OptimizationProblem(object):
         # cleanup simulation object
         self.sim.reset_meep()
         self.sim.change_sources(self.forward_sources)
+        self._structure_weights = None  # the structure is re-initialized for each evaluation
+        self.current_state = "INIT"
 
         # preallocate result vector
         fd_gradient = []
@@ -410,46 +767,42 @@ class OptimizationProblem(object):
             # -------------------------------------------- #
             # left function evaluation
             # -------------------------------------------- #
-            self.sim.reset_meep()
-
             # assign new design vector
             b0[k] -= db
             self.design_regions[design_variables_idx].update_design_parameters(
                 b0)
-
-            # initialize design monitors
-            self.forward_monitors = []
-            for m in self.objective_arguments:
-                self.forward_monitors.append(
-                    m.register_monitors(self.frequencies))
-
-            self.sim.run(until_after_sources=stop_when_dft_decayed(
-                self.sim,
-                self.forward_monitors,
-                self.decay_dt,
-                self.decay_fields,
-                self.fcen_idx,
-                self.decay_by,
-                True,
-                self.minimum_run_time,
-                self.maximum_run_time,
-            ))
-
-            # record final objective function value
-            results_list = []
-            for m in self.objective_arguments:
-                results_list.append(m())
-            fm = [fi(*results_list) for fi in self.objective_functions]
+            fm = self._fd_objective_values()
 
             # -------------------------------------------- #
             # right function evaluation
             # -------------------------------------------- #
-            self.sim.reset_meep()
-
             # assign new design vector
             b0[k] += 2 * db  # central difference rule...
             self.design_regions[design_variables_idx].update_design_parameters(
                 b0)
+            fp = self._fd_objective_values()
+
+            # -------------------------------------------- #
+            # estimate derivative
+            # -------------------------------------------- #
+            fd_gradient.append([
+                np.squeeze((fp[fi] - fm[fi]) / (2 * db))
+                for fi in range(len(self.objective_functions))
+            ])
+
+        # Cleanup singleton dimensions
+        if len(fd_gradient) == 1:
+            fd_gradient = fd_gradient[0]
+
+        return fd_gradient, fd_gradient_idx
+
+    def _fd_objective_values(self):
+        """Objective function values for the current design, from a forward run
+        from scratch unless the design is in the forward cache."""
+        key = self._design_key()
+        cached = self.forward_cache.get(key)
+        if cached is None:
+            self.sim.reset_meep()
 
             # initialize design monitors
             self.forward_monitors = []
@@ -457,7 +810,6 @@ class OptimizationProblem(object):
                 self.forward_monitors.append(
                     m.register_monitors(self.frequencies))
 
-            # add monitor used to track dft convergence
             self.sim.run(until_after_sources=stop_when_dft_decayed(
                 self.sim,
                 self.forward_monitors,
@@ -474,21 +826,16 @@ class OptimizationProblem(object):
             results_list = []
             for m in self.objective_arguments:
                 results_list.append(m())
-            fp = [fi(*results_list) for fi in self.objective_functions]
-
-            # -------------------------------------------- #
-            # estimate derivative
-            # -------------------------------------------- #
-            fd_gradient.append([
-                np.squeeze((fp[fi] - fm[fi]) / (2 * db))
-                for fi in range(len(self.objective_functions))
-            ])
-
-        # Cleanup singleton dimensions
-        if len(fd_gradient) == 1:
-            fd_gradient = fd_gradient[0]
-
-        return fd_gradient, fd_gradient_idx
+            f = [fi(*results_list) for fi in self.objective_functions]
+            cached = {
+                'f0': f[0] if len(f) == 1 else f,
+                'results_list': results_list,
+                'gradient': None,
+            }
+            self.forward_cache.put(key, cached)
+        if len(self.objective_functions) == 1:
+            return [cached['f0']]
+        return cached['f0']
 
     def update_design(self, rho_vector):
         """Update the design permittivity function.
@@ -500,9 +847,19 @@ class OptimizationProblem(object):
                 raise ValueError(
                     "Each vector of design variables must contain only one dimension."
                 )
+
+        # keep the current forward fields if the design did not change
+        if all(
+                np.array_equal(
+                    np.asarray(rho_vector[bi]).flatten(),
+                    b.design_parameters.weights)
+                for bi, b in enumerate(self.design_regions)):
+            return
+
+        for bi, b in enumerate(self.design_regions):
             b.update_design_parameters(rho_vector[bi])
 
-        self.sim.reset_meep()
+        self._reset_sim()
         self.current_state = "INIT"
 
     def get_objective_arguments(self):
@@ -525,6 +882,28 @@ class OptimizationProblem(object):
         self.sim.plot2D(**kwargs)
 
 
+def dft_changes(monitors, components, freq_idx):
+    """mp.dft_change objects tracking the DFT of each of the components at the
+    frequency index freq_idx (an int, or a list with one index per monitor) in
+    each of the DftFields or DftNear2Far monitors.
+
+    The changes are computed from the DFT chunks of each process, keeping the
+    previous DFT in place, so that the DFT arrays are never gathered.
+    """
+    if isinstance(freq_idx, int):
+        freq_idx = [freq_idx] * len(monitors)
+    changes = []
+    for m, fi in zip(monitors, freq_idx):
+        if isinstance(m, mp.DftFields):
+            chunks = m.chunks
+        elif isinstance(m, mp.simulation.DftNear2Far):
+            chunks = m.F
+        else:
+            raise TypeError("Monitor of type {} not supported".format(type(m)))
+        changes.append([mp.dft_change(chunks, cc, fi) for cc in components])
+    return changes
+
+
 def stop_when_dft_decayed(
     simob,
     mon,
@@ -541,18 +920,22 @@ def stop_when_dft_decayed(
     mon ............. a list of monitors
     c ............... a list of components to monitor
 
+    The relative change of DftFields and DftNear2Far monitors is computed by
+    mp.dft_change (see dft_changes); simob and yee_grid are no longer needed.
+
     '''
-    # get monitor dft output array dimensions
-    dims = []
     for m in mon:
-        ci_dims = []
-        for ci in c:
-            comp = ci if yee_grid else mp.Dielectric
-            ci_dims += [simob.get_array_slice_dimensions(comp, vol=m.where)[0]]
-        dims.append(ci_dims)
-
-    # Record data in closure so that we can persitently edit
-    closure = {'previous_fields': [[None for di in d] for d in dims], 't0': 0}
+        if not isinstance(
+                m, (mp.DftFlux, mp.DftFields, mp.simulation.DftNear2Far)):
+            raise TypeError("Monitor of type {} not supported".format(type(m)))
+
+    # Record data in closure so that we can persitently edit. The dft_change
+    # objects are created at the first check, once the monitors are initialized.
+    closure = {
+        'changes': None,
+        'previous_fluxes': [None for m in mon],
+        't0': 0
+    }
 
     def _stop(sim):
         if sim.round_time() <= dt + closure['t0']:
@@ -560,46 +943,37 @@ def stop_when_dft_decayed(
         elif maximum_run_time and sim.round_time() > maximum_run_time:
             return True
         else:
-            previous_fields = closure['previous_fields']
+            if closure['changes'] is None:
+                closure['changes'] = [
+                    None if isinstance(m, mp.DftFlux) else dft_changes(
+                        [m], c, fcen_idx)[0] for m in mon
+                ]
 
-            # Pull all the relevant frequency and spatial dft points
             relative_change = []
-            current_fields = [[0 for di in d] for d in dims]
             for mi, m in enumerate(mon):
-                for ic, cc in enumerate(c):
-                    if isinstance(m, mp.DftFlux):
-                        current_fields[mi][ic] = mp.get_fluxes(m)[fcen_idx]
-                    elif isinstance(m, mp.DftFields):
-                        current_fields[mi][ic] = atleast_3d(
-                            sim.get_dft_array(m, cc, fcen_idx))
-                    elif isinstance(m, mp.simulation.DftNear2Far):
-                        current_fields[mi][ic] = atleast_3d(
-                            sim.get_dft_array(m, cc, fcen_idx))
-                    else:
-                        raise TypeError(
-                            "Monitor of type {} not supported".format(type(m)))
-
-                    if previous_fields[mi][ic] is not None:
-                        if np.sum(
-                                np.abs(previous_fields[mi][ic] -
-                                       current_fields[mi][ic])) == 0:
-                            relative_change.append(0)
-                        elif np.all(np.abs(previous_fields[mi][ic])):
-                            relative_change_raw = np.abs(
-                                previous_fields[mi][ic] -
-                                current_fields[mi][ic]) / np.abs(
-                                    previous_fields[mi][ic])
-                            relative_change.append(
-                                np.mean(relative_change_raw.flatten())
-                            )  # average across space and frequency
-                        else:
-                            relative_change.append(1)
+                if isinstance(m, mp.DftFlux):
+                    # the flux does not depend on the component
+                    previous_flux = closure['previous_fluxes'][mi]
+                    current_flux = mp.get_fluxes(m)[fcen_idx]
+                    if previous_flux is None:
+                        change = 1
+                    elif previous_flux == current_flux:
+                        change = 0
+                    elif previous_flux != 0:
+                        change = abs(previous_flux -
+                                     current_flux) / abs(previous_flux)
                     else:
-                        relative_change.append(1)
+                        change = 1
+                    closure['previous_fluxes'][mi] = current_flux
+                    relative_change += [change] * len(c)
+                else:
+                    # average across space
+                    for ch in closure['changes'][mi]:
+                        ch.update()
+                        relative_change.append(ch.mean_change())
 
             relative_change = np.mean(
                 relative_change)  # average across monitors
-            closure['previous_fields'] = current_fields
             closure['t0'] = sim.round_time()
 
             if mp.verbosity > 0:
@@ -118,14 +118,10 @@ def gather_design_region_fields(
     """
     fwd_fields = []
     for monitor in design_region_monitors:
-        fields_by_component = []
-        for component in _ADJOINT_FIELD_COMPONENTS:
-            fields_by_freq = []
-            for freq_idx, _ in enumerate(frequencies):
-                fields = simulation.get_dft_array(monitor, component, freq_idx)
-                fields_by_freq.append(_make_at_least_nd(fields))
-            fields_by_component.append(onp.stack(fields_by_freq))
-        fwd_fields.append(fields_by_component)
+        fields_by_component = simulation.get_dft_arrays(
+            monitor, _ADJOINT_FIELD_COMPONENTS, range(len(frequencies)))
+        fwd_fields.append(
+            [_make_at_least_nd(fields, 4) for fields in fields_by_component])
     return fwd_fields
 
 
@@ -56,8 +56,8 @@ import numpy as onp
 
 from . import utils
 from . import DesignRegion, EigenmodeCoefficient
+from .optimization_problem import dft_changes
 
-_norm_fn = onp.linalg.norm
 _reduce_fn = onp.max
 
 
@@ -148,7 +148,7 @@ class MeepJaxWrapper:
             monitors = []
         self._dft_convergence_monitors = monitors
         self._last_measurement_meep_time = 0.0
-        self._previous_fields = self._init_empty_dft_field_container()
+        self._dft_changes = None
         self._dft_relative_change = []
 
     def _run_fwd_simulation(self, design_variables):
@@ -255,40 +255,23 @@ class MeepJaxWrapper:
 
         return simulate
 
-    def _init_empty_dft_field_container(self) -> List[List[float]]:
-        """Initializes a nested list for storing DFT fields for convergence monitoring."""
-        num_components = len(self.dft_field_components)
-        num_monitors = len(self._dft_convergence_monitors)
-        return [[0.0 for _ in range(num_components)]
-                for _ in range(num_monitors)]
-
     def _are_dfts_converged(self, sim: mp.Simulation) -> bool:
         """Callback to determine whether the DFT fields are converged below the threshold."""
         if self.dft_threshold == 0 or not self._dft_convergence_monitors or not self.dft_field_components:
             return False
-        relative_change = []
-        current_fields = self._init_empty_dft_field_container()
-        for monitor_idx, monitor in enumerate(self._dft_convergence_monitors):
-            for component_idx, component in enumerate(
-                    self.dft_field_components):
-                previous_fields = self._previous_fields[monitor_idx][
-                    component_idx]
-                current_fields[monitor_idx][component_idx] = sim.get_dft_array(
-                    monitor,
-                    component,
-                    int(monitor.nfreqs // 2),
-                )
-                norm_previous = _norm_fn(previous_fields)
-                field_diff = previous_fields - current_fields[monitor_idx][
-                    component_idx]
-                if norm_previous != 0:
-                    relative_change.append(
-                        _norm_fn(field_diff) / norm_previous)
-                else:
-                    relative_change.append(1.0)
+        if self._dft_changes is None:
+            # created at the first measurement, once the monitors are initialized
+            self._dft_changes = dft_changes(
+                self._dft_convergence_monitors,
+                self.dft_field_components,
+                [int(monitor.nfreqs // 2) for monitor in self._dft_convergence_monitors],
+            )
+        relative_change = [
+            change.update() for changes in self._dft_changes
+            for change in changes
+        ]
         relative_change = _reduce_fn(relative_change)
         self._dft_relative_change.append(relative_change)
-        self._previous_fields = current_fields
         if mp.am_master() and mp.verbosity > 0:
             print(
                 'At simulation time %.2f the relative change in the DFT fields is %.2e.'
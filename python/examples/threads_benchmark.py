@@ -0,0 +1,64 @@
+# Scaling benchmark of the timestepping of a fixed 3d cell for pure-MPI vs.
+# hybrid MPI + OpenMP runs (Simulation num_threads), which requires Meep to be
+# compiled --with-mpi --with-openmp. Run with the same total number of cores, e.g.
+#
+#   mpirun -np 16 python threads_benchmark.py -num_threads 1
+#   mpirun -np 4 python threads_benchmark.py -num_threads 4
+#   mpirun -np 1 python threads_benchmark.py -num_threads 16
+#
+# and compare the wall-clock time per timestep and the time spent on
+# time stepping vs. copying chunk boundaries and MPI communication.
+
+import argparse
+import meep as mp
+
+
+def main(args):
+    cell_size = mp.Vector3(args.size, args.size, args.size)
+
+    geometry = [mp.Sphere(radius=0.25 * args.size,
+                          material=mp.Medium(index=3.5))]
+
+    fcen = 1.0
+    df = 0.2
+    sources = [mp.Source(src=mp.GaussianSource(fcen, fwidth=df),
+                         center=mp.Vector3(0.1, 0.2, 0.3),
+                         component=mp.Ez)]
+
+    sim = mp.Simulation(cell_size=cell_size,
+                        resolution=args.resolution,
+                        geometry=geometry,
+                        sources=sources,
+                        boundary_layers=[mp.PML(1.0)],
+                        num_threads=args.num_threads)
+
+    flux_region = mp.FluxRegion(center=mp.Vector3(0.4 * args.size), size=mp.Vector3(0, 0.5 * args.size, 0.5 * args.size))
+    sim.add_flux(fcen, df, args.nfreq, flux_region)
+
+    sim.init_sim()
+    # exclude the allocation of the fields by the first timesteps
+    sim.run(until=1)
+
+    start = mp.wall_time()
+    sim.run(until=args.time)
+    elapsed = mp.wall_time() - start
+    steps = round(args.time / sim.fields.dt)
+
+    stepping = sim.mean_time_spent_on(1)
+    boundaries = sim.mean_time_spent_on(2)
+    communication = sim.mean_time_spent_on(3) + sim.mean_time_spent_on(4)
+    dft = sim.mean_time_spent_on(6)
+    print("benchmark:, {}, {}, {}, {:.6f}, {:.4f}, {:.4f}, {:.4f}, {:.4f}".format(
+        mp.count_processors(), args.num_threads, sim.structure.num_chunks,
+        elapsed / steps, stepping, boundaries, communication, dft))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-num_threads', type=int, default=1, help='number of OpenMP threads per process (default: 1)')
+    parser.add_argument('-size', type=float, default=8.0, help='edge length of the cubic cell including PML (default: 8.0)')
+    parser.add_argument('-resolution', type=int, default=20, help='resolution (default: 20 pixels/um)')
+    parser.add_argument('-time', type=float, default=20.0, help='simulation time to benchmark (default: 20)')
+    parser.add_argument('-nfreq', type=int, default=50, help='number of flux frequencies (default: 50)')
+    args = parser.parse_args()
+    main(args)
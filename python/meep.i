@@ -271,14 +271,18 @@ PyObject *py_do_harminv(PyObject *vals, double dt, double f_min, double f_max, i
     double *freq_im = new double[maxbands];
     double *freq_err = new double[maxbands];
 
-    Py_ssize_t n = PyList_Size(vals);
-    std::complex<double> *items = new std::complex<double>[n];
-
-    for(int i = 0; i < n; i++) {
-        Py_complex py_c = PyComplex_AsCComplex(PyList_GetItem(vals, i));
-        std::complex<double> c(py_c.real, py_c.imag);
-        items[i] = c;
+    // vals can be a list or a (1d) NumPy array, which is only copied if it is
+    // not already a contiguous complex128 array (e.g. a column of a time series)
+    PyArrayObject *arr = (PyArrayObject *)PyArray_FROMANY(vals, NPY_CDOUBLE, 1, 1, NPY_ARRAY_IN_ARRAY);
+    if (!arr) {
+        delete[] freq_err;
+        delete[] freq_im;
+        delete[] freq_re;
+        delete[] amp;
+        return NULL;
     }
+    Py_ssize_t n = PyArray_DIM(arr, 0);
+    std::complex<double> *items = (std::complex<double> *)PyArray_DATA(arr);
 
     maxbands = do_harminv(items, n, dt, f_min, f_max, maxbands, amp,
                           freq_re, freq_im, freq_err, spectral_density, Q_thresh,
@@ -299,11 +303,26 @@ PyObject *py_do_harminv(PyObject *vals, double dt, double f_min, double f_max, i
     delete[] freq_im;
     delete[] freq_re;
     delete[] amp;
-    delete[] items;
+    Py_DECREF(arr);
 
     return res;
 }
 
+// NumPy copy of the time series recorded by a meep::field_probes, after gathering
+// its pending samples from all processes (so this is a collective operation). The
+// time series is a sum over the processes into a buffer that is reallocated as it
+// grows, so it cannot be shared with NumPy without copying.
+PyObject *_get_time_series(meep::field_probes *p) {
+    // Return value: New reference
+    p->gather();
+    npy_intp dims[2] = {(npy_intp)p->time_series_length(), (npy_intp)p->num_probes()};
+    PyObject *arr = PyArray_ZEROS(2, dims, NPY_CDOUBLE, 0);
+    if (arr && p->time_series())
+        memcpy(PyArray_DATA((PyArrayObject *)arr), p->time_series(),
+               sizeof(std::complex<double>) * dims[0] * dims[1]);
+    return arr;
+}
+
 // Wrapper around meep::dft_near2far::farfield
 PyObject *_get_farfield(meep::dft_near2far *f, const meep::vec & v) {
     // Return value: New reference
@@ -321,6 +340,23 @@ PyObject *_get_farfield(meep::dft_near2far *f, const meep::vec & v) {
     return res;
 }
 
+// Periodic copies of a meep::dft_near2far, as a list of (direction, nperiods, phase, period)
+// tuples for each of its periodic directions
+PyObject *_get_near2far_periodicity(meep::dft_near2far *f) {
+    // Return value: New reference
+    PyObject *res = PyList_New(0);
+
+    for (int i = 0; i < 2; ++i) {
+        if (f->periodic_d[i] == meep::NO_DIRECTION) continue;
+        PyObject *p = Py_BuildValue("(iidd)", (int)f->periodic_d[i], f->periodic_n[i],
+                                    f->periodic_k[i], f->period[i]);
+        PyList_Append(res, p);
+        Py_DECREF(p);
+    }
+
+    return res;
+}
+
 // Wrapper around meep::dft_near2far::get_farfields_array
 PyObject *_get_farfields_array(meep::dft_near2far *n2f, const meep::volume &where,
                                double resolution) {
@@ -353,6 +389,21 @@ PyObject *_get_farfields_array(meep::dft_near2far *n2f, const meep::volume &wher
 
 }
 
+// Wrapper around meep::dft_near2far::get_farfields_block
+PyObject *_get_farfields_block(meep::dft_near2far *n2f, const meep::volume &where,
+                               double resolution, size_t start, size_t end) {
+    // Return value: New reference
+    double *EH = n2f->get_farfields_block(where, resolution, start, end);
+
+    // 12 E/H x/y/z r/i arrays of (end - start) x nfreq far fields
+    npy_intp arr_dims[3] = {12, (npy_intp)(end - start), (npy_intp)n2f->freq.size()};
+    PyObject *py_arr = PyArray_SimpleNew(3, arr_dims, NPY_DOUBLE);
+    memcpy(PyArray_DATA((PyArrayObject*)py_arr), EH, sizeof(double) * 12 * (end - start) * n2f->freq.size());
+
+    delete[] EH;
+    return py_arr;
+}
+
 // Wrapper around meep::dft_ldos::ldos
 PyObject *_dft_ldos_ldos(meep::dft_ldos *f) {
     // Return value: New reference
@@ -447,6 +498,94 @@ PyObject *_get_dft_array(meep::fields *f, dft_type dft, meep::component c, int n
     return py_arr;
 }
 
+// Wrapper around meep::fields::get_dft_arrays. out is None or a list of contiguous complex
+// arrays (one per component) to fill; if it is None, the arrays of all the components are
+// allocated consecutively in one buffer. Returns (list of arrays, list of array dimensions),
+// where the dimensions are None for components that are not stored by the dft_fields.
+PyObject *_get_dft_arrays(meep::fields *f, meep::dft_fields dft, PyObject *py_components,
+                          PyObject *py_freqs, PyObject *out) {
+    // Return value: New reference
+    if (!PyList_Check(py_components) || !PyList_Check(py_freqs))
+        meep::abort("components and frequency indices must be lists of integers.");
+    int num_components = PyList_Size(py_components), num_freqs = PyList_Size(py_freqs);
+    if (out != Py_None && (!PyList_Check(out) || PyList_Size(out) != num_components))
+        meep::abort("out must be a list of %d arrays.", num_components);
+    meep::component *cs = new meep::component[num_components];
+    int *freqs = new int[num_freqs];
+    for (int i = 0; i < num_components; ++i)
+        cs[i] = (meep::component)PyInteger_AsLong(PyList_GetItem(py_components, i));
+    for (int i = 0; i < num_freqs; ++i) {
+        freqs[i] = PyInteger_AsLong(PyList_GetItem(py_freqs, i));
+        if (freqs[i] < 0 || freqs[i] >= (int)dft.freq.size())
+            meep::abort("frequency index %d is outside the range of the frequency array of size %zu",
+                        freqs[i], dft.freq.size());
+    }
+
+    int *ranks = new int[num_components];
+    size_t *dims = new size_t[3 * num_components];
+    size_t n = f->get_dft_arrays(dft, cs, num_components, freqs, num_freqs, NULL, ranks, dims);
+
+    PyObject *py_arrays = PyList_New(num_components);
+    PyObject *py_dims = PyList_New(num_components);
+    std::complex<double> **arrays = new std::complex<double> *[num_components];
+    PyObject *buf = NULL;
+    if (out == Py_None) {
+        npy_intp arr_dims[1] = {(npy_intp)n};
+        buf = PyArray_ZEROS(1, arr_dims, NPY_CDOUBLE, 0);
+    }
+    size_t offset = 0;
+    for (int i = 0; i < num_components; ++i) {
+        size_t size = 0;
+        if (ranks[i] >= 0) {
+            size = num_freqs;
+            PyObject *py_shape = PyTuple_New(ranks[i]);
+            for (int r = 0; r < ranks[i]; ++r) {
+                size *= dims[3 * i + r];
+                PyTuple_SetItem(py_shape, r, PyInteger_FromLong(dims[3 * i + r]));
+            }
+            PyList_SetItem(py_dims, i, py_shape);
+        }
+        else {
+            Py_INCREF(Py_None);
+            PyList_SetItem(py_dims, i, Py_None);
+        }
+
+        PyArrayObject *pao;
+        if (out == Py_None) {
+            pao = (PyArrayObject *)buf;
+            Py_INCREF(buf);
+            arrays[i] = (std::complex<double> *)PyArray_DATA(pao) + offset;
+        }
+        else {
+            pao = (PyArrayObject *)PyList_GetItem(out, i);
+            if (!PyArray_Check(pao)) meep::abort("out must be a list of numpy arrays.");
+            if (!PyArray_ISCARRAY(pao)) meep::abort("Numpy out arrays must be C-style contiguous.");
+            if (PyArray_TYPE(pao) != NPY_CDOUBLE) meep::abort("Numpy out arrays must be complex128.");
+            if (ranks[i] >= 0 && (size_t)PyArray_SIZE(pao) != size)
+                meep::abort("Numpy out array %d has %zu entries, but %zu are needed.", i,
+                            (size_t)PyArray_SIZE(pao), size);
+            Py_INCREF(pao);
+            arrays[i] = (std::complex<double> *)PyArray_DATA(pao);
+            if (ranks[i] < 0)
+                memset(arrays[i], 0, sizeof(std::complex<double>) * PyArray_SIZE(pao));
+        }
+        PyList_SetItem(py_arrays, i, (PyObject *)pao);
+        offset += size;
+    }
+    f->get_dft_arrays(dft, cs, num_components, freqs, num_freqs, arrays, ranks, dims);
+
+    delete[] cs;
+    delete[] freqs;
+    delete[] ranks;
+    delete[] dims;
+    delete[] arrays;
+    Py_XDECREF(buf);
+    PyObject *res = Py_BuildValue("(O,O)", py_arrays, py_dims);
+    Py_DECREF(py_arrays);
+    Py_DECREF(py_dims);
+    return res;
+}
+
 size_t _get_dft_data_size(meep::dft_chunk *dc) {
     size_t istart;
     return meep::dft_chunks_Ntotal(dc, &istart) / 2;
@@ -470,6 +609,29 @@ void _get_dft_data(meep::dft_chunk *dc, std::complex<double> *cdata, int size) {
     }
 }
 
+// like _get_dft_data, but only for the chunks owned by this process
+size_t _get_local_dft_data_size(meep::dft_chunk *dc) {
+    size_t n = 0;
+    for (meep::dft_chunk *cur = dc; cur; cur = cur->next_in_dft)
+        n += cur->N * cur->omega.size();
+    return n;
+}
+
+void _get_local_dft_data(meep::dft_chunk *dc, std::complex<double> *cdata, int size) {
+    if (_get_local_dft_data_size(dc) != (size_t)size) {
+        meep::abort("Local dft_chunks size does not agree with size allocated for output array.\n");
+    }
+
+    size_t istart = 0;
+    for (meep::dft_chunk *cur = dc; cur; cur = cur->next_in_dft) {
+        size_t Nchunk = cur->N * cur->omega.size();
+        for (size_t i = 0; i < Nchunk; ++i) {
+            cdata[i + istart] = cur->dft[i];
+        }
+        istart += Nchunk;
+    }
+}
+
 void _load_dft_data(meep::dft_chunk *dc, std::complex<double> *cdata, int size) {
     size_t istart;
     size_t n = meep::dft_chunks_Ntotal(dc, &istart) / 2;
@@ -619,15 +781,23 @@ PyObject *py_do_harminv(PyObject *vals, double dt, double f_min, double f_max, i
                      double spectral_density, double Q_thresh, double rel_err_thresh,
                      double err_thresh, double rel_amp_thresh, double amp_thresh);
 
+PyObject *_get_time_series(meep::field_probes *p);
 PyObject *_get_farfield(meep::dft_near2far *f, const meep::vec & v);
 PyObject *_get_farfields_array(meep::dft_near2far *n2f, const meep::volume &where, double resolution);
+PyObject *_get_near2far_periodicity(meep::dft_near2far *f);
+PyObject *_get_farfields_block(meep::dft_near2far *n2f, const meep::volume &where,
+                               double resolution, size_t start, size_t end);
 PyObject *_dft_ldos_ldos(meep::dft_ldos *f);
 PyObject *_dft_ldos_F(meep::dft_ldos *f);
 PyObject *_dft_ldos_J(meep::dft_ldos *f);
 template<typename dft_type>
 PyObject *_get_dft_array(meep::fields *f, dft_type dft, meep::component c, int num_freq);
+PyObject *_get_dft_arrays(meep::fields *f, meep::dft_fields dft, PyObject *py_components,
+                          PyObject *py_freqs, PyObject *out);
 size_t _get_dft_data_size(meep::dft_chunk *dc);
 void _get_dft_data(meep::dft_chunk *dc, std::complex<double> *cdata, int size);
+size_t _get_local_dft_data_size(meep::dft_chunk *dc);
+void _get_local_dft_data(meep::dft_chunk *dc, std::complex<double> *cdata, int size);
 void _load_dft_data(meep::dft_chunk *dc, std::complex<double> *cdata, int size);
 meep::volume_list *make_volume_list(const meep::volume &v, int c,
                                     std::complex<double> weight,
@@ -866,6 +1036,56 @@ void _get_gradient(PyObject *grad, PyObject *fields_a, PyObject *fields_f, PyObj
     delete l;
     Py_DECREF(swigobj);
 }
+
+// like _get_gradient, but with the fields given by the local data of the dft chunks
+// (see _get_local_dft_data) rather than by arrays over the whole design region
+void _get_gradient_chunks(PyObject *grad, PyObject *fields_a, PyObject *fields_f, meep::dft_chunk *chunks, PyObject *grid_volume, PyObject *frequencies, PyObject *py_geom_list) {
+    PyArrayObject *pao_grad = (PyArrayObject *)grad;
+    if (!PyArray_Check(pao_grad)) meep::abort("grad parameter must be numpy array.");
+    if (!PyArray_ISCARRAY(pao_grad)) meep::abort("Numpy grad array must be C-style contiguous.");
+    if (PyArray_NDIM(pao_grad) !=2) {meep::abort("Numpy grad array must have 2 dimensions.");}
+    double *grad_c = (double *)PyArray_DATA(pao_grad);
+    npy_intp ng = PyArray_DIMS(pao_grad)[1]; // number of design parameters
+
+    PyArrayObject *pao_fields_a = (PyArrayObject *)fields_a;
+    if (!PyArray_Check(pao_fields_a)) meep::abort("adjoint fields parameter must be numpy array.");
+    if (!PyArray_ISCARRAY(pao_fields_a)) meep::abort("Numpy adjoint fields array must be C-style contiguous.");
+    if (PyArray_NDIM(pao_fields_a) !=1) {meep::abort("Numpy adjoint fields array must have 1 dimension.");}
+    std::complex<double> *fields_a_c = (std::complex<double> *)PyArray_DATA(pao_fields_a);
+
+    PyArrayObject *pao_fields_f = (PyArrayObject *)fields_f;
+    if (!PyArray_Check(pao_fields_f)) meep::abort("forward fields parameter must be numpy array.");
+    if (!PyArray_ISCARRAY(pao_fields_f)) meep::abort("Numpy forward fields array must be C-style contiguous.");
+    if (PyArray_NDIM(pao_fields_f) !=1) {meep::abort("Numpy forward fields array must have 1 dimension.");}
+    std::complex<double> *fields_f_c = (std::complex<double> *)PyArray_DATA(pao_fields_f);
+    if (PyArray_SIZE(pao_fields_a) != PyArray_SIZE(pao_fields_f)) meep::abort("Numpy adjoint and forward fields arrays must have the same size.");
+
+    // scalegrad not currently used
+    double scalegrad = 1.0;
+
+    void* where;
+    PyObject *swigobj = PyObject_GetAttrString(grid_volume, "swigobj");
+    SWIG_ConvertPtr(swigobj,&where,0,NULL);
+    const meep::volume* where_vol = (const meep::volume*)where;
+
+    PyArrayObject *pao_freqs = (PyArrayObject *)frequencies;
+    if (!PyArray_Check(pao_freqs)) meep::abort("frequencies parameter must be numpy array.");
+    if (!PyArray_ISCARRAY(pao_freqs)) meep::abort("Numpy fields array must be C-style contiguous.");
+    double *frequencies_c = (double *)PyArray_DATA(pao_freqs);
+    npy_intp nf = PyArray_DIMS(pao_freqs)[0];
+    if (PyArray_DIMS(pao_grad)[0] != nf) meep::abort("Numpy grad array is allocated for %td frequencies; it should be allocated for %td.",PyArray_DIMS(pao_grad)[0],nf);
+
+    geometric_object_list *l;
+    l = new geometric_object_list();
+    if (!py_list_to_gobj_list(py_geom_list,l)) meep::abort("Unable to convert geometry tree.");
+    geom_box_tree geometry_tree = calculate_tree(*where_vol,*l);
+
+    meep_geom::material_grids_addgradient_chunks(grad_c,ng,fields_a_c,fields_f_c,PyArray_SIZE(pao_fields_f),chunks,frequencies_c,nf,scalegrad,geometry_tree);
+
+    destroy_geom_box_tree(geometry_tree);
+    delete l;
+    Py_DECREF(swigobj);
+}
 %}
 //--------------------------------------------------
 // end typemaps needed for material grid
@@ -1409,6 +1629,9 @@ void _get_gradient(PyObject *grad, PyObject *fields_a, PyObject *fields_f, PyObj
     $1 = (double *)array_data($input);
 }
 
+%apply double* farpt_list { double* pt_list };
+%apply std::complex<double>* dJ { std::complex<double>* amp_list };
+
 %exception {
   try {
     $action
@@ -1866,7 +2089,8 @@ meep::structure *create_structure_and_set_materials(vector3 cell_size,
                                                     bool set_materials,
                                                     meep::structure *existing_s,
                                                     bool output_chunk_costs,
-                                                    const meep::binary_partition *my_bp) {
+                                                    const meep::binary_partition *my_bp,
+                                                    int num_threads = 1) {
     // Initialize fragment_stats static members (used for creating chunks in choose_chunkdivision)
     meep_geom::fragment_stats::geom = gobj_list;
     meep_geom::fragment_stats::dft_data_list = dft_data_list_;
@@ -1885,7 +2109,7 @@ meep::structure *create_structure_and_set_materials(vector3 cell_size,
     if (output_chunk_costs) {
          meep::volume thev = gv.surroundings();
          std::unique_ptr<meep::binary_partition> bp;
-         if (!my_bp) bp = meep::choose_chunkdivision(gv, thev, num_chunks, sym);
+         if (!my_bp) bp = meep::choose_chunkdivision(gv, thev, num_chunks, sym, num_threads);
          std::vector<grid_volume> chunk_vols;
          std::vector<int> ids;
          meep::split_by_binarytree(gv, chunk_vols, ids, (!my_bp) ? bp.get() : my_bp);
@@ -1900,9 +2124,10 @@ meep::structure *create_structure_and_set_materials(vector3 cell_size,
     }
     else {
       s = new meep::structure(gv, NULL, br, sym, num_chunks, Courant,
-                              use_anisotropic_averaging, tol, maxeval, my_bp);
+                              use_anisotropic_averaging, tol, maxeval, my_bp, num_threads);
     }
     s->shared_chunks = true;
+    s->num_threads = num_threads;
 
     if (set_materials) {
       meep_geom::set_materials_from_geometry(s, gobj_list, center, use_anisotropic_averaging, tol,
@@ -1939,6 +2164,27 @@ meep::structure *create_structure_and_set_materials(vector3 cell_size,
     return s;
 }
 
+// recompute the materials of an existing structure only near the volume where
+void update_structure_materials(meep::structure *s,
+                                vector3 cell_size,
+                                meep::grid_volume &gv,
+                                const meep::volume &where,
+                                bool use_anisotropic_averaging,
+                                double tol,
+                                int maxeval,
+                                geometric_object_list gobj_list,
+                                vector3 center,
+                                bool _ensure_periodicity,
+                                meep_geom::material_type _default_material,
+                                meep_geom::absorber_list alist,
+                                meep_geom::material_type_list extra_materials) {
+    meep_geom::init_libctl(_default_material, _ensure_periodicity,
+                           &gv, cell_size, center, &gobj_list);
+    meep_geom::set_materials_from_geometry(s, gobj_list, center, use_anisotropic_averaging, tol,
+                                           maxeval, _ensure_periodicity, _default_material,
+                                           alist, extra_materials, &where);
+}
+
 void _get_epsilon_grid(geometric_object_list gobj_list,
                        meep_geom::material_type_list mlist,
                        meep_geom::material_type _default_material,
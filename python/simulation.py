@@ -2,6 +2,7 @@
 from __future__ import division, print_function
 
 import functools
+import hashlib
 import math
 import numbers
 import os
@@ -9,6 +10,7 @@ import re
 import signal
 import subprocess
 import sys
+import types
 import warnings
 from collections import namedtuple
 from collections import OrderedDict
@@ -51,6 +53,7 @@ EigCoeffsResult = namedtuple('EigCoeffsResult', ['alpha', 'vgrp', 'kpoints', 'kd
 FluxData = namedtuple('FluxData', ['E', 'H'])
 ForceData = namedtuple('ForceData', ['offdiag1', 'offdiag2', 'diag'])
 NearToFarData = namedtuple('NearToFarData', ['F'])
+FarfieldOrders = namedtuple('FarfieldOrders', ['orders', 'k', 'E', 'H'])
 
 def fix_dft_args(args, i):
     if len(args) > i+2 and isinstance(args[i],(int,float)) and isinstance(args[i+1],(int,float)) and isinstance(args[i+2],int):
@@ -677,12 +680,13 @@ class DftNear2Far(DftObj):
     """
     """
 
-    def __init__(self, func, args):
+    def __init__(self, func, args, fft=False):
         """Construct a `DftNear2Far`."""
         super(DftNear2Far, self).__init__(func, args)
         self.nfreqs = len(args[0])
         self.nperiods = args[1]
         self.regions = args[2]
+        self.fft = fft
         self.num_components = 4
 
     @property
@@ -719,6 +723,122 @@ class DftNear2Far(DftObj):
     def freq(self):
         return self.swigobj_attr('freq')
 
+# field components of the near2far equivalent sources, and their index in the
+# (Ex,Ey,Ez,Hx,Hy,Hz) radiation vectors computed by _farfield_fft
+_N2F_CHANNELS = {mp.Ex: 0, mp.Ey: 1, mp.Ez: 2, mp.Hx: 3, mp.Hy: 4, mp.Hz: 5}
+
+
+def _lagrange_interp(F, q, npts=6):
+    """
+    Interpolates F, whose first `len(q)` axes are periodic grids with unit spacing, at
+    the fractional grid indices `q` (a list of equal-shape arrays, one per axis) by
+    tensor-product Lagrange interpolation with `npts` points per axis.
+    """
+    base = [np.floor(qd).astype(int) - (npts // 2 - 1) for qd in q]
+    weights = []
+    for qd, b in zip(q, base):
+        u = qd - b
+        w = np.ones(u.shape + (npts,))
+        for i in range(npts):
+            for j in range(npts):
+                if i != j:
+                    w[..., i] *= (u - j) / (i - j)
+        weights.append(w)
+    result = 0
+    for offsets in np.ndindex(*(npts,) * len(q)):
+        idx = tuple((b + o) % F.shape[d] for d, (b, o) in enumerate(zip(base, offsets)))
+        w = np.prod([weights[d][..., o] for d, o in enumerate(offsets)], axis=0)
+        result = result + w[..., np.newaxis] * F[idx]
+    return result
+
+
+def _near2far_plane(src, dx, dims):
+    """
+    Splits the near2far equivalent sources `src` (the records of
+    `dft_near2far.get_near_sources`) on a planar surface into the normal direction,
+    the tangential directions, the tangential grid indices and half-pixel offsets, and
+    the normal half-pixel layers of the sources.
+    """
+    xs = src[:, :3]
+    extent = np.ptp(xs[:, :dims], axis=0)
+    nd = int(np.argmin(extent))
+    if extent[nd] > 1.01 * dx:
+        raise ValueError("the FFT near-to-far transform requires a planar near-field surface")
+    td = [d for d in range(dims) if d != nd]
+    tmin = xs[:, td].min(axis=0)
+    u = np.rint(2 * (xs[:, td] - tmin) / dx).astype(int)
+    nmin = xs[:, nd].min()
+    layer = np.rint(2 * (xs[:, nd] - nmin) / dx).astype(int)
+    return nd, td, tmin, nmin, u // 2, u % 2, layer
+
+
+def _farfield_fft(src, freq, eps, mu, dx, dims, x, periodicity=(), oversampling=4):
+    """
+    Returns the far-zone fields, an `len(x)` x `len(freq)` x 6 array of (Ex,Ey,Ez,Hx,Hy,Hz),
+    at the far points `x` (an N x 3 array) of the near2far equivalent sources `src`
+    (the records of `dft_near2far.get_near_sources`) on a planar surface of grid
+    spacing `dx` in a `dims`-dimensional cell. The radiation vectors are computed by
+    zero-padded (`oversampling`) FFTs over the surface and interpolated to the
+    tangential wavevectors of the far points, and the `periodicity` (a list of
+    (direction, nperiods, phase, period) tuples) is included as an array factor.
+    """
+    chan = np.array([_N2F_CHANNELS.get(int(c), -1) for c in src[:, 3]])
+    if np.any(chan < 0):
+        raise ValueError("the FFT near-to-far transform does not support cylindrical coordinates")
+    dft = src[:, 5::2] + 1j * src[:, 6::2]
+    nd, td, tmin, nmin, idx, off, layer = _near2far_plane(src, dx, dims)
+
+    # zero-padded FFT grids, with the phase center ic in the middle of the surface
+    ic = idx.max(axis=0) // 2
+    M = [int(2 * np.ceil(0.5 * oversampling * (n + 1))) for n in idx.max(axis=0)]
+    xc = np.zeros(3)
+    xc[td] = tmin + ic * dx
+    xc[nd] = nmin
+    r = np.asarray(x, dtype=float)[:, :dims] - xc[:dims]
+    R = np.linalg.norm(r, axis=1)
+    rhat = np.zeros((len(R), 3))
+    rhat[:, :dims] = r / R[:, np.newaxis]
+
+    # FFT separately each set of sources with the same component and Yee-grid offset
+    groups = {}
+    for n, key in enumerate(zip(chan, layer, *off.T)):
+        groups.setdefault(key, []).append(n)
+    groups = {key: np.array(n) for key, n in groups.items()}
+
+    Z = np.sqrt(mu / eps)
+    EH = np.zeros((len(R), len(freq), 6), dtype=np.complex128)
+    for i, f in enumerate(freq):
+        k = 2 * np.pi * f * np.sqrt(eps * mu)
+        kt = k * rhat[:, td]
+        q = [kt[:, j] * M[j] * dx / (2 * np.pi) for j in range(len(td))]
+
+        # radiation vectors N (electric currents) and L (magnetic currents)
+        NL = np.zeros((len(R), 6), dtype=np.complex128)
+        for (ch, ly, *o), n in groups.items():
+            A = np.zeros(M, dtype=np.complex128)
+            np.add.at(A, tuple((idx[n, j] - ic[j]) % M[j] for j in range(len(td))), dft[n, i])
+            S = _lagrange_interp(np.fft.fftn(A)[..., np.newaxis], q)[:, 0]
+            phase = k * rhat[:, nd] * ly * 0.5 * dx
+            phase += sum(kt[:, j] * o[j] * 0.5 * dx for j in range(len(td)))
+            NL[:, ch] += S * np.exp(-1j * phase)
+
+        # array factor of the periodic copies
+        for d, nperiods, phi, period in periodicity:
+            m = np.arange(-nperiods, nperiods + 1)
+            NL *= np.sum(np.exp(1j * np.outer(phi - k * rhat[:, d] * period, m)), axis=1)[:, np.newaxis]
+
+        if dims == 2:
+            g = 0.25j * np.sqrt(2 / (np.pi * k * R)) * np.exp(1j * (k * R - 0.25 * np.pi))
+        else:
+            g = np.exp(1j * k * R) / (4 * np.pi * R)
+        N, L = NL[:, :3], NL[:, 3:]
+        E = Z * (N - rhat * np.sum(rhat * N, axis=1)[:, np.newaxis]) - np.cross(rhat, L)
+        E *= 1j * k * g[:, np.newaxis]
+        EH[:, i, :3] = E
+        EH[:, i, 3:] = np.cross(rhat, E) / Z
+    return EH
+
+
 class DftEnergy(DftObj):
     """
     """
@@ -781,6 +901,70 @@ class EigenmodeData(object):
         return mp.eigenmode_amplitude(self.swigobj, swig_point, component)
 
 
+class TimeSeries(object):
+    """
+    A time series of one or more field components at given points, recorded at every
+    (`decimation_factor`-th) timestep by the C++ code into a contiguous buffer. A
+    `TimeSeries` is created by [`Simulation.add_time_series`](#Simulation.add_time_series)
+    rather than constructed directly. It has the following attributes:
+
+    + **`data`** — The recorded field values as a complex NumPy array with one row per
+      sample and one column per point (or a 1d array for a single component and point).
+      Every process records only its own contributions to the field values, which are
+      summed over the processes into a new array when `data` is first accessed after
+      recording more samples. That access is therefore collective: it must be made on
+      all processes (e.g. not only inside `if mp.am_master()`). Further accesses return
+      the same array until more samples are recorded, and so do all accesses after
+      `remove()`.
+
+    + **`times`** — The times (in Meep units) of the samples in `data`, which does not
+      require accessing `data`.
+
+    + **`dt`** — The time between samples, i.e. `decimation_factor` times the timestep.
+    """
+    def __init__(self, sim, probes, single, decimation_factor):
+        self.sim = sim
+        self.single = single
+        self.decimation_factor = decimation_factor
+        self.dt = decimation_factor * sim.fields.dt
+        self.t0 = sim.meep_time()
+        self._fields = sim.fields  # keeps the probes alive if sim.fields is replaced
+        self._probes = probes
+        self._data = None  # data gathered so far
+
+    def _num_samples(self):
+        # the same on all processes, without gathering the samples
+        if self._probes is None:
+            return self._data.shape[0]
+        return self._probes.time_series_length() + self._probes.num_samples()
+
+    def _gather(self):
+        if self._data is None or self._data.shape[0] != self._num_samples():
+            self._data = mp._get_time_series(self._probes)
+        return self._data
+
+    @property
+    def data(self):
+        d = self._data if self._probes is None else self._gather()
+        return d[:, 0] if self.single else d
+
+    @property
+    def times(self):
+        return self.t0 + self.dt * np.arange(self._num_samples())
+
+    def remove(self):
+        """
+        Stop recording, keeping the data recorded so far. This must be called on all
+        processes.
+        """
+        if self._probes is not None:
+            self._gather()
+            self._fields.remove_field_probes(self._probes)
+            self._fields = None
+            self._probes = None
+            self.sim._time_series.remove(self)
+
+
 class Harminv(object):
     """
     `Harminv` is implemented as a class with a [`__call__`](#Harminv.__call__) method,
@@ -828,7 +1012,7 @@ class Harminv(object):
     # do something with h.modes
     ```
     """
-    def __init__(self, c, pt, fcen, df, mxbands=None):
+    def __init__(self, c, pt, fcen, df, mxbands=None, decimation_factor=1):
         """
         Construct a Harminv object.
 
@@ -839,14 +1023,24 @@ class Harminv(object):
         `harminv:`) as comma-delimited text, and also storing them to the variable
         `Harminv.modes`. The optional argument `mxbands` is the maximum number of modes to
         search for. Defaults to 100.
+
+        The field is recorded natively (see
+        [`Simulation.add_time_series`](#Simulation.add_time_series)) at every timestep
+        from the first time the step function is called until the end of the run. If
+        `decimation_factor` is greater than 1, only every `decimation_factor`-th timestep
+        is recorded, which is sufficient as long as `decimation_factor` times the
+        timestep is smaller than half the period of the largest frequency in the
+        fields. The recorded data are stored in `Harminv.data`.
         """
         self.c = c
         self.pt = pt
         self.fcen = fcen
         self.df = df
         self.mxbands = mxbands
+        self.decimation_factor = decimation_factor
         self.data = []
         self.data_dt = 0
+        self.time_series = None
         self.modes = []
         self.spectral_density = 1.1
         self.Q_thresh = 50.0
@@ -862,15 +1056,24 @@ class Harminv(object):
         """
         self.step_func(sim, todo)
 
+    def _next_step(self, sim):
+        return _next_step(sim, self.step_func)
+
     def _collect_harminv(self):
 
         def _collect1(c, pt):
             self.t0 = 0
 
             def _collect2(sim):
-                self.data_dt = sim.meep_time() - self.t0
-                self.t0 = sim.meep_time()
-                self.data.append(sim.get_field_point(c, pt))
+                if c >= mp.Dielectric:  # derived components are not recorded natively
+                    self.data_dt = sim.meep_time() - self.t0
+                    self.t0 = sim.meep_time()
+                    self.data.append(sim.get_field_point(c, pt))
+                elif self.time_series is None:
+                    self.time_series = sim.add_time_series(c, pt, decimation_factor=self.decimation_factor)
+                    self.data_dt = self.time_series.dt
+            _collect2._next_step = lambda sim: (sim.fields.t if c >= mp.Dielectric or self.time_series is None
+                                                else float('inf'))
             return _collect2
         return _collect1
 
@@ -919,6 +1122,10 @@ class Harminv(object):
                 mb = 100
             else:
                 mb = self.mxbands
+            if self.time_series is not None:
+                self.time_series.remove()
+                self.data = self.time_series.data
+                self.time_series = None
             self.modes = self._analyze_harminv(sim, mb)
 
         f1 = self._collect_harminv()
@@ -964,7 +1171,11 @@ class Simulation(object):
                  force_all_components=False,
                  split_chunks_evenly=True,
                  chunk_layout=None,
-                 collect_stats=False):
+                 collect_stats=False,
+                 divergence_check_interval=100,
+                 num_threads=1,
+                 structure_cache='',
+                 structure_cache_size=10 * 1024**3):
         """
         All `Simulation` attributes are described in further detail below. In brackets
         after each variable is the type of value that it should hold. The classes, complex
@@ -1144,6 +1355,24 @@ class Simulation(object):
         + **`progress_interval` [`number`]** — Time interval (seconds) after which Meep
           prints a progress message. Default is 4 seconds.
 
+        + **`divergence_check_interval` [`integer`]** — Number of timesteps between
+          checks of the fields for NaN or Inf values (e.g. from a numerical instability),
+          in which case the simulation is aborted with a message giving the field
+          component and location of a bad value. The check scans the fields locally on
+          each process followed by a single reduction, so its cost is small as long as
+          the interval is not too short. Set to 0 to disable the check. Default is 100.
+
+        + **`num_threads` [`integer`]** — Number of [OpenMP](https://en.wikipedia.org/wiki/OpenMP)
+          threads over which each process timesteps its chunks (curl, E/H update,
+          polarization, and DFT kernels) and computes the subpixel averaging of its
+          pixels (unless the geometry contains a `MaterialGrid`, a material function,
+          or a `Prism`), which requires Meep to be compiled with `--with-openmp`. This can be combined with MPI, e.g. with one process per node
+          or per socket and one thread per core. When greater than 1, the cell is split
+          into at least `num_threads` chunks per process (unless `chunk_layout` is
+          given) so that the threads have separate chunks to work on, and every
+          process gets adjacent chunks rather than round-robin ones. Set to 0 to use
+          the OpenMP default (the `OMP_NUM_THREADS` environment variable). Default is 1.
+
         + **`extra_materials` [ list of `Medium` class ]** — By default, Meep turns off
           support for material dispersion ([susceptibilities](#susceptibility) or
           [conductivity](Materials.md#conductivity-and-complex)) or nonlinearities if none
@@ -1162,6 +1391,23 @@ class Simulation(object):
           `mp.dump_structure`. Defaults to an empty string. See [Load and Dump
           Structure](#load-and-dump-structure) for more information.
 
+        + **`structure_cache` [`string`]** — If not empty, the name of a directory in which
+          the initialized structure (ε, μ, conductivities, nonlinearities, and dispersive
+          materials, including the [subpixel averaging](Subpixel_Smoothing.md)) is stored
+          by `init_sim`, keyed by a hash of the geometry, materials, cell, resolution,
+          boundary layers, symmetries, chunk layout, and subpixel-averaging parameters.
+          A later simulation with the same parameters, e.g. a sweep over sources or
+          monitors, loads the structure from this cache instead of recomputing it.
+          Structures with a `material_function` or `epsilon_func` that uses anything
+          other than its arguments (e.g. global variables or modules), or with a
+          `chunk_layout` file/`Simulation`, are not cached. Defaults to an empty string
+          (no cache).
+
+        + **`structure_cache_size` [`number`]** — Maximum total size (in bytes) of the
+          files in the `structure_cache` directory: when a new structure is stored, the
+          least-recently used structures are removed until the total size is below this
+          limit. Defaults to 10 GiB.
+
         + **`chunk_layout` [`string` or `Simulation` instance or `BinaryPartition` class]** —
           This will cause the `Simulation` to use the chunk layout described by either
           (1) an `.h5` file (created using `Simulation.dump_chunk_layout`), (2) another
@@ -1220,6 +1466,8 @@ class Simulation(object):
         self.m = m
         self.force_complex_fields = force_complex_fields
         self.progress_interval = progress_interval
+        self.divergence_check_interval = divergence_check_interval
+        self.num_threads = num_threads
         self.init_sim_hooks = []
         self.run_index = 0
         self.filename_prefix = filename_prefix
@@ -1233,7 +1481,11 @@ class Simulation(object):
         self.material_function = material_function
         self.epsilon_func = epsilon_func
         self.load_structure_file = load_structure
+        self.structure_cache = structure_cache
+        self.structure_cache_size = structure_cache_size
         self.dft_objects = []
+        self._field_probes = []
+        self._time_series = []
         self._is_initialized = False
         self.force_all_components = force_all_components
         self.split_chunks_evenly = split_chunks_evenly
@@ -1671,6 +1923,8 @@ class Simulation(object):
         self.absorber_vols = fragment_vols[4]
         self.gv = gv
 
+        structure_hash = self._structure_cache_hash() if self.structure_cache else None
+
         self.structure = mp.create_structure_and_set_materials(
             self.cell_size,
             self.dft_data_list,
@@ -1681,7 +1935,7 @@ class Simulation(object):
             gv,
             br,
             sym,
-            self.num_chunks,
+            self._num_chunks(),
             self.Courant,
             self.eps_averaging,
             self.subpixel_tol,
@@ -1693,12 +1947,16 @@ class Simulation(object):
             absorbers,
             self.extra_materials,
             self.split_chunks_evenly,
-            False if self.chunk_layout and not isinstance(self.chunk_layout,mp.BinaryPartition) else True,
+            False if (self.chunk_layout and not isinstance(self.chunk_layout,mp.BinaryPartition)) or structure_hash else True,
             None,
             True if self._output_stats is not None else False,
-            self.chunk_layout if self.chunk_layout and isinstance(self.chunk_layout,mp.BinaryPartition) else None
+            self.chunk_layout if self.chunk_layout and isinstance(self.chunk_layout,mp.BinaryPartition) else None,
+            self.num_threads
         )
 
+        if structure_hash:
+            self._load_or_dump_cached_structure(structure_hash)
+
         if self._output_stats is not None:
             sys.exit(0)
 
@@ -1794,6 +2052,67 @@ class Simulation(object):
 
         return result
 
+    def _num_chunks(self):
+        # with multiple threads, each process needs (at least) one chunk per thread
+        if self.num_threads > 1 and self.chunk_layout is None:
+            return max(self.num_chunks, self.num_threads * mp.count_processors())
+        return self.num_chunks
+
+    def _structure_cache_hash(self):
+        # Hash of everything that determines the initialized structure, or None
+        # if the structure cannot be cached (e.g. if the materials are given
+        # by Python functions that depend on global state).
+        if self.load_structure_file or (self.chunk_layout and not isinstance(self.chunk_layout, mp.BinaryPartition)):
+            return None
+
+        params = [mp.__version__, mp.count_processors(), mp.get_realnum_size(), self._num_chunks(),
+                  self.split_chunks_evenly, self.chunk_layout, self.cell_size, self.resolution,
+                  self.dimensions, self.geometry_center, self.ensure_periodicity and not not self.k_point,
+                  self.symmetries, self.boundary_layers, self.geometry, self.default_material,
+                  self.extra_materials, self.eps_averaging, self.subpixel_tol, self.subpixel_maxeval,
+                  self.Courant]
+        if self.epsilon_input_file:
+            fname = self.epsilon_input_file.split(':')[0]
+            params += [os.path.abspath(fname), os.path.getsize(fname), os.path.getmtime(fname)]
+
+        h = hashlib.sha1()
+        try:
+            _hash_structure_params(h, params)
+        except TypeError:
+            if verbosity.meep > 0:
+                print("structure cannot be cached: materials are not hashable")
+            return None
+        return h
+
+    def _load_or_dump_cached_structure(self, h):
+        # The chunk layout is part of the key since the dumped arrays are per chunk.
+        for gv, owner in zip(self.structure.get_chunk_volumes(), self.structure.get_chunk_owners()):
+            _hash_structure_params(h, [get_center_and_size(gv.surroundings()), int(owner)])
+        fname = os.path.join(self.structure_cache, 'structure-{}.h5'.format(h.hexdigest()))
+
+        if mp.max_to_all(int(mp.am_master() and os.path.isfile(fname))):
+            if verbosity.meep > 0:
+                print("loading structure from cache file {}".format(fname))
+            self.structure.load(fname)
+            if mp.am_master():
+                # mark the file as recently used for the LRU eviction
+                os.utime(fname, None)
+            return
+
+        self.set_materials()
+
+        if mp.am_master() and not os.path.isdir(self.structure_cache):
+            os.makedirs(self.structure_cache)
+        mp.all_wait()
+        # dump to a temporary file first so that concurrent simulations
+        # sharing the cache never load a partially written structure
+        tmpname = '{}.{}.tmp'.format(fname, int(mp.sum_to_all(os.getpid() if mp.am_master() else 0)))
+        self.structure.dump(tmpname)
+        mp.all_wait()
+        if mp.am_master():
+            os.replace(tmpname, fname)
+            _evict_structure_cache(self.structure_cache, self.structure_cache_size, fname)
+
     def get_max_chunk_communication_area(self):
         return max(self._get_chunk_communication_areas())
 
@@ -1833,7 +2152,7 @@ class Simulation(object):
             self.gv,
             mp.boundary_region(),
             mp.symmetry(),
-            self.num_chunks,
+            self._num_chunks(),
             self.Courant,
             self.eps_averaging,
             self.subpixel_tol,
@@ -1848,7 +2167,44 @@ class Simulation(object):
             True,
             self.structure,
             False,
-            None
+            None,
+            self.num_threads
+        )
+
+    def update_materials(self, vol=None, center=None, size=None):
+        """
+        Recompute the materials, including the subpixel averaging, only at the pixels near
+        the volume specified by either a `Volume` `vol` or a `center` and `size`, reusing
+        the rest of the structure. This is useful after changing the weights of a
+        `MaterialGrid` (via `update_weights`) that only covers this volume, e.g. the
+        `DesignRegion` of an adjoint optimization, and is much cheaper than re-initializing
+        the whole structure when the volume is small compared to the cell. Like
+        `set_materials`, this can be called in a step function. Does nothing if the
+        structure has not been initialized yet.
+        """
+        if self.structure is None:
+            return
+
+        if self.fields:
+            self.fields.remove_susceptibilities()
+
+        where = self._volume_from_kwargs(vol, center, size)
+        absorbers = [bl for bl in self.boundary_layers if type(bl) is Absorber]
+
+        mp.update_structure_materials(
+            self.structure,
+            self.cell_size,
+            self.gv,
+            where,
+            self.eps_averaging,
+            self.subpixel_tol,
+            self.subpixel_maxeval,
+            self.geometry,
+            self.geometry_center,
+            self.ensure_periodicity and not not self.k_point,
+            self.default_material,
+            absorbers,
+            self.extra_materials
         )
 
     def dump_structure(self, fname):
@@ -1915,6 +2271,14 @@ class Simulation(object):
             not self.accurate_fields_near_cylorigin
         )
 
+        self.fields.divergence_check_interval = self.divergence_check_interval
+        self.fields.num_threads = self.num_threads
+        if self.num_threads != 1 and not mp.with_openmp():
+            warnings.warn("num_threads is ignored since Meep was not compiled with OpenMP",
+                          RuntimeWarning)
+        self._field_probes = []
+        self._stop_time_series()
+
         if self.force_all_components and self.dimensions != 1:
             self.fields.require_component(mp.Ez)
             self.fields.require_component(mp.Hz)
@@ -1975,6 +2339,14 @@ class Simulation(object):
         return _has_mu(self.default_material)
 
     def get_estimated_memory_usage(self):
+        """
+        Returns an estimate of the memory (in bytes) used by the fields, materials,
+        DFT and dispersive arrays of all processes. The size of the $\varepsilon$/$\mu$
+        and conductivity arrays is the one actually allocated: in chunks where a
+        diagonal $\varepsilon$ or $\mu$ is homogeneous, its array is compressed to a
+        single value. If `mp.verbosity` is at least 1, the size of these arrays with
+        and without this compression is printed.
+        """
         if self.fields is None:
             self.collect_stats = True
             self.init_sim()
@@ -1987,11 +2359,10 @@ class Simulation(object):
         E_realnums = self.fragment_stats.num_pixels_in_box * (2 if is_complex else 1) * realnums_per_grid_point
         H_realnums = self.fragment_stats.num_pixels_in_box * (2 if is_complex else 1) * realnums_per_grid_point
         D_realnums = self.fragment_stats.num_pixels_in_box * (2 if is_complex else 1) * realnums_per_grid_point
-        chi1inv_realnums = self.fragment_stats.num_pixels_in_box * 9
 
         Mu_realnums = 0
         if self.has_mu():
-            Mu_realnums = chi1inv_realnums + H_realnums
+            Mu_realnums = H_realnums
 
         dft_realnums = self.fragment_stats.num_dft_pixels * 2
         dispersive_realnums = self.fragment_stats.num_susceptibility_pixels * 6 * (2 if is_complex else 1)
@@ -1999,7 +2370,15 @@ class Simulation(object):
         total_realnums = (E_realnums + H_realnums + D_realnums + Mu_realnums +
                           dft_realnums + dispersive_realnums)
 
-        total_bytes = total_realnums * mp.get_realnum_size()
+        # the chi1inv and conductivity arrays are taken from the structure, in which the
+        # arrays of homogeneous chunks are compressed to a single value
+        material_bytes = self.structure.material_storage()
+        if verbosity.meep > 0:
+            uncompressed_bytes = self.structure.material_storage(True)
+            print("chi1inv/conductivity storage: {} bytes ({} bytes uncompressed, ratio {:.2f})".format(
+                material_bytes, uncompressed_bytes, uncompressed_bytes / max(material_bytes, 1)))
+
+        total_bytes = total_realnums * mp.get_realnum_size() + material_bytes
 
         return total_bytes
 
@@ -2066,6 +2445,75 @@ class Simulation(object):
         v3 = py_v3_to_vec(self.dimensions, pt, self.is_cylindrical)
         return self.fields.get_field_from_comp(c, v3)
 
+    def _add_field_probes(self, cs, pts):
+        """
+        Register native probes of the components `cs` at the points `pts`, which are
+        sampled at every timestep (starting with the current time) without any
+        communication until their samples are requested, and are removed at the end of
+        the current run.
+        """
+        probes = self.fields.add_field_probes()
+        for c, pt in zip(cs, pts):
+            probes.add_point(c, py_v3_to_vec(self.dimensions, pt, self.is_cylindrical))
+        probes.sample()
+        self._field_probes.append(probes)
+        return probes
+
+    def _remove_field_probes(self):
+        for probes in self._field_probes:
+            self.fields.remove_field_probes(probes)
+        self._field_probes = []
+
+    def add_time_series(self, c, pt, decimation_factor=1, max_samples=0):
+        """
+        Record the field component `c` (e.g. `mp.Ez`) at the point `pt` (a `Vector3`) at
+        every timestep, starting with the current time, and return a
+        [`TimeSeries`](#TimeSeries) object whose `data` property is a NumPy view of the
+        recorded values. The fields are interpolated as in `get_field_point` and are
+        recorded by the C++ code without any Python or MPI overhead. This is much
+        cheaper than calling `get_field_point` from a step function, especially for
+        long runs.
+
+        `c` and `pt` can also be lists (of the same length, or with a single component or
+        point that is used for all of them), in which case `data` has one column per
+        point. If `decimation_factor` is greater than 1, only every
+        `decimation_factor`-th timestep is recorded. If you know the number of samples in
+        advance, passing it as `max_samples` preallocates the buffer (which otherwise
+        grows as needed).
+
+        The recording continues over subsequent runs until `TimeSeries.remove()` is
+        called or the fields are reinitialized.
+        """
+        if self.fields is None:
+            self.init_sim()
+
+        single = not isinstance(c, (list, tuple)) and not isinstance(pt, list)
+        cs = list(c) if isinstance(c, (list, tuple)) else [c]
+        pts = list(pt) if isinstance(pt, list) else [pt]
+        if len(cs) == 1:
+            cs = cs * len(pts)
+        elif len(pts) == 1:
+            pts = pts * len(cs)
+        elif len(cs) != len(pts):
+            raise ValueError("add_time_series: got {} components for {} points".format(len(cs), len(pts)))
+        if decimation_factor < 1:
+            raise ValueError("decimation_factor must be a positive integer, got {}".format(decimation_factor))
+
+        probes = self.fields.add_field_probes()
+        probes.decimation_factor = decimation_factor
+        for ci, pi in zip(cs, pts):
+            probes.add_point(ci, py_v3_to_vec(self.dimensions, pi, self.is_cylindrical))
+        if max_samples > 0:
+            probes.reserve(max_samples)
+        probes.sample()
+        ts = TimeSeries(self, probes, single, decimation_factor)
+        self._time_series.append(ts)
+        return ts
+
+    def _stop_time_series(self):
+        for ts in list(self._time_series):
+            ts.remove()
+
     def get_epsilon_point(self, pt, frequency=0):
         """
         Given a frequency `frequency` and a `Vector3` `pt`, returns the average eigenvalue
@@ -2180,6 +2628,7 @@ class Simulation(object):
 
                 def stop_cond(sim):
                     return sim.round_time() >= t0 + stop_time
+                stop_cond._next_step = lambda sim: _time_to_step(sim, t0 + stop_time)
 
                 cond[i] = stop_cond
 
@@ -2192,10 +2641,13 @@ class Simulation(object):
             else:
                 assert callable(cond[i]), "Stopping condition {} is not an integer or a function".format(cond[i])
 
+        # Between the timesteps at which some condition or step function may need to be
+        # evaluated (see _next_step), the fields are stepped in C++ without returning to Python.
         while not any([x(self) for x in cond]):
             for func in step_funcs:
                 _eval_step_func(self, func, 'step')
-            self.fields.step()
+            next_step = _min_next_step(self, list(cond) + list(step_funcs))
+            self.fields.step_n(int(max(1, min(next_step - self.fields.t, 2**30))))
 
         # Translating the recursive scheme version of run-until into an iterative version
         # (because python isn't tail-call-optimized) means we need one extra iteration to
@@ -2206,6 +2658,8 @@ class Simulation(object):
         for func in step_funcs:
             _eval_step_func(self, func, 'finish')
 
+        self._remove_field_probes()
+
         if do_progress and self.progress:
             self.progress.value = t0 + stop_time
             self.progress.description = "100% done "
@@ -2229,6 +2683,7 @@ class Simulation(object):
             else:
                 def f(sim):
                     return cond[i](sim) and sim.round_time() >= ts
+                f._next_step = lambda sim: _next_step(sim, cond[i])
                 new_conds.append(f)
 
         self._run_until(new_conds, step_funcs)
@@ -2268,7 +2723,7 @@ class Simulation(object):
 
         return h
 
-    def run_k_points(self, t, k_points):
+    def run_k_points(self, t, k_points, num_groups=1):
         """
         Given a list of `Vector3`, `k_points` of *k* vectors, runs a simulation for each
         *k* point (i.e. specifying Bloch-periodic boundary conditions) and extracts the
@@ -2282,14 +2737,38 @@ class Simulation(object):
         imaginary parts, prefixed by `freqs-im:`. See [Tutorial/Resonant Modes and
         Transmission in a Waveguide
         Cavity](Python_Tutorials/Resonant_Modes_and_Transmission_in_a_Waveguide_Cavity.md).
-        """
+
+        If `num_groups` is greater than 1, the *k* points are divided among `num_groups`
+        simulations that run in parallel. When running with several MPI processes, these
+        are divided into `num_groups` groups (as in
+        [`divide_parallel_processes`](#divide_parallel_processes)) so `num_groups` must be
+        at most the number of processes; otherwise, `num_groups` worker processes are
+        forked (which is not supported on Windows, nor by a Meep compiled with MPI, for
+        which forking after MPI is initialized is unsafe, so that a run on a single
+        process of such a Meep is serial). The results are returned and printed in the
+        same order as for a serial run, but the simulation is reset (as by `reset_meep`)
+        afterwards.
+        """
+        if num_groups > 1 and mp.count_processors() == 1 and mp.with_mpi():
+            warnings.warn("run_k_points: cannot fork worker processes after MPI is initialized; "
+                          "running the k points serially", RuntimeWarning)
+            num_groups = 1
+
+        if num_groups > 1:
+            all_k_freqs = self._run_k_points_parallel(t, k_points, num_groups)
+        else:
+            all_k_freqs = None
+
         k_index = 0
         all_freqs = []
 
         for k in k_points:
             k_index += 1
-            harminv = self.run_k_point(t, k)
-            freqs = [complex(m.freq, m.decay) for m in harminv.modes]
+            if all_k_freqs is None:
+                harminv = self.run_k_point(t, k)
+                freqs = [complex(m.freq, m.decay) for m in harminv.modes]
+            else:
+                freqs = all_k_freqs[k_index - 1]
 
             print("freqs:, {}, {}, {}, {}, ".format(k_index, k.x, k.y, k.z), end='')
             print(', '.join([str(f.real) for f in freqs]))
@@ -2300,6 +2779,41 @@ class Simulation(object):
 
         return all_freqs
 
+    def _run_k_points_parallel(self, t, k_points, num_groups):
+        self.reset_meep()
+        if mp.count_processors() > 1:
+            # every group runs the k points k_points[n::num_groups], padding its list of
+            # frequencies with NaN (up to the largest number of modes found by any group)
+            # so that they can be gathered with merge_subgroup_data
+            n = mp.divide_parallel_processes(num_groups)
+            group_freqs = {}
+            for i in range(n, len(k_points), num_groups):
+                harminv = self.run_k_point(t, k_points[i])
+                group_freqs[i] = [complex(m.freq, m.decay) for m in harminv.modes]
+            mp.begin_global_communications()
+            max_modes = mp.max_to_all(max([len(f) for f in group_freqs.values()] + [0]))
+            mp.end_global_communications()
+            freqs = np.full((len(k_points), max(max_modes, 1)), np.nan, dtype=np.complex128)
+            for i, f in group_freqs.items():
+                freqs[i, :len(f)] = f
+            freqs = mp.merge_subgroup_data(freqs)
+            mp.end_divide_parallel()
+            self.reset_meep()
+            return [[f for f in freqs[i, :, i % num_groups] if not np.isnan(f)] for i in range(len(k_points))]
+        else:
+            # Lazy import
+            import multiprocessing
+            global _k_points_sim
+            _k_points_sim = self
+            pool = multiprocessing.get_context('fork').Pool(num_groups)
+            try:
+                all_freqs = pool.map(_run_k_point_freqs, [(t, k) for k in k_points], chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+                _k_points_sim = None
+            return all_freqs
+
     def set_epsilon(self, eps):
         if self.fields is None:
             self.init_sim()
@@ -2402,7 +2916,7 @@ class Simulation(object):
 
     def add_dft_fields(self, *args, **kwargs):
         """
-        `add_dft_fields(cs, fcen, df, nfreq, freq, where=None, center=None, size=None, yee_grid=False)` ##sig
+        `add_dft_fields(cs, fcen, df, nfreq, freq, where=None, center=None, size=None, yee_grid=False, phase_recurrence=True, decimation_factor=1)` ##sig
 
         Given a list of field components `cs`, compute the Fourier transform of these
         fields for `nfreq` equally spaced frequencies covering the frequency range
@@ -2412,7 +2926,10 @@ class Simulation(object):
         default routine interpolates the Fourier transformed fields at the center of each
         voxel within the specified volume. Alternatively, the exact Fourier transformed
         fields evaluated at each corresponding Yee grid point is available by setting
-        `yee_grid` to `True`.
+        `yee_grid` to `True`. By default, the Fourier transforms are accumulated using
+        a phase recurrence (one complex multiplication per frequency per timestep rather
+        than an exponential); the original direct evaluation can be selected by setting
+        `phase_recurrence` to `False`.
         """
         components = args[0]
         args = fix_dft_args(args, 1)
@@ -2423,19 +2940,22 @@ class Simulation(object):
         yee_grid = kwargs.get('yee_grid', False)
         center_v3 = Vector3(*center) if center is not None else None
         size_v3 = Vector3(*size) if size is not None else None
+        phase_recurrence = kwargs.get('phase_recurrence', True)
+        decimation_factor = kwargs.get('decimation_factor', 1)
         use_centered_grid = not yee_grid
-        dftf = DftFields(self._add_dft_fields, [components, where, center_v3, size_v3, freq, use_centered_grid])
+        dftf = DftFields(self._add_dft_fields, [components, where, center_v3, size_v3, freq, use_centered_grid,
+                                                phase_recurrence, decimation_factor])
         self.dft_objects.append(dftf)
         return dftf
 
-    def _add_dft_fields(self, components, where, center, size, freq, use_centered_grid):
+    def _add_dft_fields(self, components, where, center, size, freq, use_centered_grid, phase_recurrence=True, decimation_factor=1):
         if self.fields is None:
             self.init_sim()
         try:
             where = self._volume_from_kwargs(where, center, size)
         except ValueError:
             where = self.fields.total_volume()
-        return self.fields.add_dft_fields(components, where, freq, use_centered_grid)
+        return self.fields.add_dft_fields(components, where, freq, use_centered_grid, phase_recurrence, decimation_factor)
 
     def output_dft(self, dft_fields, fname):
         """
@@ -2464,7 +2984,7 @@ class Simulation(object):
 
     def add_near2far(self, *args, **kwargs):
         """
-        `add_near2far(fcen, df, nfreq, freq, Near2FarRegions..., nperiods=1)`  ##sig
+        `add_near2far(fcen, df, nfreq, freq, Near2FarRegions..., nperiods=1, phase_recurrence=True, decimation_factor=1, fft=False)`  ##sig
 
         Add a bunch of `Near2FarRegion`s to the current simulation (initializing the
         fields if they have not yet been initialized), telling Meep to accumulate the
@@ -2472,23 +2992,38 @@ class Simulation(object):
         covering the frequency range `fcen-df/2` to `fcen+df/2` or an array/list `freq`
         for arbitrarily spaced frequencies. Return a `near2far` object, which you can pass
         to the functions below to get the far fields.
+
+        If `fft=True`, the near-field surface must be planar (a single plane, in 2d or 3d)
+        and `get_farfield` and `get_farfields` compute the far fields from the *angular
+        spectrum* of the surface, obtained by FFTs over the plane, rather than by summing
+        the Green's function over every near-field point for every far point. This is
+        much faster for many far points (e.g. a radiation pattern on a dense angular
+        grid), but the result is the asymptotic far-zone field: it is only accurate at
+        distances $r$ much greater than both the wavelength and $D^2/\lambda$ for a surface
+        of diameter $D$ (including its `nperiods` copies, which are included as an array
+        factor).
         """
         args = fix_dft_args(args, 0)
         freq = args[0]
         near2fars = args[1:]
         nperiods = kwargs.get('nperiods', 1)
-        n2f = DftNear2Far(self._add_near2far, [freq, nperiods, near2fars])
+        phase_recurrence = kwargs.get('phase_recurrence', True)
+        decimation_factor = kwargs.get('decimation_factor', 1)
+        fft = kwargs.get('fft', False)
+        n2f = DftNear2Far(self._add_near2far, [freq, nperiods, near2fars, phase_recurrence, decimation_factor],
+                          fft=fft)
         self.dft_objects.append(n2f)
         return n2f
 
-    def _add_near2far(self, freq, nperiods, near2fars):
+    def _add_near2far(self, freq, nperiods, near2fars, phase_recurrence=True, decimation_factor=1):
         if self.fields is None:
             self.init_sim()
-        return self._add_fluxish_stuff(self.fields.add_dft_near2far, freq, near2fars, nperiods)
+        return self._add_fluxish_stuff(self.fields.add_dft_near2far, freq, near2fars, nperiods,
+                                       phase_recurrence, decimation_factor)
 
-    def add_energy(self, *args):
+    def add_energy(self, *args, **kwargs):
         """
-        `add_energy(fcen, df, nfreq, freq, EnergyRegions...)`  ##sig
+        `add_energy(fcen, df, nfreq, freq, EnergyRegions..., phase_recurrence=True, decimation_factor=1)`  ##sig
 
         Add a bunch of `EnergyRegion`s to the current simulation (initializing the fields
         if they have not yet been initialized), telling Meep to accumulate the appropriate
@@ -2500,14 +3035,16 @@ class Simulation(object):
         args = fix_dft_args(args, 0)
         freq = args[0]
         energys = args[1:]
-        en = DftEnergy(self._add_energy, [freq, energys])
+        phase_recurrence = kwargs.get('phase_recurrence', True)
+        decimation_factor = kwargs.get('decimation_factor', 1)
+        en = DftEnergy(self._add_energy, [freq, energys, phase_recurrence, decimation_factor])
         self.dft_objects.append(en)
         return en
 
-    def _add_energy(self, freq, energys):
+    def _add_energy(self, freq, energys, phase_recurrence=True, decimation_factor=1):
         if self.fields is None:
             self.init_sim()
-        return self._add_fluxish_stuff(self.fields.add_dft_energy, freq, energys)
+        return self._add_fluxish_stuff(self.fields.add_dft_energy, freq, energys, phase_recurrence, decimation_factor)
 
     def _display_energy(self, name, func, energys):
         if energys:
@@ -2584,6 +3121,9 @@ class Simulation(object):
         of fields $(E_x^1,E_y^1,E_z^1,H_x^1,H_y^1,H_z^1,E_x^2,E_y^2,E_z^2,H_x^2,H_y^2,H_z^2,...)$
         for the frequencies 1,2,…,`nfreq`.
         """
+        if near2far.fft:
+            EH = self._get_farfields_fft(near2far, np.array([[x.x, x.y, x.z]]))
+            return list(EH.ravel())
         return mp._get_farfield(near2far.swigobj, py_v3_to_vec(self.dimensions, x, is_cylindrical=self.is_cylindrical))
 
     def get_farfields(self, near2far, resolution, where=None, center=None, size=None):
@@ -2601,6 +3141,10 @@ class Simulation(object):
         if self.fields is None:
             self.init_sim()
         vol = self._volume_from_kwargs(where, center, size)
+        if near2far.fft:
+            dims = [len(c) for _, c in self._get_farfield_grid(vol, resolution) if len(c) > 1]
+            return self._farfields_dict(self._get_farfields_grid_fft(near2far, vol, resolution), dims,
+                                        near2far.nfreqs)
         self.fields.am_now_working_on(mp.GetFarfieldsTime)
         result = mp._get_farfields_array(near2far.swigobj, vol, resolution)
         self.fields.finished_working()
@@ -2619,6 +3163,154 @@ class Simulation(object):
             'Hz': res_hz,
         }
 
+    def get_farfields_tiles(self, near2far, resolution, where=None, center=None, size=None, npoints=65536):
+        """
+        A generator version of `get_farfields`, for far-field grids that are too large
+        to compute (or store) at once: the far fields are computed in tiles of
+        approximately `npoints` far points at a time, which are yielded as tuples
+        `(s, farfields)`. Here, `farfields` is a dictionary of the NumPy arrays of the tile
+        like those of `get_farfields`, and `s` is the `slice` of the first dimension of the
+        arrays of `get_farfields` that it corresponds to, so that the full arrays could
+        be assembled via e.g. `Ex[s] = farfields['Ex']`. (If the far-field grid is a single
+        point, there is a single tile with `s` equal to `Ellipsis`.) For example, to
+        compute the total power in the far fields of a large grid:
+
+        ```py
+        P = 0
+        for s, ff in sim.get_farfields_tiles(n2f, 50, center=mp.Vector3(), size=mp.Vector3(100,100,100)):
+            P += np.sum(np.abs(ff['Ex'])**2 + np.abs(ff['Ey'])**2 + np.abs(ff['Ez'])**2)
+        ```
+        """
+        if self.fields is None:
+            self.init_sim()
+        vol = self._volume_from_kwargs(where, center, size)
+        shape = [len(c) for _, c in self._get_farfield_grid(vol, resolution)]
+        dims = [n for n in shape if n > 1]
+        npts = int(np.prod(shape))
+
+        # tiles of whole rows of the first (non-singleton) dimension
+        row = npts // dims[0] if dims else 1
+        nrows = max(1, npoints // row)
+        for r in range(0, dims[0] if dims else 1, nrows):
+            r1 = min(r + nrows, dims[0]) if dims else 1
+            if near2far.fft:
+                EH = self._get_farfields_grid_fft(near2far, vol, resolution, r * row, r1 * row)
+            else:
+                self.fields.am_now_working_on(mp.GetFarfieldsTime)
+                result = mp._get_farfields_block(near2far.swigobj, vol, resolution, r * row, r1 * row)
+                self.fields.finished_working()
+                EH = np.moveaxis(complexarray(result[0::2], result[1::2]), 0, -1)
+            s = slice(r, r1) if dims else Ellipsis
+            yield s, self._farfields_dict(EH, [r1 - r] + dims[1:] if dims else [], near2far.nfreqs)
+
+    def _get_near_sources(self, near2far):
+        if self.is_cylindrical or self.dimensions not in (2, 3):
+            raise ValueError("the FFT near-to-far transform requires a 2d or 3d Cartesian cell")
+        return near2far.swigobj.get_near_sources().reshape(-1, 5 + 2 * near2far.nfreqs)
+
+    def _get_farfields_fft(self, near2far, x):
+        src = self._get_near_sources(near2far)
+        self.fields.am_now_working_on(mp.GetFarfieldsTime)
+        EH = _farfield_fft(src, np.asarray(near2far.freq), near2far.eps, near2far.mu, 1 / self.resolution,
+                           self.dimensions, x, mp._get_near2far_periodicity(near2far.swigobj))
+        self.fields.finished_working()
+        return EH
+
+    def _get_farfield_grid(self, vol, resolution):
+        # the (row-major) grid of far points of dft_near2far::get_farfields_array, as a list
+        # of (Vector3 index, coordinates) of its dimensions
+        vmin = vol.center - 0.5 * vol.size
+        grid = []
+        for d in [2, 0] if self.is_cylindrical else [2] if self.dimensions == 1 else range(self.dimensions):
+            n = int(math.floor(vol.size[d] * resolution))
+            grid.append((d, np.linspace(vmin[d], vmin[d] + vol.size[d], n) if n > 1 else np.array([vmin[d]])))
+        return grid
+
+    def _get_farfields_grid_fft(self, near2far, vol, resolution, start=0, end=None):
+        grid = self._get_farfield_grid(vol, resolution)
+        idx = np.unravel_index(np.arange(start, end or np.prod([len(c) for _, c in grid])), [len(c) for _, c in grid])
+        x = np.zeros((len(idx[0]), 3))
+        for (d, c), i in zip(grid, idx):
+            x[:, d] = c[i]
+        return self._get_farfields_fft(near2far, x)
+
+    def _farfields_dict(self, EH, shape, nfreqs):
+        # the dictionary of far-field arrays of the given spatial shape from EH,
+        # an npoints x nfreqs x 6 array
+        EH = EH.reshape(shape + ([nfreqs] if nfreqs > 1 else []) + [6])
+        return {c: EH[..., i] for i, c in enumerate(['Ex', 'Ey', 'Ez', 'Hx', 'Hy', 'Hz'])}
+
+    def get_farfield_orders(self, near2far):
+        """
+        Given a `near2far` object whose near-field surface is a plane spanning the unit
+        cell of a cell with Bloch-periodic boundaries (via `k_point`) in all of the
+        directions of the plane, returns the Floquet (diffraction) orders that are
+        radiated by the infinite periodic array of copies of the surface on its outward
+        side (given by the sign of the `weight` of the `Near2FarRegion`), computed for each
+        order from the Fourier transform of the near fields over one unit cell. The result
+        is a `namedtuple` with the fields:
+
+        + `orders`: an array of the integer indices of the orders in the directions of
+          the plane (in the order x, y, z), of shape `norders` x 1 in 2d or `norders` x 2
+          in 3d. Only orders that propagate at some frequency are included.
+        + `k`: the wavevectors $\mathbf{k}_m$ of the orders, an array of shape `nfreq` x
+          `norders` x 3. Orders that are evanescent at a given frequency have a zero normal
+          component.
+        + `E`, `H`: the complex amplitudes of the plane waves of the orders, arrays of shape
+          `nfreq` x `norders` x 3 such that the fields radiated by the array are
+          $\sum_m \mathbf{E}_m e^{i\mathbf{k}_m\cdot\mathbf{x}}$ (and similarly for
+          $\mathbf{H}$). Evanescent orders have zero amplitudes.
+
+        As for the far fields, the amplitudes have the units and scaling of the *Fourier
+        transforms* of the fields.
+        """
+        src = self._get_near_sources(near2far)
+        if any(_N2F_CHANNELS.get(int(c), -1) < 0 for c in src[:, 3]):
+            raise ValueError("get_farfield_orders does not support cylindrical coordinates")
+        dx = 1 / self.resolution
+        nd, td, _, _, _, _, _ = _near2far_plane(src, dx, self.dimensions)
+        period = np.array([self.cell_size[d] for d in td])
+        if not self.k_point or np.any(np.ptp(src[:, td], axis=0) + dx < period * (1 - 1e-6)):
+            raise ValueError("get_farfield_orders requires a near-field surface spanning a periodic cell")
+        kbloch = np.array([self.k_point[d] for d in td])
+        side = 1 if near2far.regions[0].weight > 0 else -1
+
+        freq = np.asarray(near2far.freq)
+        eps, mu = near2far.eps, near2far.mu
+        Z = np.sqrt(mu / eps)
+        kmax = 2 * np.pi * np.max(freq) * np.sqrt(eps * mu)
+        m = [np.arange(np.ceil((-0.5 * kmax / np.pi - kb) * a), np.floor((0.5 * kmax / np.pi - kb) * a) + 1)
+             for kb, a in zip(kbloch, period)]
+        orders = np.stack(np.meshgrid(*m, indexing='ij'), axis=-1).reshape(-1, len(td))
+        kt = 2 * np.pi * (kbloch + orders / period)
+        orders = orders[np.sum(kt**2, axis=1) < kmax**2].astype(int)
+        kt = 2 * np.pi * (kbloch + orders / period)
+
+        chan = np.array([_N2F_CHANNELS[int(c)] for c in src[:, 3]])
+        dft = src[:, 5::2] + 1j * src[:, 6::2]
+        k = np.zeros((len(freq), len(orders), 3))
+        E = np.zeros((len(freq), len(orders), 3), dtype=np.complex128)
+        H = np.zeros((len(freq), len(orders), 3), dtype=np.complex128)
+        for i, f in enumerate(freq):
+            k0 = 2 * np.pi * f * np.sqrt(eps * mu)
+            kn2 = k0**2 - np.sum(kt**2, axis=1)
+            prop = kn2 > 0
+            k[i][:, td] = kt
+            k[i][prop, nd] = side * np.sqrt(kn2[prop])
+
+            # radiation vectors N (electric currents) and L (magnetic currents) of a unit cell
+            phase = np.exp(-1j * np.dot(src[:, :3], k[i].T))
+            NL = np.zeros((len(orders), 6), dtype=np.complex128)
+            for ch in np.unique(chan):
+                NL[:, ch] = np.dot(dft[chan == ch, i], phase[chan == ch])
+            N, L = NL[prop, :3], NL[prop, 3:]
+            khat = k[i][prop] / k0
+            Em = Z * (N - khat * np.sum(khat * N, axis=1)[:, np.newaxis]) - np.cross(khat, L)
+            Em *= (-0.5 * k0 / (np.prod(period) * np.sqrt(kn2[prop])))[:, np.newaxis]
+            E[i][prop] = Em
+            H[i][prop] = np.cross(khat, Em) / Z
+        return FarfieldOrders(orders=orders, k=k, E=E, H=H)
+
     def output_farfields(self, near2far, fname, resolution, where=None, center=None, size=None):
         """
         Given an HDF5 file name `fname` (does *not* include the `.h5` suffix), a `Volume`
@@ -2630,7 +3322,8 @@ class Simulation(object):
         Fourier-transformed $E$ and $H$ fields on this grid. Each dataset is an
         nx&#215;ny&#215;nz&#215;nfreq 4d array of space&#215;frequency although dimensions
         that =1 are omitted. The volume can optionally be specified via `center` and
-        `size`.
+        `size`. The far fields are computed and written to the file in blocks of grid
+        points, so that large far-field grids do not need to fit in memory.
         """
         if self.fields is None:
             self.init_sim()
@@ -2699,9 +3392,9 @@ class Simulation(object):
         self.load_near2far_data(near2far, n2fdata)
         near2far.scale_dfts(complex(-1.0))
 
-    def add_force(self, *args):
+    def add_force(self, *args, **kwargs):
         """
-        `add_force(fcen, df, nfreq, freq, ForceRegions...)`  ##sig
+        `add_force(fcen, df, nfreq, freq, ForceRegions..., phase_recurrence=True, decimation_factor=1)`  ##sig
 
         Add a bunch of `ForceRegion`s to the current simulation (initializing the fields
         if they have not yet been initialized), telling Meep to accumulate the appropriate
@@ -2713,14 +3406,16 @@ class Simulation(object):
         args = fix_dft_args(args, 0)
         freq = args[0]
         forces = args[1:]
-        force = DftForce(self._add_force, [freq, forces])
+        phase_recurrence = kwargs.get('phase_recurrence', True)
+        decimation_factor = kwargs.get('decimation_factor', 1)
+        force = DftForce(self._add_force, [freq, forces, phase_recurrence, decimation_factor])
         self.dft_objects.append(force)
         return force
 
-    def _add_force(self, freq, forces):
+    def _add_force(self, freq, forces, phase_recurrence=True, decimation_factor=1):
         if self.fields is None:
             self.init_sim()
-        return self._add_fluxish_stuff(self.fields.add_dft_force, freq, forces)
+        return self._add_fluxish_stuff(self.fields.add_dft_force, freq, forces, phase_recurrence, decimation_factor)
 
     def display_forces(self, *forces):
         """
@@ -2796,9 +3491,9 @@ class Simulation(object):
         self.load_force_data(force, fdata)
         force.scale_dfts(complex(-1.0))
 
-    def add_flux(self, *args):
+    def add_flux(self, *args, **kwargs):
         """
-        `add_flux(fcen, df, nfreq, freq, FluxRegions...)` ##sig
+        `add_flux(fcen, df, nfreq, freq, FluxRegions..., phase_recurrence=True, decimation_factor=1)` ##sig
 
         Add a bunch of `FluxRegion`s to the current simulation (initializing the fields if
         they have not yet been initialized), telling Meep to accumulate the appropriate
@@ -2806,22 +3501,38 @@ class Simulation(object):
         frequency range `fcen-df/2` to `fcen+df/2` or an array/list `freq` for arbitrarily
         spaced frequencies. Return a *flux object*, which you can pass to the functions
         below to get the flux spectrum, etcetera.
+
+        By default, the Fourier transforms are accumulated using a cached phase
+        recurrence and a tiled kernel, which is much cheaper for large `nfreq`; pass
+        `phase_recurrence=False` to evaluate $e^{i\\omega t}$ directly at every timestep
+        (this keyword argument is also accepted by `add_dft_fields`, `add_mode_monitor`,
+        `add_near2far`, `add_energy`, and `add_force`).
+
+        The Fourier transforms are updated every timestep by default. For narrowband
+        monitors, `decimation_factor=N` only updates them every `N` timesteps (with
+        each update weighted by `N*dt`), and `decimation_factor=0` chooses the largest
+        `N` for which the sampling rate is at least the sum of the maximum monitor
+        frequency and the maximum source frequency (center frequency plus half the
+        bandwidth); no decimation is used if any source has an unknown bandwidth.
+        The same keyword argument is accepted by the other `add_*` DFT functions.
         """
         args = fix_dft_args(args, 0)
         freq = args[0]
         fluxes = args[1:]
-        flux = DftFlux(self._add_flux, [freq, fluxes])
+        phase_recurrence = kwargs.get('phase_recurrence', True)
+        decimation_factor = kwargs.get('decimation_factor', 1)
+        flux = DftFlux(self._add_flux, [freq, fluxes, phase_recurrence, decimation_factor])
         self.dft_objects.append(flux)
         return flux
 
-    def _add_flux(self, freq, fluxes):
+    def _add_flux(self, freq, fluxes, phase_recurrence=True, decimation_factor=1):
         if self.fields is None:
             self.init_sim()
-        return self._add_fluxish_stuff(self.fields.add_dft_flux, freq, fluxes)
+        return self._add_fluxish_stuff(self.fields.add_dft_flux, freq, fluxes, True, True, phase_recurrence, decimation_factor)
 
     def add_mode_monitor(self, *args, **kwargs):
         """
-        `add_mode_monitor(fcen, df, nfreq, freq, ModeRegions...)`  ##sig
+        `add_mode_monitor(fcen, df, nfreq, freq, ModeRegions..., yee_grid=False, phase_recurrence=True, decimation_factor=1)`  ##sig
 
         Similar to `add_flux`, but for use with `get_eigenmode_coefficients`.
         """
@@ -2829,11 +3540,13 @@ class Simulation(object):
         freq = args[0]
         fluxes = args[1:]
         yee_grid = kwargs.get("yee_grid", False)
-        flux = DftFlux(self._add_mode_monitor, [freq, fluxes, yee_grid])
+        phase_recurrence = kwargs.get("phase_recurrence", True)
+        decimation_factor = kwargs.get("decimation_factor", 1)
+        flux = DftFlux(self._add_mode_monitor, [freq, fluxes, yee_grid, phase_recurrence, decimation_factor])
         self.dft_objects.append(flux)
         return flux
 
-    def _add_mode_monitor(self, freq, fluxes, yee_grid):
+    def _add_mode_monitor(self, freq, fluxes, yee_grid, phase_recurrence=True, decimation_factor=1):
         if self.fields is None:
             self.init_sim()
 
@@ -2846,7 +3559,7 @@ class Simulation(object):
         d0 = region.direction
         d = self.fields.normal_direction(v.swigobj) if d0 < 0 else d0
 
-        return self.fields.add_mode_monitor(d, v.swigobj, freq, centered_grid)
+        return self.fields.add_mode_monitor(d, v.swigobj, freq, centered_grid, phase_recurrence, decimation_factor)
 
     def display_fluxes(self, *fluxes):
         """
@@ -3250,6 +3963,60 @@ class Simulation(object):
         else:
             raise ValueError("Invalid type of dft object: {}".format(dft_swigobj))
 
+    def get_dft_arrays(self, dft_obj, components, freqs=None, out=None):
+        """
+        Returns the Fourier-transformed fields of several components at several
+        frequencies of a `dft_fields` object at once. This is equivalent to calling
+        `get_dft_array` for every component and frequency, but all of the arrays are
+        gathered from the processes in a single pass.
+
+        **Parameters:**
+
+        + `dft_obj`: a `dft_fields` object obtained from calling `add_dft_fields`.
+
+        + `components`: a list of field components (e.g., `[mp.Ex, mp.Ey]`).
+
+        + `freqs`: a list of frequency indices. Defaults to all of the frequencies of
+          `dft_obj`.
+
+        + `out`: optional list of preallocated, C-contiguous `complex128` NumPy arrays,
+          one per component, which are filled in place. Each array must have
+          `len(freqs)` times as many entries as the array returned by `get_dft_array`
+          for that component (in any shape). The arrays of components that are not
+          stored by `dft_obj` (e.g. because no source excites them) are set to zero.
+
+        Returns a list with one array per component, of shape `(len(freqs),) + dims`
+        where `dims` is the shape of the array returned by `get_dft_array`, or the
+        arrays of `out` if given. If `out` is not given, the arrays are consecutive
+        views into a single buffer, and the arrays of components not stored by
+        `dft_obj` have shape `(len(freqs),)`.
+        """
+        if not self.dft_objects:
+            raise RuntimeError('DFT monitor dft_obj must be initialized before calling get_dft_arrays')
+
+        dft_swigobj = dft_obj.swigobj if hasattr(dft_obj, 'swigobj') else dft_obj
+        if type(dft_swigobj) is not mp.dft_fields:
+            raise ValueError("get_dft_arrays requires a dft_fields object, not {}".format(dft_swigobj))
+
+        if freqs is None:
+            freqs = range(len(dft_swigobj.freq))
+        freqs = [int(f) for f in freqs]
+        arrays, dims = mp._get_dft_arrays(self.fields, dft_swigobj, [int(c) for c in components],
+                                          freqs, None if out is None else list(out))
+        if out is not None:
+            return arrays
+
+        views = []
+        offset = 0
+        for buf, shape in zip(arrays, dims):
+            if shape is None:
+                views.append(np.zeros(len(freqs), dtype=np.complex128))
+                continue
+            size = len(freqs) * int(np.prod(shape))
+            views.append(buf[offset:offset + size].reshape((len(freqs),) + shape))
+            offset += size
+        return views
+
     def get_source(self, component, vol=None, center=None, size=None):
         """
         Return an array of complex values of the [source](#source) amplitude for
@@ -3598,9 +4365,15 @@ class Simulation(object):
         Reset all of Meep's parameters, deleting the fields, structures, etcetera, from
         memory as if you had not run any computations.
         """
-        self.fields = None
+        self._reset_fields()
         self.structure = None
+
+    def _reset_fields(self):
+        # like reset_meep, but keeps the structure (which is reused by the next init_sim)
+        self._stop_time_series()
+        self.fields = None
         self.dft_objects = []
+        self._field_probes = []
         self._is_initialized = False
 
     def restart_fields(self):
@@ -3678,20 +4451,22 @@ class Simulation(object):
     def mean_time_spent_on(self, time_sink):
         """
         Return the mean time spent by all processes for a type of work `time_sink` which
-        can be one of ten integer values `0`-`9`: (`0`) connecting chunks, (`1`) time stepping,
+        can be one of eleven integer values `0`-`10`: (`0`) connecting chunks, (`1`) time stepping,
         (`2`) copying boundaries, (`3`) MPI all-to-all communication/synchronization,
         (`4`) MPI one-to-one communication, (`5`) field output, (`6`) Fourier transforming,
-        (`7`) MPB mode solver, (`8`) near-to-far field transformation, and (`9`) other.
+        (`7`) MPB mode solver, (`8`) near-to-far field transformation, (`9`) subpixel
+        averaging (during the initialization of the structure), and (`10`) other.
         """
         return self.fields.mean_time_spent_on(time_sink)
 
     def time_spent_on(self, time_sink):
         """
         Return a list of times spent by each process for a type of work `time_sink` which
-        can be one of ten integer values `0`-`9`: (`0`) connecting chunks, (`1`) time stepping,
+        can be one of eleven integer values `0`-`10`: (`0`) connecting chunks, (`1`) time stepping,
         (`2`) copying boundaries, (`3`) MPI all-to-all communication/synchronization,
         (`4`) MPI one-to-one communication, (`5`) field output, (`6`) Fourier transforming,
-        (`7`) MPB mode solver, (`8`) near-to-far field transformation, and (`9`) other.
+        (`7`) MPB mode solver, (`8`) near-to-far field transformation, (`9`) subpixel
+        averaging (during the initialization of the structure), and (`10`) other.
         """
         return self.fields.time_spent_on(time_sink)
 
@@ -3970,6 +4745,64 @@ class Simulation(object):
         vis.visualize_chunks(self)
 
 
+# Simulation for the worker processes forked by Simulation.run_k_points
+_k_points_sim = None
+
+
+def _run_k_point_freqs(args):
+    t, k = args
+    harminv = _k_points_sim.run_k_point(t, k)
+    return [complex(m.freq, m.decay) for m in harminv.modes]
+
+
+def _hash_structure_params(h, x):
+    if x is None or isinstance(x, (bool, numbers.Number, str)):
+        h.update(repr(x).encode())
+    elif isinstance(x, np.ndarray):
+        h.update('{}{}'.format(x.dtype, x.shape).encode())
+        h.update(np.ascontiguousarray(x).tobytes())
+    elif isinstance(x, (list, tuple)):
+        h.update('{}{}'.format(type(x).__name__, len(x)).encode())
+        for y in x:
+            _hash_structure_params(h, y)
+    elif isinstance(x, dict):
+        for key in sorted(k for k in x if k != 'swigobj'):
+            _hash_structure_params(h, [key, x[key]])
+    elif isinstance(x, types.FunctionType):
+        # only functions whose result depends on nothing but their code and arguments
+        code = x.__code__
+        if code.co_names or code.co_freevars or x.__closure__:
+            raise TypeError("cannot hash function {}".format(x.__name__))
+        h.update(code.co_code)
+        _hash_structure_params(h, [code.co_consts, x.__defaults__])
+    elif hasattr(x, '__dict__') and not hasattr(x, 'this'):
+        _hash_structure_params(h, [type(x).__name__, vars(x)])
+    else:
+        raise TypeError("cannot hash {}".format(type(x).__name__))
+
+
+def _evict_structure_cache(cache_dir, max_size, keep):
+    # remove the least recently used structure files until the cache fits in max_size bytes
+    files = []
+    for f in os.listdir(cache_dir):
+        if f.startswith('structure-') and f.endswith('.h5'):
+            path = os.path.join(cache_dir, f)
+            try:
+                files.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:
+                pass
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_size:
+            break
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
 def _create_boundary_region_from_boundary_layers(boundary_layers, gv):
     br = mp.boundary_region()
 
@@ -4025,6 +4858,7 @@ def _combine_step_funcs(*step_funcs):
     def _combine(sim, todo):
         for func in step_funcs:
             _eval_step_func(sim, func, todo)
+    _combine._next_step = lambda sim: _min_next_step(sim, step_funcs)
     return _combine
 
 
@@ -4040,6 +4874,31 @@ def _eval_step_func(sim, func, todo):
         func(sim, todo)
 
 
+def _next_step(sim, func):
+    """
+    The earliest timestep at which calling the step function or condition `func` may do
+    anything (or return `True`), so that `Simulation.run` can call `fields.step_n` for
+    all the timesteps in between. Step functions can provide this as a `_next_step(sim)`
+    attribute; otherwise, they are called at every timestep.
+    """
+    next_step = getattr(func, '_next_step', None)
+    return sim.fields.t if next_step is None else next_step(sim)
+
+
+def _min_next_step(sim, funcs):
+    return min([_next_step(sim, f) for f in funcs] + [float('inf')])
+
+
+def _time_to_step(sim, t):
+    """
+    A lower bound for the first timestep at which `sim.round_time() >= t`, allowing for
+    the single-precision rounding of `round_time`.
+    """
+    if t == float('inf'):
+        return t
+    return max(sim.fields.t, int(math.floor(t / sim.fields.dt * (1 - 1e-6))) - 1)
+
+
 def _when_true_funcs(cond, *step_funcs):
     def _true(sim, todo):
         if todo == 'finish' or cond(sim):
@@ -4060,6 +4919,8 @@ def after_sources(*step_funcs):
         if sim.round_time() >= time:
             for func in step_funcs:
                 _eval_step_func(sim, func, todo)
+    _after_sources._next_step = lambda sim: max(_time_to_step(sim, sim.fields.last_source_time()),
+                                                _min_next_step(sim, step_funcs))
     return _after_sources
 
 
@@ -4073,6 +4934,9 @@ def after_sources_and_time(t, *step_funcs):
         if sim.round_time() >= time:
             for func in step_funcs:
                 _eval_step_func(sim, func, todo)
+    # the condition above amounts to 2 * round_time >= last_source_time + t
+    _after_s_and_t._next_step = lambda sim: max(_time_to_step(sim, 0.5 * (sim.fields.last_source_time() + t)),
+                                                _min_next_step(sim, step_funcs))
     return _after_s_and_t
 
 
@@ -4083,7 +4947,9 @@ def after_time(t, *step_funcs):
     """
     def _after_t(sim):
         return sim.round_time() >= t
-    return _when_true_funcs(_after_t, *step_funcs)
+    _after = _when_true_funcs(_after_t, *step_funcs)
+    _after._next_step = lambda sim: max(_time_to_step(sim, t), _min_next_step(sim, step_funcs))
+    return _after
 
 
 def at_beginning(*step_funcs):
@@ -4098,6 +4964,7 @@ def at_beginning(*step_funcs):
             for f in step_funcs:
                 _eval_step_func(sim, f, todo)
             closure['done'] = True
+    _beg._next_step = lambda sim: float('inf') if closure['done'] else sim.fields.t
     return _beg
 
 
@@ -4111,6 +4978,7 @@ def at_end(*step_funcs):
                 _eval_step_func(sim, func, 'step')
             for func in step_funcs:
                 _eval_step_func(sim, func, 'finish')
+    _end._next_step = lambda sim: float('inf')
     return _end
 
 
@@ -4127,6 +4995,7 @@ def at_every(dt, *step_funcs):
             for func in step_funcs:
                 _eval_step_func(sim, func, todo)
             closure['tlast'] = t
+    _every._next_step = lambda sim: _time_to_step(sim, closure['tlast'] + dt + (-0.5 * sim.fields.dt))
     return _every
 
 
@@ -4142,6 +5011,7 @@ def at_time(t, *step_funcs):
             for f in step_funcs:
                 _eval_step_func(sim, f, todo)
         closure['done'] = closure['done'] or todo == 'step'
+    _at_time._next_step = lambda sim: float('inf') if closure['done'] else sim.fields.t
     return after_time(t, _at_time)
 
 
@@ -4152,7 +5022,9 @@ def before_time(t, *step_funcs):
     """
     def _before_t(sim):
         return sim.round_time() < t
-    return _when_true_funcs(_before_t, *step_funcs)
+    _before = _when_true_funcs(_before_t, *step_funcs)
+    _before._next_step = lambda sim: _min_next_step(sim, step_funcs) if sim.round_time() < t else float('inf')
+    return _before
 
 
 def during_sources(*step_funcs):
@@ -4171,6 +5043,12 @@ def during_sources(*step_funcs):
             for func in step_funcs:
                 _eval_step_func(sim, func, 'finish')
             closure['finished'] = True
+
+    def _during_sources_next_step(sim):
+        if closure['finished']:
+            return float('inf')
+        return min(_time_to_step(sim, sim.fields.last_source_time()), _min_next_step(sim, step_funcs))
+    _during_sources._next_step = _during_sources_next_step
     return _during_sources
 
 
@@ -4197,6 +5075,7 @@ def in_volume(v, *step_funcs):
         sim.output_volume = v_save
         if eps_save:
             sim.last_eps_filename = eps_save
+    _in_volume._next_step = lambda sim: _min_next_step(sim, step_funcs)
     return _in_volume
 
 
@@ -4231,6 +5110,7 @@ def to_appended(fname, *step_funcs):
             closure['h5'] = None
             sim.output_h5_hook(sim.fields.h5file_name(fname, sim.get_filename_prefix()))
         sim.output_append_h5 = h5save
+    _to_appended._next_step = lambda sim: sim.fields.t if closure['h5'] is None else _min_next_step(sim, step_funcs)
     return _to_appended
 
 
@@ -4244,33 +5124,68 @@ def stop_when_fields_decayed(dt, c, pt, decay_by):
     over that time period &mdash; in this way, it won't be fooled just because the field
     happens to go through 0 at some instant.
 
+    `c` and `pt` can also be lists (of the same length, or with a single component or
+    point that is used for all of the probes), in which case the run continues until the
+    field has decayed at *every* probe. The fields are sampled at each timestep without
+    any Python or MPI overhead, and are only communicated (in a single reduction for all
+    the probes) every `dT`.
+
     Note that, if you make `decay_by` very small, you may need to increase the `cutoff`
     property of your source(s), to decrease the amplitude of the small high-frequency
     components that are excited when the source turns off. High frequencies near the
     [Nyquist frequency](https://en.wikipedia.org/wiki/Nyquist_frequency) of the grid have
     slow group velocities and are absorbed poorly by [PML](Perfectly_Matched_Layer.md).
     """
+    cs = list(c) if isinstance(c, (list, tuple)) else [c]
+    pts = list(pt) if isinstance(pt, list) else [pt]
+    if len(cs) == 1:
+        cs = cs * len(pts)
+    elif len(pts) == 1:
+        pts = pts * len(cs)
+    elif len(cs) != len(pts):
+        raise ValueError("stop_when_fields_decayed: got {} components for {} points".format(len(cs), len(pts)))
+    native = all(ci < mp.Dielectric for ci in cs)  # derived components need get_field_point
+
     closure = {
-        'max_abs': 0,
-        'cur_max': 0,
+        'max_abs': np.zeros(len(cs)),
+        'cur_max': np.zeros(len(cs)),
         't0': 0,
+        'probes': None,
+        'run_index': None,
     }
 
     def _stop(sim):
-        fabs = abs(sim.get_field_point(c, pt)) * abs(sim.get_field_point(c, pt))
-        closure['cur_max'] = max(closure['cur_max'], fabs)
+        if native:
+            if closure['run_index'] != sim.run_index:
+                closure['probes'] = sim._add_field_probes(cs, pts)
+                closure['run_index'] = sim.run_index
+        else:
+            fabs = np.array([abs(sim.get_field_point(ci, pi))**2 for ci, pi in zip(cs, pts)])
+            closure['cur_max'] = np.maximum(closure['cur_max'], fabs)
 
         if sim.round_time() <= dt + closure['t0']:
             return False
         else:
-            old_cur = closure['cur_max']
-            closure['cur_max'] = 0
+            if native:
+                old_cur = np.array(closure['probes'].max_abs2())
+            else:
+                old_cur = closure['cur_max']
+                closure['cur_max'] = np.zeros(len(cs))
             closure['t0'] = sim.round_time()
-            closure['max_abs'] = max(closure['max_abs'], old_cur)
-            if closure['max_abs'] != 0 and verbosity.meep > 0:
+            closure['max_abs'] = np.maximum(closure['max_abs'], old_cur)
+            if np.any(closure['max_abs'] != 0) and verbosity.meep > 0:
+                ratio = np.divide(old_cur, closure['max_abs'], out=np.zeros(len(cs)),
+                                  where=closure['max_abs'] != 0)
+                i = np.argmax(ratio)  # report the probe that has decayed the least
                 fmt = "field decay(t = {}): {} / {} = {}"
-                print(fmt.format(sim.meep_time(), old_cur, closure['max_abs'], old_cur / closure['max_abs']))
-            return old_cur <= closure['max_abs'] * decay_by
+                print(fmt.format(sim.meep_time(), old_cur[i], closure['max_abs'][i], ratio[i]))
+            return bool(np.all(old_cur <= closure['max_abs'] * decay_by))
+
+    def _stop_next_step(sim):
+        if native and closure['run_index'] == sim.run_index:
+            return _time_to_step(sim, dt + closure['t0'])
+        return sim.fields.t
+    _stop._next_step = _stop_next_step
     return _stop
 
 
@@ -4370,7 +5285,7 @@ def display_csv(sim, name, data):
 
 def display_progress(t0, t, dt):
     t_0 = mp.wall_time()
-    closure = {'tlast': mp.wall_time()}
+    closure = {'tlast': mp.wall_time(), 'step_last': None}
 
     def _disp(sim):
         t1 = mp.wall_time()
@@ -4388,6 +5303,22 @@ def display_progress(t0, t, dt):
             if verbosity.meep > 0:
                 print(msg_fmt.format(val1, t, val2, val3, val4))
             closure['tlast'] = t1
+            closure['step_last'] = sim.fields.t
+
+    def _disp_next_step(sim):
+        # estimate when the next message is due from the stepping rate since the last one;
+        # the wall times differ between the processes, so they agree on the earliest
+        # estimate in order to call the step functions at the same timesteps
+        if closure['step_last'] is None:
+            closure['step_last'] = sim.fields.t
+        steps = sim.fields.t - closure['step_last']
+        elapsed = mp.wall_time() - closure['tlast']
+        if steps <= 0 or elapsed <= 0:
+            nsteps = 1.0
+        else:
+            nsteps = max(1.0, float(int((dt - elapsed) * steps / elapsed)))
+        return sim.fields.t + int(-mp.max_to_all(-nsteps))
+    _disp._next_step = _disp_next_step
 
     return _disp
 
@@ -5126,7 +6057,7 @@ def get_group_masters():
 
     # Check if current worker is a group master
     is_group_master = True if mp.my_rank() == 0 else False
-    group_master_idx = np.zeros((num_workers,),dtype=np.bool)
+    group_master_idx = np.zeros((num_workers,),dtype=bool)
 
     # Formulate send and receive packets
     smsg = [np.array([is_group_master]),([1]*num_workers, [0]*num_workers)]
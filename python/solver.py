@@ -3,6 +3,7 @@ from __future__ import division, print_function
 
 import functools
 import math
+from collections import OrderedDict
 import os
 import numbers
 import re
@@ -97,7 +98,10 @@ class ModeSolver(object):
                  verbose=False,
                  optimize_grid_size=True,
                  eigensolver_nwork=3,
-                 eigensolver_block_size=-11):
+                 eigensolver_block_size=-11,
+                 num_k_groups=1,
+                 warm_start=False,
+                 warm_start_cache_size=1024**3):
 
         self.mode_solver = None
         self.resolution = resolution
@@ -119,6 +123,12 @@ class ModeSolver(object):
         self.current_k = mp.Vector3()
         self.k_split_num = 1
         self.k_split_index = 0
+        self.num_k_groups = num_k_groups
+        self.warm_start = warm_start
+        self.warm_start_cache_size = warm_start_cache_size
+        self._eigenvector_cache = OrderedDict()
+        self._warm_start_parity = None
+        self._warm_start_geometry = None
         self.eigensolver_iters = []
 
         grid_size = self._adjust_grid_size()
@@ -565,22 +575,13 @@ class ModeSolver(object):
     # given by index (in 0..num-1), along with the index in L of the first
     # element of the piece, as a list: [first-index, piece-of-L]
     def list_split(self, l, num, index):
-
-        def list_sub(l, start, length, index, rest):
-            if not l:
-                return list(reversed(rest))
-            if index >= start and index < (start + length):
-                return list_sub(l[1:], start, length, index + 1, [l[0]] + rest)
-            else:
-                return list_sub(l[1:], start, length, index + 1, rest)
-
         if index >= num or index < 0:
             return (len(l), [])
         else:
             block_size = (len(l) + num - 1) // num
             start = index * block_size
             length = min(block_size, (len(l) - index * block_size))
-            return (start, list_sub(l, start, length, 0, []))
+            return (start, list(l[start:start + max(length, 0)]))
 
     def get_lattice(self):
         if self.mode_solver is None:
@@ -886,6 +887,11 @@ class ModeSolver(object):
         self.mode_solver.solve_kpoint(k)
 
     def run_parity(self, p, reset_fields, *band_functions):
+        if (band_functions and self.num_k_groups > 1 and len(self.k_points) > 1 and
+                mp.count_processors() == 1):
+            raise ValueError("Band functions with num_k_groups > 1 require MPI, since "
+                             "otherwise the k points are solved in forked processes")
+
         if self.random_fields and self.randomize_fields not in band_functions:
             band_functions.append(self.randomize_fields)
 
@@ -905,6 +911,10 @@ class ModeSolver(object):
         if isinstance(reset_fields, basestring):
             self.load_eigenvectors(reset_fields)
 
+        if self.warm_start:
+            self._warm_start_parity = p
+            self._warm_start_geometry = self.mode_solver.get_dielectric_hash()
+
         if verbosity.mpb >= 1:
             print("{} k-points".format(len(self.k_points)))
 
@@ -913,39 +923,15 @@ class ModeSolver(object):
 
             print("elapsed time for initialization: {}".format(time.time() - init_time))
 
-        # TODO: Split over multiple processes
-        # k_split = list_split(self.k_points, self.k_split_num, self.k_split_index)
-        k_split = (0, self.k_points)
-        self.mode_solver.set_kpoint_index(k_split[0])
-
         if self.num_bands > 0:
-            for i, k in enumerate(k_split[1]):
-                self.current_k = k
-                solve_kpoint_time = time.time()
-                self.mode_solver.solve_kpoint(k)
-                self.iterations = self.mode_solver.get_iterations()
-                if verbosity.mpb >= 1:
-                    print("elapsed time for k point: {}".format(time.time() - solve_kpoint_time))
-                self.freqs = self.get_freqs()
-                self.all_freqs[i, :] = np.array(self.freqs)
-                self.band_range_data = self.update_band_range_data(self.band_range_data,
-                                                                   self.freqs, k)
-                self.eigensolver_iters += [self.iterations / self.num_bands]
-
-                for f in band_functions:
-                    num_args = get_num_args(f)
-                    if num_args == 1:
-                        f(self)
-                    elif num_args == 2:
-                        band = 1
-                        while band <= self.num_bands:
-                            f(self, band)
-                            band += 1
-                    else:
-                        raise ValueError("Band function should take 1 or 2 arguments. "
-                                         "The first must be a ModeSolver instance")
-
-            if len(k_split[1]) > 1:
+            if self.num_k_groups > 1 and len(self.k_points) > 1:
+                self._run_k_points_parallel(band_functions)
+            else:
+                self.mode_solver.set_kpoint_index(0)
+                for i, k in enumerate(self.k_points):
+                    self._solve_k_point(i, k, band_functions)
+
+            if len(self.k_points) > 1:
                 self.output_band_range_data(self.band_range_data)
                 self.gap_list = self.output_gaps(self.band_range_data)
             else:
@@ -960,6 +946,173 @@ class ModeSolver(object):
         if verbosity.mpb >= 1:
             print("done")
 
+    def _solve_eigenvectors(self, k):
+        self.current_k = k
+        if self.warm_start:
+            self._load_warm_start(k)
+        self.mode_solver.solve_kpoint(k)
+        self.iterations = self.mode_solver.get_iterations()
+        if self.warm_start:
+            self._save_warm_start(k)
+
+    def _solve_k_point(self, i, k, band_functions):
+        solve_kpoint_time = time.time()
+        self._solve_eigenvectors(k)
+        if verbosity.mpb >= 1:
+            print("elapsed time for k point: {}".format(time.time() - solve_kpoint_time))
+        self.freqs = self.get_freqs()
+        self.all_freqs[i, :] = np.array(self.freqs)
+        self.band_range_data = self.update_band_range_data(self.band_range_data,
+                                                           self.freqs, k)
+        self.eigensolver_iters += [self.iterations / self.num_bands]
+
+        for f in band_functions:
+            num_args = get_num_args(f)
+            if num_args == 1:
+                f(self)
+            elif num_args == 2:
+                band = 1
+                while band <= self.num_bands:
+                    f(self, band)
+                    band += 1
+            else:
+                raise ValueError("Band function should take 1 or 2 arguments. "
+                                 "The first must be a ModeSolver instance")
+
+    # With warm_start, the eigenvectors of every solved k point are cached in memory,
+    # keyed by (k point, parity, hash of the dielectric structure), and are used as the
+    # starting guess of the eigensolver when the same k point is solved again: from
+    # the exact entry if there is one, otherwise from the most recent one for the same
+    # k point and parity but a different structure (e.g. in a geometry sweep). Without
+    # a cache entry, the eigensolver starts from the eigenvectors of the previous k
+    # point as usual. The least recently used entries are evicted when the cache holds
+    # more than warm_start_cache_size bytes (1 GiB by default) of eigenvectors, and an
+    # integer warm_start also limits the cache to that many k points. With num_k_groups
+    # > 1, the eigenvectors solved by forked worker processes are sent back to the
+    # cache of the parent, while with MPI every process group caches the k points
+    # that it solves (which are the same in the next run with the same k_points).
+    def _warm_start_key(self, k):
+        return ((round(k.x, 12), round(k.y, 12), round(k.z, 12)), self._warm_start_parity)
+
+    def _load_warm_start(self, k):
+        key = self._warm_start_key(k)
+        dims = tuple(self.mode_solver.get_eigenvectors_slice_dims(self.num_bands))
+        ev = self._eigenvector_cache.get(key + (self._warm_start_geometry,))
+        if ev is not None:
+            self._eigenvector_cache.move_to_end(key + (self._warm_start_geometry,))
+        else:
+            for cached_key, cached_ev in self._eigenvector_cache.items():
+                if cached_key[:2] == key and cached_ev.shape == dims:
+                    ev = cached_ev
+        if ev is not None and ev.shape == dims:
+            self.set_eigenvectors(ev, 1)
+
+    def _save_warm_start(self, k):
+        key = self._warm_start_key(k) + (self._warm_start_geometry,)
+        self._cache_eigenvectors(key, np.asarray(self.get_eigenvectors(1, self.num_bands)))
+
+    def _cache_eigenvectors(self, key, ev):
+        self._eigenvector_cache.pop(key, None)
+        self._eigenvector_cache[key] = ev
+        max_len = None if self.warm_start is True else int(self.warm_start)
+        total = sum(cached_ev.nbytes for cached_ev in self._eigenvector_cache.values())
+        # the entry that was just added is always kept
+        while len(self._eigenvector_cache) > 1 and (
+                (max_len is not None and len(self._eigenvector_cache) > max_len) or
+                total > self.warm_start_cache_size):
+            total -= self._eigenvector_cache.popitem(last=False)[1].nbytes
+
+    # Solve for the k points split into num_k_groups contiguous pieces (as in
+    # list_split) in parallel, either by MPI process groups or (without MPI) by forked
+    # worker processes. all_freqs, band_range_data and eigensolver_iters are merged in
+    # the order of k_points, so that they are the same as for a serial run. With MPI,
+    # the band functions are called by the group that solves each k point, right after
+    # solving it as in a serial run: their outputs are numbered by the index of the k
+    # point, so the files of all the groups together are those of a serial run, but
+    # any Python state that they change is only changed in the processes of that group.
+    #
+    # The reductions of PyMPB are over mpb_comm, which is not (yet) an MPI communicator,
+    # so every process of a group holds the complete eigenvectors and the groups can
+    # solve their k points independently. This must be revisited if PyMPB distributes
+    # the fields over the processes of mpb_comm, which must then be the group's.
+    #
+    # Afterwards, the eigenvectors of the last k point are sent from the last piece to
+    # every process, so that the fields computed afterwards correspond to current_k
+    # and freqs, as after a serial run. The last k point is solved again from them to
+    # set up the eigensolver for it, which converges after an iteration or two.
+    def _run_k_points_parallel(self, band_functions=()):
+        num_groups = min(self.num_k_groups, len(self.k_points))
+        nk = len(self.k_points)
+        owner = np.zeros(nk, dtype=int)
+        for n in range(num_groups):
+            start, piece = self.list_split(self.k_points, num_groups, n)
+            owner[start:start + len(piece)] = n
+
+        iters = np.zeros(nk)
+        if mp.count_processors() > 1:
+            # Lazy import
+            from mpi4py import MPI
+            n = mp.divide_parallel_processes(num_groups)
+            iters0 = len(self.eigensolver_iters)
+            start, piece = self.list_split(self.k_points, num_groups, n)
+            self.mode_solver.set_kpoint_index(start)
+            for i, k in enumerate(piece):
+                self._solve_k_point(start + i, k, band_functions)
+            iters[start:start + len(piece)] = self.eigensolver_iters[iters0:]
+            self.eigensolver_iters = self.eigensolver_iters[:iters0]
+            all_freqs = mp.merge_subgroup_data(self.all_freqs)
+            all_iters = mp.merge_subgroup_data(iters)
+            mp.end_divide_parallel()
+            self.all_freqs = np.array([all_freqs[i, :, owner[i]] for i in range(nk)])
+            iters = np.array([all_iters[i, owner[i]] for i in range(nk)])
+
+            # the first process of the last group (as in divide_parallel_processes)
+            # sends the eigenvectors of the last k point
+            nprocs = mp.count_processors()
+            root = -(-(num_groups - 1) * nprocs // num_groups)
+            last_ev = np.ascontiguousarray(self.get_eigenvectors(1, self.num_bands),
+                                           dtype=np.complex128)
+            MPI.COMM_WORLD.Bcast(last_ev, root=root)
+        else:
+            # Lazy import
+            import multiprocessing
+            global _k_points_solver
+            _k_points_solver = (self, num_groups)
+            pool = multiprocessing.get_context('fork').Pool(num_groups)
+            try:
+                results = pool.map(_solve_k_point_piece, range(num_groups), chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+                _k_points_solver = None
+            for start, freqs, piece_iters, cached, ev in results:
+                self.all_freqs[start:start + len(freqs), :] = freqs
+                iters[start:start + len(freqs)] = piece_iters
+                for key, cached_ev in cached:
+                    self._cache_eigenvectors(key, cached_ev)
+                if ev is not None:
+                    last_ev = ev
+
+        self.eigensolver_iters += list(iters)
+        self.band_range_data = []
+        for i, k in enumerate(self.k_points):
+            self.band_range_data = self.update_band_range_data(self.band_range_data,
+                                                               list(self.all_freqs[i, :]), k)
+
+        mpb_verbosity = verbosity.mpb
+        verbosity.mpb = 0
+        try:
+            self.mode_solver.set_kpoint_index(nk - 1)
+            self.current_k = self.k_points[-1]
+            self.set_eigenvectors(last_ev, 1)
+            self.mode_solver.solve_kpoint(self.current_k)
+        finally:
+            verbosity.mpb = mpb_verbosity
+        if self.warm_start:
+            self._save_warm_start(self.current_k)
+        self.iterations = int(round(iters[-1] * self.num_bands))
+        self.freqs = self.get_freqs()
+
     def run(self, *band_functions):
         self.run_parity(mp.NO_PARITY, True, *band_functions)
 
@@ -1127,6 +1280,26 @@ class ModeSolver(object):
         return self.mode_solver.get_dominant_planewave(band)
 
 
+# ModeSolver and number of pieces for the worker processes forked
+# by ModeSolver._run_k_points_parallel
+_k_points_solver = None
+
+
+def _solve_k_point_piece(n):
+    ms, num_groups = _k_points_solver
+    start, piece = ms.list_split(ms.k_points, num_groups, n)
+    iters0 = len(ms.eigensolver_iters)
+    ms.mode_solver.set_kpoint_index(start)
+    for i, k in enumerate(piece):
+        ms._solve_k_point(start + i, k, ())
+    # the eigenvectors cached for warm starts by this piece (the most recent entries)
+    cached = list(ms._eigenvector_cache.items())[-len(piece):] if ms.warm_start else []
+    # the last piece also returns the eigenvectors of the last k point
+    ev = np.asarray(ms.get_eigenvectors(1, ms.num_bands)) if n == num_groups - 1 else None
+    return (start, ms.all_freqs[start:start + len(piece), :], ms.eigensolver_iters[iters0:],
+            cached, ev)
+
+
 # Predefined output functions (functions of the band index), for passing to `run`
 
 def output_hfield(ms, which_band):
@@ -5,8 +5,9 @@ except:
     import adjoint as mpa
 import numpy as np
 from autograd import numpy as npa
-from autograd import tensor_jacobian_product
+from autograd import tensor_jacobian_product, jacobian
 import unittest
+from unittest import mock
 from enum import Enum
 
 MonitorObject = Enum('MonitorObject', 'EIGENMODE DFT')
@@ -106,7 +107,7 @@ def forward_simulation(design_params,mon_type,frequencies=None):
         return Ez2
 
 
-def adjoint_solver(design_params, mon_type, frequencies=None):
+def adjoint_problem(mon_type, frequencies=None, objective_functions=None, **kwargs):
     matgrid = mp.MaterialGrid(mp.Vector3(Nx,Ny),
                               mp.air,
                               silicon,
@@ -149,15 +150,22 @@ def adjoint_solver(design_params, mon_type, frequencies=None):
 
     opt = mpa.OptimizationProblem(
         simulation = sim,
-        objective_functions = J,
+        objective_functions = objective_functions if objective_functions else J,
         objective_arguments = obj_list,
         design_regions = [matgrid_region],
         frequencies=frequencies,
-        decay_fields=[mp.Ez])
+        decay_fields=[mp.Ez],
+        **kwargs)
+
+    return opt
+
+
+def adjoint_solver(design_params, mon_type, frequencies=None):
+    opt = adjoint_problem(mon_type, frequencies)
 
     f, dJ_du = opt([design_params])
 
-    sim.reset_meep()
+    opt.sim.reset_meep()
 
     return f, dJ_du
 
@@ -262,6 +270,209 @@ class TestAdjointSolver(unittest.TestCase):
             print("Directional derivative -- adjoint solver: {}, FD: {}".format(adj_scale,fd_grad))
             np.testing.assert_array_almost_equal(adj_scale,fd_grad,decimal=5)
 
+    def test_forward_cache(self):
+        print("*** TESTING FORWARD CACHE ***")
+        opt = adjoint_problem(MonitorObject.EIGENMODE)
+        f, dJ_du = opt([p])
+
+        ## evaluating the same design again must not re-run the simulation
+        with mock.patch.object(opt, 'forward_run', side_effect=AssertionError):
+            f_func, df_func = opt.get_fdf_funcs()
+            self.assertEqual(f_func([p]), f)
+            np.testing.assert_array_equal(df_func([p]), dJ_du)
+
+        ## the previous design is still cached after evaluating a new one
+        opt.forward_cache.size = 2
+        f_dp, _ = opt([p+dp], need_gradient=False)
+        results_dp = opt.results_list
+        with mock.patch.object(opt, 'forward_run', side_effect=AssertionError):
+            self.assertEqual(opt([p])[0], f)
+
+            ## a cache hit restores the results of that design, without the
+            ## gradient if it was not computed
+            f_hit, dJ_du_hit = opt([p+dp], need_gradient=False)
+            self.assertEqual(f_hit, f_dp)
+            self.assertIsNone(dJ_du_hit)
+            np.testing.assert_array_equal(opt.results_list[0], results_dp[0])
+
+            ## the gradient of a cached design other than the current one only
+            ## needs the adjoint run, from the cached forward fields
+            f_grad, dJ_du_dp = opt([p+dp])
+            self.assertEqual(f_grad, f_dp)
+        opt.sim.reset_meep()
+
+        opt_dp = adjoint_problem(MonitorObject.EIGENMODE)
+        f_ref, dJ_du_ref = opt_dp([p+dp])
+        opt_dp.sim.reset_meep()
+        np.testing.assert_allclose(dJ_du_dp, dJ_du_ref, rtol=1e-6,
+                                   atol=1e-10*np.amax(np.abs(dJ_du_ref)))
+
+    def test_fourier_fields_adjoint_source(self):
+        print("*** TESTING FOURIER FIELDS ADJOINT SOURCE ***")
+        ## an objective depending on all of the points of the monitor
+        def J(dft_mon):
+            return npa.sum(npa.abs(dft_mon)**2, axis=(1,2))
+
+        def adjoint_fields(opt, srcs):
+            opt._reset_sim()
+            opt.sim.change_sources(srcs)
+            dft = opt.sim.add_dft_fields([mp.Ez], opt.frequencies,
+                                         where=opt.design_regions[0].volume)
+            opt.sim.run(until=100)
+            return np.array([opt.sim.get_dft_array(dft, mp.Ez, i) for i in range(opt.nf)])
+
+        for frequencies in [[fcen], [1/1.58, fcen, 1/1.53]]:
+            opt = adjoint_problem(MonitorObject.DFT, frequencies, [J])
+            opt([p], need_gradient=False)
+            opt.prepare_adjoint_run()
+            merged_srcs = opt.adjoint_sources[0]
+            self.assertTrue(all(isinstance(src, mp.IndexedSource) for src in merged_srcs))
+
+            ## one source per nonzero point, as before the sources were merged
+            m = opt.objective_arguments[0]
+            dJ = np.sum(jacobian(J, 0)(*opt.results_list), axis=1)
+            amp = -np.moveaxis(dJ, 0, -1) * m._adj_src_scale()
+            time_src = m._create_time_profile()
+            point_srcs = []
+            for xi, yi in zip(*np.nonzero(np.any(amp != 0, axis=-1))):
+                center = mp.Vector3(m._dg.x[xi], m._dg.y[yi])
+                if opt.nf == 1:
+                    src, amplitude = time_src, amp[xi,yi,0]
+                else:
+                    src = mpa.FilteredSource(time_src.frequency, frequencies,
+                                             amp[xi,yi], opt.sim.fields.dt)
+                    amplitude = 1
+                point_srcs.append(mp.Source(src, component=mp.Ez,
+                                            amplitude=amplitude, center=center))
+            self.assertGreater(len(point_srcs), 1)
+
+            fields_merged = adjoint_fields(opt, merged_srcs)
+            fields_points = adjoint_fields(opt, point_srcs)
+            opt.sim.reset_meep()
+            np.testing.assert_allclose(fields_merged, fields_points, rtol=1e-6,
+                                       atol=1e-8*np.amax(np.abs(fields_points)))
+
+    def test_distributed_gradient(self):
+        print("*** TESTING DISTRIBUTED GRADIENT ***")
+        for frequencies in [[fcen], [1/1.58, fcen, 1/1.53]]:
+            opt = adjoint_problem(MonitorObject.EIGENMODE, frequencies)
+            f, dJ_du = opt([p])
+            opt.sim.reset_meep()
+
+            opt = adjoint_problem(MonitorObject.EIGENMODE, frequencies)
+            opt.distributed_gradient = True
+            f_dist, dJ_du_dist = opt([p])
+            opt.sim.reset_meep()
+
+            np.testing.assert_array_equal(f_dist, f)
+            np.testing.assert_allclose(dJ_du_dist, dJ_du, rtol=1e-8,
+                                       atol=1e-10*np.amax(np.abs(dJ_du)))
+
+    def test_batch_adjoint_runs(self):
+        print("*** TESTING BATCHED ADJOINT RUNS ***")
+        frequencies = [1/1.58, fcen, 1/1.53]
+
+        ## objectives of a single frequency each (which share an adjoint run
+        ## when batched) and one of all of the frequencies
+        def J_freq(i):
+            return lambda mode_mon: npa.abs(mode_mon[i])**2
+        objective_functions = [J_freq(i) for i in range(len(frequencies))]
+        objective_functions.append(lambda mode_mon: npa.sum(npa.abs(mode_mon)**2))
+
+        results = []
+        for kwargs in [dict(batch_adjoint_runs=False),
+                       dict(batch_adjoint_runs=True),
+                       dict(batch_adjoint_runs=False, num_adjoint_groups=2),
+                       dict(batch_adjoint_runs=True, num_adjoint_groups=2)]:
+            opt = adjoint_problem(MonitorObject.EIGENMODE, frequencies,
+                                  objective_functions, **kwargs)
+            f, dJ_du = opt([p])
+            opt.sim.reset_meep()
+            if kwargs == dict(batch_adjoint_runs=True):
+                self.assertEqual(len(opt.adjoint_batches), 2)
+            results.append((f, dJ_du))
+
+        f_ref, dJ_du_ref = results[0]
+        for f, dJ_du in results[1:]:
+            np.testing.assert_array_equal(f, f_ref)
+            for g, g_ref in zip(dJ_du, dJ_du_ref):
+                np.testing.assert_allclose(g, g_ref, rtol=1e-4,
+                                           atol=1e-4*np.amax(np.abs(g_ref)))
+
+
+class TestBilinearInterpolationBasis(unittest.TestCase):
+
+    def brute_force_matrix(self, rho_x, rho_y, x_interp, y_interp):
+        ## interpolation weights of every grid point, one point at a time
+        A = np.zeros((x_interp.size*y_interp.size, rho_x.size*rho_y.size))
+        for m, x in enumerate(x_interp):
+            for n, y in enumerate(y_interp):
+                i = min(max(np.count_nonzero(rho_x < x), 1), rho_x.size-1) - 1
+                j = min(max(np.count_nonzero(rho_y < y), 1), rho_y.size-1) - 1
+                t = (x-rho_x[i])/(rho_x[i+1]-rho_x[i])
+                u = (y-rho_y[j])/(rho_y[j+1]-rho_y[j])
+                row = m*y_interp.size + n
+                A[row, i*rho_y.size+j] += (1-t)*(1-u)
+                A[row, i*rho_y.size+j+1] += (1-t)*u
+                A[row, (i+1)*rho_y.size+j] += t*(1-u)
+                A[row, (i+1)*rho_y.size+j+1] += t*u
+        return A
+
+    def test_interpolation_matrix(self):
+        basis = mpa.BilinearInterpolationBasis(resolution=4, size=mp.Vector3(1.5,1.0))
+        x_interp = np.linspace(-0.75, 0.75, 13)
+        y_interp = np.linspace(-0.5, 0.5, 8)
+
+        A = basis.get_interpolation_matrix(x_interp, y_interp)
+        A_ref = self.brute_force_matrix(basis.rho_x, basis.rho_y, x_interp, y_interp)
+        np.testing.assert_allclose(A.toarray(), A_ref, atol=1e-14)
+
+        ## evaluating the basis at a point agrees with the matrix
+        rho = np.random.rand(basis.num_design_params)
+        basis.set_rho_vector(rho)
+        values = [basis(mp.Vector3(x,y)) for x in x_interp for y in y_interp]
+        np.testing.assert_allclose(values, A_ref @ rho, atol=1e-14)
+
+    def test_interpolate(self):
+        basis = mpa.BilinearInterpolationBasis(resolution=4, size=mp.Vector3(1.5,1.0))
+        design_grid = mock.Mock(x=np.linspace(-0.75, 0.75, 13), y=np.linspace(-0.5, 0.5, 8))
+        rho = np.random.rand(basis.num_design_params)
+        basis.set_rho_vector(rho)
+
+        A_ref = self.brute_force_matrix(basis.rho_x, basis.rho_y, design_grid.x, design_grid.y)
+        rho_ref = (A_ref @ rho).reshape(13, 8)
+        np.testing.assert_allclose(basis.interpolate(design_grid), rho_ref, atol=1e-14)
+
+        ## evaluating the basis at arrays of points agrees with the grid
+        x, y = np.meshgrid(design_grid.x, design_grid.y, indexing='ij')
+        np.testing.assert_allclose(basis(mock.Mock(x=x, y=y)), rho_ref, atol=1e-14)
+
+    def test_interpolate_symmetry(self):
+        basis = mpa.BilinearInterpolationBasis(resolution=4, symmetry=[mp.X],
+                                               size=mp.Vector3(1.5,1.0))
+        design_grid = mock.Mock(x=np.linspace(-0.75, 0.75, 13), y=np.linspace(-0.5, 0.5, 8))
+        rho = np.random.rand(basis.num_design_params)
+        basis.set_rho_vector(rho)
+
+        values = basis.interpolate(design_grid)
+        np.testing.assert_allclose(values, values[::-1,:], atol=1e-14)
+        ref = [[basis(mp.Vector3(x,y)) for y in design_grid.y] for x in design_grid.x]
+        np.testing.assert_allclose(values, ref, atol=1e-14)
+
+    def test_basis_vjp(self):
+        basis = mpa.BilinearInterpolationBasis(resolution=4, size=mp.Vector3(1.5,1.0))
+        design_grid = mock.Mock(x=np.linspace(-0.75, 0.75, 13), y=np.linspace(-0.5, 0.5, 8))
+        dJ_deps = np.random.rand(13, 8, 2, 3)
+
+        A_ref = self.brute_force_matrix(basis.rho_x, basis.rho_y, design_grid.x, design_grid.y)
+        dJ_dp_ref = np.zeros((basis.num_design_params, 3))
+        for k in range(2):
+            for f in range(3):
+                dJ_dp_ref[:,f] += A_ref.T @ dJ_deps[:,:,k,f].flatten()
+
+        np.testing.assert_allclose(basis.get_basis_vjp(dJ_deps, design_grid), dJ_dp_ref,
+                                   rtol=1e-12)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -9,6 +9,14 @@ class TestCavityFarfield(unittest.TestCase):
 
     data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
 
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = mp.make_output_directory()
+
+    @classmethod
+    def tearDownClass(cls):
+        mp.delete_directory(cls.temp_dir)
+
     def run_test(self, nfreqs):
         eps = 13
         w = 1.2
@@ -78,6 +86,23 @@ class TestCavityFarfield(unittest.TestCase):
             np.testing.assert_allclose(ref_hy, result['Hy'])
             np.testing.assert_allclose(ref_hz, result['Hz'])
 
+        # the same far fields computed in tiles of grid points
+        tiles = {c: np.zeros_like(result[c]) for c in result}
+        for s, ff in sim.get_farfields_tiles(nearfield, resolution, where=vol, npoints=100):
+            for c in tiles:
+                tiles[c][s] = ff[c]
+        for c in result:
+            np.testing.assert_allclose(tiles[c], result[c])
+
+        # ... and written to a file in blocks of grid points
+        sim.filename_prefix = os.path.join(self.temp_dir, 'cavity')
+        sim.output_farfields(nearfield, 'farfield', resolution, where=vol)
+        mp.all_wait()
+        with h5py.File(os.path.join(self.temp_dir, 'cavity-farfield.h5'), 'r') as f:
+            for c in result:
+                np.testing.assert_allclose(mp.complexarray(f[c.lower() + '.r'][()], f[c.lower() + '.i'][()]),
+                                           result[c])
+
     def test_cavity_farfield(self):
         self.run_test(nfreqs=1)
 
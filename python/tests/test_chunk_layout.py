@@ -53,6 +53,24 @@ class TestChunkLayoutBinaryPartition(unittest.TestCase):
 
         self.assertListEqual([int(f) for f in owners],[f % mp.count_processors() for f in process_ids])
         self.assertListEqual(areas,chunk_areas)
-        
+
+    def test_chunk_owners_num_threads(self):
+        ## chunks are assigned round-robin unless they are timestepped by threads,
+        ## in which case every process gets consecutive chunks
+        nprocs = mp.count_processors()
+        for num_threads in [1, 2]:
+            sim = mp.Simulation(cell_size=mp.Vector3(10.0,5.0,0),
+                                resolution=10,
+                                num_chunks=4*nprocs,
+                                num_threads=num_threads)
+            sim.init_sim()
+            owners = [int(f) for f in sim.structure.get_chunk_owners()]
+            self.assertEqual(len(owners),4*nprocs)
+            if num_threads > 1 and mp.with_openmp():
+                expected = [i // 4 for i in range(4*nprocs)]
+            else:
+                expected = [i % nprocs for i in range(4*nprocs)]
+            self.assertListEqual(owners,expected)
+
 if __name__ == '__main__':
     unittest.main()
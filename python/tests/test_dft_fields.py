@@ -96,5 +96,85 @@ class TestDFTFields(unittest.TestCase):
         np.testing.assert_allclose(exp_fields, fields_arr)
         np.testing.assert_allclose(exp_flux, flux_arr)
 
+    def test_get_dft_arrays(self):
+        sim = self.init()
+        sim.init_sim()
+        freqs = [self.fcen - 0.1 * self.df, self.fcen, self.fcen + 0.1 * self.df]
+        components = [mp.Ex, mp.Ey, mp.Ez, mp.Hz]
+        dft_fields = sim.add_dft_fields(components, freqs, yee_grid=True)
+        thin_x_volume = mp.Volume(center=mp.Vector3(0.35*self.sxy), size=mp.Vector3(y=0.8*self.sxy))
+        thin_x_fields = sim.add_dft_fields([mp.Ez, mp.Hy], freqs, where=thin_x_volume)
+
+        sim.run(until_after_sources=50)
+
+        for dft, comps in [(dft_fields, components), (thin_x_fields, [mp.Ez, mp.Hy])]:
+            arrays = sim.get_dft_arrays(dft, comps, [2, 0])
+            for c, arr in zip(comps, arrays):
+                for i, f in enumerate([2, 0]):
+                    np.testing.assert_array_equal(arr[i], sim.get_dft_array(dft, c, f))
+
+        # the arrays are stored in place in preallocated arrays
+        out = [np.zeros(arr.size, dtype=np.complex128) for arr in arrays]
+        sim.get_dft_arrays(thin_x_fields, [mp.Ez, mp.Hy], [2, 0], out=out)
+        for arr, o in zip(arrays, out):
+            np.testing.assert_array_equal(o, arr.ravel())
+
+        # components without any DFT chunks (not excited by the Ez source) are zero
+        arrays = sim.get_dft_arrays(dft_fields, [mp.Hz, mp.Ez])
+        np.testing.assert_array_equal(arrays[0], np.zeros(3))
+        out = [np.ones((3, 4), dtype=np.complex128), np.zeros(arrays[1].shape, dtype=np.complex128)]
+        sim.get_dft_arrays(dft_fields, [mp.Hz, mp.Ez], out=out)
+        np.testing.assert_array_equal(out[0], 0)
+        np.testing.assert_array_equal(out[1], arrays[1])
+
+    def test_dft_change(self):
+        sim = self.init()
+        sim.init_sim()
+        dft_fields = sim.add_dft_fields([mp.Ez], [self.fcen - 0.1 * self.df, self.fcen],
+                                        where=mp.Volume(center=mp.Vector3(), size=mp.Vector3(4, 4)))
+        change = mp.dft_change(dft_fields.chunks, mp.Ez, 1)
+
+        sim.run(until=20)
+        self.assertEqual(change.update(), 1)  # no previous fields
+        previous = sim.get_dft_array(dft_fields, mp.Ez, 1)
+
+        sim.run(until=10)
+        current = sim.get_dft_array(dft_fields, mp.Ez, 1)
+        diff = np.abs(current - previous)
+        np.testing.assert_allclose(change.update(), np.linalg.norm(diff) / np.linalg.norm(previous), rtol=1e-10)
+        np.testing.assert_allclose(change.mean_change(), np.mean(diff / np.abs(previous)), rtol=1e-10)
+
+    def test_phase_recurrence(self):
+        sim = self.init()
+        sim.init_sim()
+        freqs = np.linspace(self.fcen - 0.5 * self.df, self.fcen + 0.5 * self.df, 50)
+        fr = mp.FluxRegion(mp.Vector3(0.5 * self.sxy - self.dpml - 0.5), size=mp.Vector3(y=self.sxy))
+        direct_fields = sim.add_dft_fields([mp.Ez], freqs, phase_recurrence=False)
+        recur_fields = sim.add_dft_fields([mp.Ez], freqs)
+        direct_flux = sim.add_flux(freqs, fr, phase_recurrence=False)
+        recur_flux = sim.add_flux(freqs, fr)
+
+        sim.run(until_after_sources=100)
+
+        for i in [0, 25, 49]:
+            np.testing.assert_allclose(sim.get_dft_array(recur_fields, mp.Ez, i),
+                                       sim.get_dft_array(direct_fields, mp.Ez, i),
+                                       rtol=1e-8, atol=1e-12)
+        np.testing.assert_allclose(mp.get_fluxes(recur_flux), mp.get_fluxes(direct_flux), rtol=1e-8)
+
+    def test_decimation_factor(self):
+        sim = self.init()
+        sim.init_sim()
+        fr = mp.FluxRegion(mp.Vector3(0.5 * self.sxy - self.dpml - 0.5), size=mp.Vector3(y=self.sxy))
+        full_flux = sim.add_flux(self.fcen, self.df, 20, fr)
+        auto_flux = sim.add_flux(self.fcen, self.df, 20, fr, decimation_factor=0)
+        fixed_flux = sim.add_flux(self.fcen, self.df, 20, fr, decimation_factor=5)
+
+        sim.run(until_after_sources=100)
+
+        self.assertGreater(auto_flux.swigobj.E.decimation_factor, 1)
+        np.testing.assert_allclose(mp.get_fluxes(auto_flux), mp.get_fluxes(full_flux), rtol=1e-3)
+        np.testing.assert_allclose(mp.get_fluxes(fixed_flux), mp.get_fluxes(full_flux), rtol=1e-3)
+
 if __name__ == '__main__':
     unittest.main()
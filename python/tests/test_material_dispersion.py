@@ -55,6 +55,11 @@ class TestMaterialDispersion(unittest.TestCase):
 
         np.testing.assert_allclose(expected, res)
 
+        # distributing the k points over two groups gives the same results
+        all_freqs_parallel = self.sim.run_k_points(200, kpts, num_groups=2)
+        self.assertEqual([len(fs) for fs in all_freqs], [len(fs) for fs in all_freqs_parallel])
+        np.testing.assert_allclose(np.concatenate(all_freqs), np.concatenate(all_freqs_parallel))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -83,5 +83,42 @@ class TestMaterialGrid(unittest.TestCase):
         freq_matgrid_default_mat = compute_resonant_mode(res[0], True)
         self.assertAlmostEqual(freq_matgrid[0], freq_matgrid_default_mat)
 
+    def test_update_materials(self):
+        cell_size = mp.Vector3(4,3,0)
+        design_size = mp.Vector3(1,1,0)
+        design_center = mp.Vector3(0.7,-0.4,0)
+        Nx, Ny = 20, 20
+
+        def eps_array(weights, update=None):
+            matgrid = mp.MaterialGrid(mp.Vector3(Nx,Ny),
+                                      mp.air,
+                                      mp.Medium(index=3.5),
+                                      weights=weights if update is None else update,
+                                      do_averaging=True)
+            geometry = [mp.Block(center=mp.Vector3(y=0.8),
+                                 size=mp.Vector3(mp.inf,0.3,mp.inf),
+                                 material=mp.Medium(epsilon=2.5)),
+                        mp.Block(center=design_center,
+                                 size=design_size,
+                                 material=matgrid)]
+            sim = mp.Simulation(resolution=20,
+                                cell_size=cell_size,
+                                geometry=geometry,
+                                boundary_layers=[mp.PML(0.5)],
+                                eps_averaging=True)
+            sim.init_sim()
+            if update is not None:
+                matgrid.update_weights(weights)
+                sim.update_materials(center=design_center, size=design_size)
+            return sim.get_epsilon()
+
+        np.random.seed(314159)
+        w0 = np.random.rand(Nx,Ny)
+        w1 = np.random.rand(Nx,Ny)
+        eps_ref = eps_array(w1)
+        eps_upd = eps_array(w1, update=w0)
+        self.assertFalse(np.allclose(eps_array(w0), eps_ref))
+        np.testing.assert_allclose(eps_upd, eps_ref, rtol=1e-12)
+
 if __name__ == '__main__':
     unittest.main()
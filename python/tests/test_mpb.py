@@ -344,6 +344,109 @@ class TestModeSolver(unittest.TestCase):
         pt = ms.get_epsilon_point(mp.Vector3(0.5, 0.5))
         self.assertEqual(pt, 1.0)
 
+    def test_run_te_num_k_groups(self):
+        ms = self.init_solver()
+        ms.run_te()
+
+        ms_par = self.init_solver()
+        ms_par.num_k_groups = 3
+        ms_par.run_te()
+
+        np.testing.assert_allclose(ms.all_freqs, ms_par.all_freqs, atol=1e-5)
+        self.check_band_range_data(ms.band_range_data, ms_par.band_range_data)
+        self.check_gap_list(ms.gap_list, ms_par.gap_list)
+        self.assertEqual(len(ms.eigensolver_iters), len(ms_par.eigensolver_iters))
+
+        # the eigenvectors of the last k point are available afterwards, as for a serial run
+        self.assertEqual(ms.current_k, ms_par.current_k)
+        np.testing.assert_allclose(ms.freqs, ms_par.freqs, atol=1e-5)
+        np.testing.assert_allclose(ms.get_freqs(), ms_par.get_freqs(), atol=1e-5)
+
+    def test_run_te_num_k_groups_band_functions(self):
+        if mp.count_processors() == 1:
+            # the k points would be solved in forked processes
+            ms_par = self.init_solver()
+            ms_par.num_k_groups = 3
+            with self.assertRaises(ValueError):
+                ms_par.run_te(mpb.output_efield_z)
+            return
+
+        ms = self.init_solver()
+        ms.filename_prefix = self.filename_prefix + '-serial'
+        ms.run_te(mpb.output_efield_z)
+
+        ms_par = self.init_solver()
+        ms_par.filename_prefix = self.filename_prefix + '-par'
+        ms_par.num_k_groups = min(2, mp.count_processors())
+        ms_par.run_te(mpb.output_efield_z)
+        np.testing.assert_allclose(ms.all_freqs, ms_par.all_freqs, atol=1e-5)
+
+        # every k point and band is output once, with the same name as in a serial run
+        mp.all_wait()
+        serial_files = sorted(f[len(ms.filename_prefix):] for f in
+                              glob.glob(ms.filename_prefix + '-e.k*.h5'))
+        par_files = sorted(f[len(ms_par.filename_prefix):] for f in
+                           glob.glob(ms_par.filename_prefix + '-e.k*.h5'))
+        self.assertEqual(len(serial_files), len(ms.k_points) * ms.num_bands)
+        self.assertEqual(serial_files, par_files)
+
+    def test_warm_start(self):
+        ms = self.init_solver()
+        ms.warm_start = True
+        ms.run_te()
+        freqs = ms.all_freqs
+        iters = sum(ms.eigensolver_iters)
+
+        # a second run starts from the cached eigenvectors of every k point
+        ms.run_te()
+        np.testing.assert_allclose(freqs, ms.all_freqs, atol=1e-5)
+        self.assertLess(sum(ms.eigensolver_iters) - iters, 0.5 * iters)
+
+        # a slightly different geometry starts from the eigenvectors of the old one
+        geometry = [mp.Cylinder(0.21, material=mp.Medium(epsilon=12))]
+        iters = sum(ms.eigensolver_iters)
+        ms.geometry = geometry
+        ms.run_te()
+
+        ms_cold = self.init_solver()
+        ms_cold.geometry = geometry
+        ms_cold.run_te()
+        np.testing.assert_allclose(ms_cold.all_freqs, ms.all_freqs, atol=1e-5)
+        self.assertLess(sum(ms.eigensolver_iters) - iters, sum(ms_cold.eigensolver_iters))
+
+    def test_warm_start_cache_size(self):
+        ms = self.init_solver()
+        ms.warm_start = True
+        ms.run_te()
+        num_k = len({(round(k.x, 12), round(k.y, 12), round(k.z, 12)) for k in ms.k_points})
+        self.assertEqual(len(ms._eigenvector_cache), num_k)
+
+        # only the most recently solved k points that fit in the size limit are cached
+        ev_size = next(iter(ms._eigenvector_cache.values())).nbytes
+        ms.warm_start_cache_size = 3 * ev_size
+        ms.run_te()
+        self.assertEqual(len(ms._eigenvector_cache), 3)
+        last_k = ms.k_points[-1]
+        self.assertIn((last_k.x, last_k.y, last_k.z), [key[0] for key in ms._eigenvector_cache])
+
+        # as does an integer warm_start
+        ms.warm_start = 2
+        ms.run_te()
+        self.assertEqual(len(ms._eigenvector_cache), 2)
+
+    def test_warm_start_num_k_groups(self):
+        ms = self.init_solver()
+        ms.warm_start = True
+        ms.num_k_groups = 3
+        ms.run_te()
+        freqs = ms.all_freqs
+        iters = sum(ms.eigensolver_iters)
+
+        # the eigenvectors solved by every group are cached for the next run
+        ms.run_te()
+        np.testing.assert_allclose(freqs, ms.all_freqs, atol=1e-5)
+        self.assertLess(sum(ms.eigensolver_iters) - iters, 0.5 * iters)
+
     def test_run_tm(self):
         expected_brd = [
             ((0.0, mp.Vector3(0.0, 0.0, 0.0)),
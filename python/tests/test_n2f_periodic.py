@@ -64,5 +64,50 @@ class TestNear2FarPeriodicBoundaries(unittest.TestCase):
         self.assertGreater(norm[0],norm[1])
         self.assertGreater(norm[1],norm[2])
 
+    def test_near2far_fft(self):
+        sx = 6.0
+        sy = 2.0
+        fcen = 1.5
+        df = 0.3
+
+        geometry = [mp.Block(material=mp.Medium(index=1.5), center=mp.Vector3(-1.0), size=mp.Vector3(0.5,1.0,mp.inf))]
+        sources = [mp.Source(mp.GaussianSource(fcen, fwidth=df), component=mp.Ez, center=mp.Vector3(-1.8), size=mp.Vector3(y=sy))]
+
+        sim = mp.Simulation(resolution=20,
+                            cell_size=mp.Vector3(sx,sy),
+                            boundary_layers=[mp.PML(thickness=1.0,direction=mp.X)],
+                            geometry=geometry,
+                            k_point=mp.Vector3(y=0.1),
+                            sources=sources)
+
+        n2f_region = mp.Near2FarRegion(center=mp.Vector3(1.5), size=mp.Vector3(y=sy))
+        n2f_obj = sim.add_near2far(fcen, df, 3, n2f_region, nperiods=3)
+        n2f_fft_obj = sim.add_near2far(fcen, df, 3, n2f_region, nperiods=3, fft=True)
+        flux_obj = sim.add_flux(fcen, df, 3, mp.FluxRegion(center=mp.Vector3(1.5), size=mp.Vector3(y=sy)))
+
+        sim.run(until_after_sources=50)
+
+        # far fields at a distance much larger than the extent of the periodic copies
+        R = 1e6
+        ff = []
+        ff_fft = []
+        for theta in np.linspace(-0.4*np.pi,0.4*np.pi,9):
+            pt = mp.Vector3(R*math.cos(theta),R*math.sin(theta))
+            ff.append(sim.get_farfield(n2f_obj, pt))
+            ff_fft.append(sim.get_farfield(n2f_fft_obj, pt))
+        ff = np.array(ff)
+        ff_fft = np.array(ff_fft)
+        self.assertLess(np.amax(np.abs(ff_fft-ff)), 1e-3*np.amax(np.abs(ff)))
+
+        # the power in the diffraction orders is the flux through the near-field surface
+        res = sim.get_farfield_orders(n2f_fft_obj)
+        flux = mp.get_fluxes(flux_obj)
+        for i, f in enumerate(mp.get_flux_freqs(flux_obj)):
+            prop = res.k[i][:,0] > 0
+            np.testing.assert_allclose(LA.norm(res.k[i][prop],axis=1), 2*math.pi*f)
+            np.testing.assert_allclose(res.k[i][:,1], 2*math.pi*(0.1+res.orders[:,0]/sy))
+            order_flux = sy*np.sum(np.real(np.cross(np.conj(res.E[i]),res.H[i]))[:,0])
+            self.assertAlmostEqual(order_flux/flux[i], 1.0, delta=0.05)
+
 if __name__ == '__main__':
     unittest.main()    
@@ -156,6 +156,75 @@ class TestSimulation(unittest.TestCase):
 
         self.assertTrue(done[0])
 
+    def test_step_function_schedule(self):
+        # The run loop only returns to Python when some step function or condition
+        # needs it, which must not change when the step functions are called.
+        def run(every_step):
+            calls = []
+
+            def _record(name):
+                def _rec(sim, todo):
+                    calls.append((name, todo, sim.fields.t))
+                return _rec
+
+            step_funcs = [mp.at_every(1.3, _record('every')),
+                          mp.after_time(7, mp.at_every(0.6, _record('after'))),
+                          mp.at_time(4.2, _record('at')),
+                          mp.before_time(0.2, _record('before')),
+                          mp.during_sources(mp.at_every(2, _record('during'))),
+                          mp.after_sources(mp.at_every(3, _record('after_sources'))),
+                          mp.at_beginning(_record('beginning')),
+                          mp.at_end(_record('end'))]
+            if every_step:
+                step_funcs.append(lambda sim: None)
+            sim = self.init_simple_simulation()
+            sim.run(*step_funcs, until_after_sources=mp.stop_when_fields_decayed(5, mp.Ez, mp.Vector3(1), 1e-3))
+            return sim.fields.t, calls
+
+        self.assertEqual(run(False), run(True))
+
+    def test_stop_when_fields_decayed_multiple_points(self):
+        pts = [mp.Vector3(1.2, 0.3), mp.Vector3(-2.1, 3.4)]
+        times = []
+        for pt in pts:
+            sim = self.init_simple_simulation()
+            sim.run(until_after_sources=mp.stop_when_fields_decayed(10, mp.Ez, pt, 1e-4))
+            times.append(sim.meep_time())
+
+        sim = self.init_simple_simulation()
+        sim.run(until_after_sources=mp.stop_when_fields_decayed(10, mp.Ez, pts, 1e-4))
+        self.assertAlmostEqual(sim.meep_time(), max(times))
+
+        # the native probes are removed at the end of the run
+        self.assertIsNone(sim.fields.probes)
+
+    def test_add_time_series(self):
+        pts = [mp.Vector3(1.2, 0.3), mp.Vector3(-2.1, 3.4)]
+        sim = self.init_simple_simulation()
+        ts = sim.add_time_series(mp.Ez, pts)
+        ts2 = sim.add_time_series(mp.Ez, pts[1], decimation_factor=3)
+        vals = []
+
+        def _collect(sim):
+            vals.append([sim.get_field_point(mp.Ez, pt) for pt in pts])
+
+        sim.run(_collect, until=10)
+        vals = np.array(vals)
+        self.assertEqual(ts.data.shape, vals.shape)
+        np.testing.assert_allclose(ts.data, vals, rtol=1e-14, atol=1e-14)
+        np.testing.assert_allclose(ts2.data, vals[::3, 1], rtol=1e-14, atol=1e-14)
+        self.assertAlmostEqual(ts2.dt, 3 * sim.fields.dt)
+
+        # the gathered data are reused until more samples are recorded
+        self.assertIs(ts.data, ts.data)
+        self.assertEqual(len(ts.times), vals.shape[0])
+
+        # the data are kept after the recording is stopped
+        ts.remove()
+        sim.run(until=5)
+        self.assertEqual(ts.data.shape, vals.shape)
+        self.assertEqual(len(ts2.times), sim.fields.t // 3 + 1)
+
     def test_with_prefix(self):
         sim = self.init_simple_simulation()
         sim.use_output_directory(self.temp_dir)
@@ -364,6 +433,49 @@ class TestSimulation(unittest.TestCase):
     def test_load_dump_chunk_layout_sim(self):
         self._load_dump_structure(chunk_sim=True)
 
+    def test_structure_cache(self):
+        from meep.materials import Al
+        cache_dir = os.path.join(self.temp_dir, 'structure-cache')
+        geometry = [mp.Block(material=Al, center=mp.Vector3(), size=mp.Vector3(1, 1, mp.inf)),
+                    mp.Cylinder(material=mp.Medium(epsilon=13), center=mp.Vector3(1.5), radius=0.4)]
+
+        def run_sim(structure_cache='', component=mp.Ez, structure_cache_size=10 * 1024**3):
+            sim = mp.Simulation(resolution=20,
+                                cell_size=mp.Vector3(5, 5),
+                                boundary_layers=[mp.PML(0.5)],
+                                geometry=geometry,
+                                sources=[mp.Source(src=mp.GaussianSource(1, fwidth=0.2),
+                                                   center=mp.Vector3(-1.2), component=component)],
+                                structure_cache=structure_cache,
+                                structure_cache_size=structure_cache_size)
+            sim.run(until=20)
+            return sim, sim.get_array(component, center=mp.Vector3(), size=mp.Vector3(4, 4))
+
+        def cache_files():
+            return sorted(f for f in os.listdir(cache_dir) if f.startswith('structure-'))
+
+        _, ref_ez = run_sim()
+        _, ref_hz = run_sim(component=mp.Hz)
+
+        sim, ez = run_sim(cache_dir)
+        self.assertGreater(sim.mean_time_spent_on(9), 0)
+        np.testing.assert_allclose(ez, ref_ez)
+        files = cache_files()
+        self.assertEqual(len(files), 1)
+
+        # a different source does not change the structure, which is loaded from the cache
+        sim, hz = run_sim(cache_dir, component=mp.Hz)
+        self.assertEqual(sim.mean_time_spent_on(9), 0)
+        np.testing.assert_allclose(hz, ref_hz)
+        self.assertEqual(cache_files(), files)
+
+        # a different geometry is stored separately, evicting the least recently used structure
+        geometry[1].radius = 0.3
+        run_sim(cache_dir, structure_cache_size=1)
+        new_files = cache_files()
+        self.assertEqual(len(new_files), 1)
+        self.assertNotEqual(new_files, files)
+
     def test_get_array_output(self):
         sim = self.init_simple_simulation()
         sim.use_output_directory(self.temp_dir)
@@ -531,6 +643,77 @@ class TestSimulation(unittest.TestCase):
             self.assertEqual(len(w), 1)
             self.assertNotIn("Epsilon", str(w[0].message))
 
+    def test_divergence_check(self):
+        # Courant > 1 is unstable in 1d, so the fields blow up exponentially
+        sim = mp.Simulation(cell_size=mp.Vector3(z=10),
+                            dimensions=1,
+                            resolution=10,
+                            Courant=1.5,
+                            divergence_check_interval=10,
+                            sources=[mp.Source(mp.GaussianSource(1, fwidth=0.5),
+                                               component=mp.Ex, center=mp.Vector3())])
+        with self.assertRaisesRegex(RuntimeError, "NaN or Inf"):
+            sim.run(until=500)
+
+    def test_num_threads(self):
+        fields = []
+        for num_threads in [1, 4]:
+            sim = self.init_simple_simulation(num_threads=num_threads)
+            sim.run(until=10)
+            if num_threads > 1:
+                self.assertGreaterEqual(sim.structure.num_chunks, num_threads * mp.count_processors())
+            fields.append(sim.get_array(mp.Ez, center=mp.Vector3(), size=mp.Vector3(6, 6)))
+        np.testing.assert_allclose(fields[0], fields[1], rtol=1e-12, atol=1e-12 * np.amax(np.abs(fields[0])))
+
+    def test_subpixel_averaging_threads(self):
+        geometry = [mp.Cylinder(radius=1.3, material=mp.Medium(index=3.5)),
+                    mp.Block(center=mp.Vector3(2.1, 0.3), size=mp.Vector3(1.2, 2.7, mp.inf),
+                             e1=mp.Vector3(1, 0.5), material=mp.Medium(epsilon=2.5))]
+        eps = []
+        for num_threads in [1, 3]:
+            sim = self.init_simple_simulation(geometry=geometry, num_threads=num_threads)
+            sim.init_sim()
+            self.assertGreater(sim.mean_time_spent_on(9), 0)
+            self.assertEqual(len(sim.time_spent_on(9)), mp.count_processors())
+            eps.append(sim.get_array(mp.Dielectric, center=mp.Vector3(), size=mp.Vector3(6, 6)))
+        np.testing.assert_array_equal(eps[0], eps[1])
+
+    def test_subpixel_averaging_fallback(self):
+        # the pixels inside a cylinder have a uniform material without any
+        # averaging, while a full wedge of the same shape is not known to be
+        # convex, so that its pixels are all handled by the full algorithm
+        radius = 1.3
+        eps = []
+        for obj in [mp.Cylinder(radius=radius, material=mp.Medium(index=3.5)),
+                    mp.Wedge(radius=radius, wedge_angle=2 * np.pi, material=mp.Medium(index=3.5))]:
+            sim = self.init_simple_simulation(geometry=[obj])
+            sim.init_sim()
+            eps.append(sim.get_array(mp.Dielectric, center=mp.Vector3(), size=mp.Vector3(6, 6)))
+            x, y, z, w = sim.get_array_metadata(center=mp.Vector3(), size=mp.Vector3(6, 6))
+
+        # the pixels that are not crossed by the surface are the same
+        r = np.sqrt(np.add.outer(np.square(x), np.square(y)))
+        uniform = np.abs(r - radius) > 2 / sim.resolution
+        self.assertGreater(np.count_nonzero(uniform & (r < radius)), 0)
+        np.testing.assert_array_equal(eps[0][uniform], eps[1][uniform])
+
+    def test_uniform_chi1inv(self):
+        sim = mp.Simulation(resolution=10,
+                            cell_size=mp.Vector3(8, 8),
+                            boundary_layers=[mp.PML(1.0)],
+                            geometry=[mp.Block(size=mp.Vector3(1, 1, mp.inf), material=mp.Medium(index=3.5))],
+                            default_material=mp.Medium(index=1.5))
+        sim.init_sim()
+        # the PML chunks only contain the homogeneous cladding
+        compressed = sim.structure.material_storage()
+        self.assertLess(compressed, sim.structure.material_storage(True))
+        self.assertGreater(sim.get_estimated_memory_usage(), compressed)
+
+        eps = sim.get_array(mp.Dielectric, center=mp.Vector3(), size=mp.Vector3(8, 8))
+        self.assertAlmostEqual(eps[0, 0], 2.25)
+        self.assertAlmostEqual(eps[-1, -1], 2.25)
+        self.assertAlmostEqual(eps[40, 40], 12.25)
+
     def test_get_filename_prefix(self):
         sim = self.init_simple_simulation()
         self.assertEqual(sim.get_filename_prefix(), self.fname_base)
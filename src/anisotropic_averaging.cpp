@@ -2,6 +2,12 @@
 
 #include "meep_internals.hpp"
 
+#include "config.h"
+
+#ifdef HAVE_OPENMP
+#include <omp.h>
+#endif
+
 using namespace std;
 
 namespace meep {
@@ -189,63 +195,105 @@ done : {
 }
 
 void structure_chunk::set_chi1inv(component c, material_function &medium,
-                                  bool use_anisotropic_averaging, double tol, int maxeval) {
+                                  bool use_anisotropic_averaging, double tol, int maxeval,
+                                  const std::vector<volume> *where, int num_threads) {
   if (!is_mine() || !gv.has_field(c)) return;
   field_type ft = type(c);
   if (ft != E_stuff && ft != H_stuff) meep::abort("only E or H can have chi");
+  double tstart = wall_time();
   medium.set_volume(gv.pad().surroundings());
 
   if (!use_anisotropic_averaging) maxeval = 0;
 
   const double smoothing_diameter = 1.0; // FIXME: make user-changable?
 
-  // may take a long time in 3d, so prepare to print status messages
-  size_t npixels = 0, ipixel = 0;
-  size_t loop_npixels = 0;
-  LOOP_OVER_VOL(gv, c, i) {
-    loop_npixels = loop_n1 * loop_n2 * loop_n3;
-    goto breakout; // hack to use loop-size computation from LOOP_OVER_VOL
+  /* the loop bounds of LOOP_OVER_VOL(gv, c, i), flattened into a single
+     pixel index so that the pixels can be distributed over threads */
+  ivec is(gv.little_corner() + gv.iyee_shift(c)), ie(gv.big_corner() + gv.iyee_shift(c));
+  ptrdiff_t loop_n[3], loop_s[3], idx0 = 0;
+  direction loop_d[3];
+  for (int k = 0; k < 3; ++k) {
+    loop_n[k] = (ie.yucky_val(k) - is.yucky_val(k)) / 2 + 1;
+    loop_d[k] = gv.yucky_direction(k);
+    loop_s[k] = gv.stride(loop_d[k]);
+    idx0 += (is - gv.little_corner()).yucky_val(k) / 2 * loop_s[k];
   }
-breakout:
-  npixels += loop_npixels;
+
+  // may take a long time in 3d, so prepare to print status messages
+  const ptrdiff_t npixels = loop_n[0] * loop_n[1] * loop_n[2];
   double last_output_time = wall_time();
 
+  direction dc = component_direction(c);
   FOR_FT_COMPONENTS(ft, c2) if (gv.has_field(c2)) {
     direction d = component_direction(c2);
-    if (!chi1inv[c][d]) chi1inv[c][d] = new realnum[gv.ntot()];
-    if (!chi1inv[c][d]) meep::abort("Memory allocation error.\n");
+    if (!chi1inv[c][d]) {
+      chi1inv[c][d] = new realnum[gv.ntot()];
+      if (!chi1inv[c][d]) meep::abort("Memory allocation error.\n");
+      if (where) { // pixels outside of where keep their (trivial or uniform) values
+        realnum val = d == dc ? uniform_chi1inv[c] : 0.0;
+        for (size_t i = 0; i < gv.ntot(); ++i)
+          chi1inv[c][d][i] = val;
+      }
+    }
   }
-  direction dc = component_direction(c);
+  uniform_chi1inv[c] = 1.0;
   direction d0 = X, d1 = Y, d2 = Z;
   if (gv.dim == Dcyl) {
     d0 = R;
     d1 = P;
   }
   int idiag = component_index(c);
-  bool trivial[3] = {true, true, true};
+  bool trivial0 = true, trivial1 = true, trivial2 = true;
   double trivial_val[3] = {0, 0, 0};
   trivial_val[idiag] = 1.0;
   ivec shift1(unit_ivec(gv.dim, component_direction(c)) * (ft == E_stuff ? 1 : -1));
-  LOOP_OVER_VOL(gv, c, i) {
+  realnum *chi1inv0 = chi1inv[c][d0], *chi1inv1 = chi1inv[c][d1], *chi1inv2 = chi1inv[c][d2];
+
+  /* the pixels are independent, so they can be averaged in parallel, as long
+     as the material function can be called concurrently (e.g. not for
+     materials defined by Python functions) */
+#ifdef HAVE_OPENMP
+  int nthreads = 1;
+  if (medium.thread_safe()) nthreads = num_threads > 0 ? num_threads : omp_get_max_threads();
+#pragma omp parallel for schedule(dynamic, 64) num_threads(nthreads)                               \
+    reduction(&& : trivial0, trivial1, trivial2)
+#else
+  (void)num_threads;
+#endif
+  for (ptrdiff_t ipixel = 0; ipixel < npixels; ++ipixel) {
+    const ptrdiff_t loop_i1 = ipixel / (loop_n[1] * loop_n[2]);
+    const ptrdiff_t loop_i2 = (ipixel / loop_n[2]) % loop_n[1];
+    const ptrdiff_t loop_i3 = ipixel % loop_n[2];
+    const ptrdiff_t i = idx0 + loop_i1 * loop_s[0] + loop_i2 * loop_s[1] + loop_i3 * loop_s[2];
     double chi1invrow[3], chi1invrow_offdiag[3];
-    IVEC_LOOP_ILOC(gv, here);
-    medium.eff_chi1inv_row(c, chi1invrow, gv.dV(here, smoothing_diameter), tol, maxeval);
-    medium.eff_chi1inv_row(c, chi1invrow_offdiag, gv.dV(here - shift1, smoothing_diameter), tol,
-                           maxeval);
-    if (chi1inv[c][d0]) {
-      chi1inv[c][d0][i] = (d0 == dc) ? chi1invrow[0] : chi1invrow_offdiag[0];
-      trivial[0] = trivial[0] && (chi1inv[c][d0][i] == trivial_val[0]);
+    ivec here(gv.dim);
+    here.set_direction(loop_d[0], is.yucky_val(0) + 2 * loop_i1);
+    here.set_direction(loop_d[1], is.yucky_val(1) + 2 * loop_i2);
+    here.set_direction(loop_d[2], is.yucky_val(2) + 2 * loop_i3);
+    bool update = !where;
+    if (where) {
+      vec loc = gv[here];
+      for (size_t k = 0; !update && k < where->size(); ++k)
+        update = (*where)[k].contains(loc);
     }
-    if (chi1inv[c][d1]) {
-      chi1inv[c][d1][i] = (d1 == dc) ? chi1invrow[1] : chi1invrow_offdiag[1];
-      trivial[1] = trivial[1] && (chi1inv[c][d1][i] == trivial_val[1]);
-    }
-    if (chi1inv[c][d2]) {
-      chi1inv[c][d2][i] = (d2 == dc) ? chi1invrow[2] : chi1invrow_offdiag[2];
-      trivial[2] = trivial[2] && (chi1inv[c][d2][i] == trivial_val[2]);
+    if (update) {
+      medium.eff_chi1inv_row(c, chi1invrow, gv.dV(here, smoothing_diameter), tol, maxeval);
+      medium.eff_chi1inv_row(c, chi1invrow_offdiag, gv.dV(here - shift1, smoothing_diameter), tol,
+                             maxeval);
+      if (chi1inv0) chi1inv0[i] = (d0 == dc) ? chi1invrow[0] : chi1invrow_offdiag[0];
+      if (chi1inv1) chi1inv1[i] = (d1 == dc) ? chi1invrow[1] : chi1invrow_offdiag[1];
+      if (chi1inv2) chi1inv2[i] = (d2 == dc) ? chi1invrow[2] : chi1invrow_offdiag[2];
     }
+    if (chi1inv0) trivial0 = trivial0 && (chi1inv0[i] == trivial_val[0]);
+    if (chi1inv1) trivial1 = trivial1 && (chi1inv1[i] == trivial_val[1]);
+    if (chi1inv2) trivial2 = trivial2 && (chi1inv2[i] == trivial_val[2]);
 
-    if (verbosity > 0 && (ipixel + 1) % 1000 == 0 &&
+    // status messages from the first thread only, which works through the pixels in order
+    bool first_thread = true;
+#ifdef HAVE_OPENMP
+    first_thread = omp_get_thread_num() == 0;
+#endif
+    if (verbosity > 0 && first_thread && (ipixel + 1) % 1000 == 0 &&
         wall_time() > last_output_time + MEEP_MIN_OUTPUT_TIME) {
       master_printf("%s is %g%% done, %g s remaining\n",
                     use_anisotropic_averaging ? "subpixel-averaging" : "grid initialization",
@@ -253,8 +301,8 @@ breakout:
                     (npixels - ipixel) * (wall_time() - last_output_time) / ipixel);
       last_output_time = wall_time();
     }
-    ++ipixel;
   }
+  bool trivial[3] = {trivial0, trivial1, trivial2};
   direction ds[3];
   ds[0] = d0;
   ds[1] = d1;
@@ -271,7 +319,21 @@ breakout:
     delete[] chi1inv[c][dc];
     chi1inv[c][dc] = 0;
   }
+  /* if the tensor is diagonal and the diagonal is constant over the chunk
+     (e.g. a homogeneous cladding), store only that value in uniform_chi1inv */
+  else if (trivial[(idiag + 1) % 3] && trivial[(idiag + 2) % 3]) {
+    const realnum *diag = chi1inv[c][dc];
+    const realnum val = diag[idx0];
+    bool uniform = true;
+    LOOP_OVER_VOL(gv, c, i) { uniform = uniform && diag[i] == val; }
+    if (uniform) {
+      uniform_chi1inv[c] = val;
+      delete[] chi1inv[c][dc];
+      chi1inv[c][dc] = 0;
+    }
+  }
   medium.unset_volume();
+  averaging_time += wall_time() - tstart;
 }
 
 void structure_chunk::add_susceptibility(material_function &sigma, field_type ft,
@@ -26,6 +26,15 @@
 
 using namespace std;
 
+/* number of phase-recurrence updates before dft_phase is recomputed
+   exactly, to bound the accumulation of rounding errors */
+#define DFT_PHASE_RESYNC 1024
+
+/* tile sizes (grid points x frequencies) for dft_chunk::update_dft_tiled,
+   chosen so that a tile of dft values stays in cache */
+#define DFT_TILE_POINTS 128
+#define DFT_TILE_FREQS 256
+
 namespace meep {
 
 std::vector<double> linspace(double freq_min, double freq_max, size_t Nfreq) {
@@ -48,6 +57,8 @@ struct dft_chunk_data { // for passing to field::loop_in_chunks as void*
   double dt_factor;
   bool include_dV_and_interp_weights;
   bool sqrt_dV_and_interp_weights;
+  bool phase_recurrence;
+  int decimation_factor;
   bool empty_dim[5];
   dft_chunk *dft_chunks;
 };
@@ -96,6 +107,11 @@ dft_chunk::dft_chunk(fields_chunk *fc_, ivec is_, ivec ie_, vec s0_, vec s1_, ve
   const int Nomega = data->omega.size();
   omega = data->omega;
   dft_phase = new complex<double>[Nomega];
+  dft_phase_step = new complex<double>[Nomega];
+  phase_recurrence = data->phase_recurrence;
+  decimation_factor = data->decimation_factor;
+  dft_phase_time = dft_phase_dt = 0;
+  dft_phase_count = 0;
 
   N = 1;
   LOOP_OVER_DIRECTIONS(is.dim, d) { N *= (ie.in_direction(d) - is.in_direction(d)) / 2 + 1; }
@@ -113,6 +129,7 @@ dft_chunk::dft_chunk(fields_chunk *fc_, ivec is_, ivec ie_, vec s0_, vec s1_, ve
 dft_chunk::~dft_chunk() {
   delete[] dft;
   delete[] dft_phase;
+  delete[] dft_phase_step;
 
   // delete from fields_chunk list
   dft_chunk *cur = fc->dft_chunks;
@@ -156,7 +173,8 @@ static void add_dft_chunkloop(fields_chunk *fc, int ichunk, component cgrid, ive
 dft_chunk *fields::add_dft(component c, const volume &where, const double *freq, size_t Nfreq,
                            bool include_dV_and_interp_weights, complex<double> stored_weight,
                            dft_chunk *chunk_next, bool sqrt_dV_and_interp_weights,
-                           complex<double> extra_weight, bool use_centered_grid, int vc) {
+                           complex<double> extra_weight, bool use_centered_grid, int vc,
+                           bool phase_recurrence, int decimation_factor) {
   if (coordinate_mismatch(gv.dim, c)) return NULL;
 
   /* If you call add_dft before adding sources, it will do nothing
@@ -167,6 +185,8 @@ dft_chunk *fields::add_dft(component c, const volume &where, const double *freq,
   if (!include_dV_and_interp_weights && sqrt_dV_and_interp_weights)
     meep::abort("include_dV_and_interp_weights must be true for sqrt_dV_and_interp_weights=true in "
           "add_dft");
+  if (decimation_factor < 0) meep::abort("decimation_factor must be >= 0 in add_dft");
+  if (decimation_factor == 0) decimation_factor = dft_decimation_factor(freq, Nfreq);
 
   dft_chunk_data data;
   data.c = c;
@@ -176,9 +196,12 @@ dft_chunk *fields::add_dft(component c, const volume &where, const double *freq,
     data.omega[i] = 2 * pi * freq[i];
   data.stored_weight = stored_weight;
   data.extra_weight = extra_weight;
-  data.dt_factor = dt / sqrt(2.0 * pi);
+  data.decimation_factor = decimation_factor;
+  // each update stands in for decimation_factor timesteps
+  data.dt_factor = dt * decimation_factor / sqrt(2.0 * pi);
   data.include_dV_and_interp_weights = include_dV_and_interp_weights;
   data.sqrt_dV_and_interp_weights = sqrt_dV_and_interp_weights;
+  data.phase_recurrence = phase_recurrence;
   data.empty_dim[0] = data.empty_dim[1] = data.empty_dim[2] = data.empty_dim[3] =
       data.empty_dim[4] = false;
   LOOP_OVER_DIRECTIONS(where.dim, d) { data.empty_dim[d] = where.in_direction(d) == 0; }
@@ -201,21 +224,160 @@ dft_chunk *fields::add_dft(const volume_list *where, const std::vector<double> f
   return chunks;
 }
 
+/* Choose the largest decimation factor (number of timesteps between DFT
+   updates) for which sampling the fields does not alias any of the source
+   frequencies onto the DFT frequencies, i.e. for which the sampling rate
+   1/(decimation_factor*dt) is at least the sum of the maximum DFT frequency
+   and the maximum source frequency (center frequency + half bandwidth).
+   Returns 1 (no decimation) if any source has an unknown bandwidth. */
+int fields::dft_decimation_factor(const double *freq, size_t Nfreq) const {
+  double src_freq_max = 0;
+  for (src_time *s = sources; s; s = s->next) {
+    if (s->get_fwidth() == 0) return 1;
+    src_freq_max = std::max(src_freq_max, abs(s->frequency()) + 0.5 * s->get_fwidth());
+  }
+  double freq_max = 0;
+  for (size_t i = 0; i < Nfreq; ++i)
+    freq_max = std::max(freq_max, fabs(freq[i]));
+  if (freq_max == 0 || src_freq_max == 0) return 1;
+  return std::max(1, int(floor(1 / (dt * (freq_max + src_freq_max)))));
+}
+
 void fields::update_dfts() {
   am_now_working_on(FourierTransforming);
+#ifdef HAVE_OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(chunk_threads())
+#endif
   for (int i = 0; i < num_chunks; i++)
-    if (chunks[i]->is_mine()) chunks[i]->update_dfts(time(), time() - 0.5 * dt);
+    if (chunks[i]->is_mine()) chunks[i]->update_dfts(time(), time() - 0.5 * dt, t);
   finished_working();
 }
 
-void fields_chunk::update_dfts(double timeE, double timeH) {
+void fields_chunk::update_dfts(double timeE, double timeH, int current_step) {
   if (doing_solve_cw) return;
   for (dft_chunk *cur = dft_chunks; cur; cur = cur->next_in_chunk) {
-    cur->update_dft(is_magnetic(cur->c) ? timeH : timeE);
+    if (current_step % cur->decimation_factor == 0)
+      cur->update_dft(is_magnetic(cur->c) ? timeH : timeE);
   }
 }
 
 void dft_chunk::update_dft(double time) {
+  if (phase_recurrence)
+    update_dft_tiled(time);
+  else
+    update_dft_direct(time);
+}
+
+/* compute dft_phase[i] = exp(i omega[i] time) * scale for the current time.
+   For the usual case of a fixed timestep, this only costs one complex
+   multiplication per frequency (rather than a sin and cos), with an exact
+   recomputation every DFT_PHASE_RESYNC steps. */
+void dft_chunk::update_dft_phase(double time) {
+  const int Nomega = omega.size();
+  double dtp = time - dft_phase_time;
+
+  if (dft_phase_count > 0 && dtp > 0 && fabs(dtp - dft_phase_dt) > 1e-9 * dtp) {
+    for (int i = 0; i < Nomega; ++i)
+      dft_phase_step[i] = polar(1.0, omega[i] * dtp);
+    dft_phase_dt = dtp;
+    dft_phase_count = DFT_PHASE_RESYNC; // force exact recomputation below
+  }
+
+  if (dft_phase_count > 0 && dft_phase_count < DFT_PHASE_RESYNC && dtp > 0) {
+    for (int i = 0; i < Nomega; ++i)
+      dft_phase[i] *= dft_phase_step[i];
+    ++dft_phase_count;
+  }
+  else {
+    for (int i = 0; i < Nomega; ++i)
+      dft_phase[i] = polar(1.0, omega[i] * time) * scale;
+    dft_phase_count = 1;
+  }
+  dft_phase_time = time;
+}
+
+/* add dft_phase[i] * (re[n] + i*im[n]) to dft[Nomega*n + i] for a tile of
+   npts points, in blocks of DFT_TILE_FREQS frequencies; the complex arithmetic
+   is written out on the real/imag parts so that the compiler can vectorize it */
+static void accumulate_dft_tile(complex<double> *dft, const complex<double> *dft_phase,
+                                int Nomega, const double *re, const double *im, int npts,
+                                bool is_complex) {
+  const double *ph = (const double *)dft_phase;
+  for (int i0 = 0; i0 < Nomega; i0 += DFT_TILE_FREQS) {
+    const int i1 = std::min(i0 + DFT_TILE_FREQS, Nomega);
+    for (int n = 0; n < npts; ++n) {
+      double *dk = (double *)(dft + size_t(Nomega) * n);
+      const double fr = re[n];
+      if (is_complex) {
+        const double fi = im[n];
+        for (int i = i0; i < i1; ++i) {
+          const double pr = ph[2 * i], pi = ph[2 * i + 1];
+          dk[2 * i] += pr * fr - pi * fi;
+          dk[2 * i + 1] += pr * fi + pi * fr;
+        }
+      }
+      else
+        for (int i = i0; i < i1; ++i) {
+          dk[2 * i] += ph[2 * i] * fr;
+          dk[2 * i + 1] += ph[2 * i + 1] * fr;
+        }
+    }
+  }
+}
+
+/* Add the (averaged, weighted) field values to the dft for all frequencies.
+   The field values are first gathered into a tile of up to DFT_TILE_POINTS
+   points, and the tile is then accumulated in blocks of DFT_TILE_FREQS
+   frequencies, so that the innermost loop is a simple streaming update over
+   frequencies (on the real/imag parts, which the compiler can vectorize). */
+void dft_chunk::update_dft_tiled(double time) {
+  if (!fc->f[c][0]) return;
+
+  update_dft_phase(time);
+
+  const int Nomega = omega.size();
+  const int numcmp = fc->f[c][1] ? 2 : 1;
+
+  double tile_re[DFT_TILE_POINTS], tile_im[DFT_TILE_POINTS];
+  size_t tile_start = 0; // index in dft of the first point of the tile
+  int tile_n = 0;        // number of points in the tile
+
+  LOOP_OVER_IVECS(fc->gv, is, ie, idx) {
+    double w;
+    if (include_dV_and_interp_weights) {
+      w = IVEC_LOOP_WEIGHT(s0, s1, e0, e1, dV0 + dV1 * loop_i2);
+      if (sqrt_dV_and_interp_weights) w = sqrt(w);
+    }
+    else
+      w = 1.0;
+    double f[2] = {0, 0}; // real/imag field value at epsilon point
+    if (avg2)
+      for (int cmp = 0; cmp < numcmp; ++cmp)
+        f[cmp] = (w * 0.25) * (fc->f[c][cmp][idx] + fc->f[c][cmp][idx + avg1] +
+                               fc->f[c][cmp][idx + avg2] + fc->f[c][cmp][idx + (avg1 + avg2)]);
+    else if (avg1)
+      for (int cmp = 0; cmp < numcmp; ++cmp)
+        f[cmp] = (w * 0.5) * (fc->f[c][cmp][idx] + fc->f[c][cmp][idx + avg1]);
+    else
+      for (int cmp = 0; cmp < numcmp; ++cmp)
+        f[cmp] = w * fc->f[c][cmp][idx];
+
+    tile_re[tile_n] = f[0];
+    tile_im[tile_n] = f[1];
+    if (++tile_n == DFT_TILE_POINTS) {
+      accumulate_dft_tile(dft + Nomega * tile_start, dft_phase, Nomega, tile_re, tile_im, tile_n,
+                          numcmp == 2);
+      tile_start += tile_n;
+      tile_n = 0;
+    }
+  }
+  if (tile_n > 0)
+    accumulate_dft_tile(dft + Nomega * tile_start, dft_phase, Nomega, tile_re, tile_im, tile_n,
+                        numcmp == 2);
+}
+
+// the original one-point-at-a-time DFT kernel, used if phase_recurrence is false
+void dft_chunk::update_dft_direct(double time) {
   if (!fc->f[c][0]) return;
 
   const int Nomega = omega.size();
@@ -418,7 +580,8 @@ void dft_flux::scale_dfts(complex<double> scale) {
 }
 
 dft_flux fields::add_dft_flux(const volume_list *where_, const double *freq, size_t Nfreq,
-                              bool use_symmetry, bool centered_grid) {
+                              bool use_symmetry, bool centered_grid, bool phase_recurrence,
+                              int decimation_factor) {
   if (!where_) // handle empty list of volumes
     return dft_flux(Ex, Hy, NULL, NULL, freq, Nfreq, v, NO_DIRECTION, use_symmetry);
 
@@ -453,9 +616,11 @@ dft_flux fields::add_dft_flux(const volume_list *where_, const double *freq, siz
     }
 
     for (int i = 0; i < 2; ++i) {
-      E = add_dft(cE[i], where->v, freq, Nfreq, true,
-                  where->weight * double(1 - 2 * i), E, false, std::complex<double>(1.0,0), centered_grid);
-      H = add_dft(cH[i], where->v, freq, Nfreq, false, 1.0, H, false, std::complex<double>(1.0,0), centered_grid);
+      E = add_dft(cE[i], where->v, freq, Nfreq, true, where->weight * double(1 - 2 * i), E, false,
+                  std::complex<double>(1.0, 0), centered_grid, 0, phase_recurrence,
+                  decimation_factor);
+      H = add_dft(cH[i], where->v, freq, Nfreq, false, 1.0, H, false, std::complex<double>(1.0, 0),
+                  centered_grid, 0, phase_recurrence, decimation_factor);
     }
 
     where = where->next;
@@ -539,7 +704,8 @@ double *dft_energy::total() {
   return F;
 }
 
-dft_energy fields::add_dft_energy(const volume_list *where_, const double *freq, size_t Nfreq) {
+dft_energy fields::add_dft_energy(const volume_list *where_, const double *freq, size_t Nfreq,
+                                  bool phase_recurrence, int decimation_factor) {
 
   if (!where_) // handle empty list of volumes
     return dft_energy(NULL, NULL, NULL, NULL, freq, Nfreq, v);
@@ -550,10 +716,14 @@ dft_energy fields::add_dft_energy(const volume_list *where_, const double *freq,
   volume_list *where_save = where;
   while (where) {
     LOOP_OVER_FIELD_DIRECTIONS(gv.dim, d) {
-      E = add_dft(direction_component(Ex, d), where->v, freq, Nfreq, true, 1.0, E);
-      D = add_dft(direction_component(Dx, d), where->v, freq, Nfreq, false, 1.0, D);
-      H = add_dft(direction_component(Hx, d), where->v, freq, Nfreq, true, 1.0, H);
-      B = add_dft(direction_component(Bx, d), where->v, freq, Nfreq, false, 1.0, B);
+      E = add_dft(direction_component(Ex, d), where->v, freq, Nfreq, true, 1.0, E, false, 1.0, true,
+                  0, phase_recurrence, decimation_factor);
+      D = add_dft(direction_component(Dx, d), where->v, freq, Nfreq, false, 1.0, D, false, 1.0,
+                  true, 0, phase_recurrence, decimation_factor);
+      H = add_dft(direction_component(Hx, d), where->v, freq, Nfreq, true, 1.0, H, false, 1.0, true,
+                  0, phase_recurrence, decimation_factor);
+      B = add_dft(direction_component(Bx, d), where->v, freq, Nfreq, false, 1.0, B, false, 1.0,
+                  true, 0, phase_recurrence, decimation_factor);
     }
     where = where->next;
   }
@@ -644,17 +814,21 @@ direction fields::normal_direction(const volume &where) const {
 }
 
 dft_flux fields::add_dft_flux(direction d, const volume &where, const double *freq, size_t Nfreq,
-                              bool use_symmetry, bool centered_grid) {
+                              bool use_symmetry, bool centered_grid, bool phase_recurrence,
+                              int decimation_factor) {
   if (d == NO_DIRECTION) d = normal_direction(where);
   volume_list vl(where, direction_component(Sx, d));
-  dft_flux flux = add_dft_flux(&vl, freq, Nfreq, use_symmetry, centered_grid);
+  dft_flux flux = add_dft_flux(&vl, freq, Nfreq, use_symmetry, centered_grid, phase_recurrence,
+                               decimation_factor);
   flux.normal_direction = d;
   return flux;
 }
 
-
-dft_flux fields::add_mode_monitor(direction d, const volume &where, const double *freq, size_t Nfreq, bool centered_grid) {
-  return add_dft_flux(d, where, freq, Nfreq, /*use_symmetry=*/false, centered_grid);
+dft_flux fields::add_mode_monitor(direction d, const volume &where, const double *freq,
+                                  size_t Nfreq, bool centered_grid, bool phase_recurrence,
+                                  int decimation_factor) {
+  return add_dft_flux(d, where, freq, Nfreq, /*use_symmetry=*/false, centered_grid,
+                      phase_recurrence, decimation_factor);
 }
 
 dft_flux fields::add_dft_flux_box(const volume &where, double freq_min, double freq_max,
@@ -721,16 +895,17 @@ void dft_fields::remove() {
 }
 
 dft_fields fields::add_dft_fields(component *components, int num_components, const volume where,
-                                  const double *freq, size_t Nfreq, bool use_centered_grid) {
+                                  const double *freq, size_t Nfreq, bool use_centered_grid,
+                                  bool phase_recurrence, int decimation_factor) {
   bool include_dV_and_interp_weights = false;
   bool sqrt_dV_and_interp_weights = false; // default option from meep.hpp (expose to user?)
   std::complex<double> extra_weight = 1.0; // default option from meep.hpp (expose to user?)
   complex<double> stored_weight = 1.0;
   dft_chunk *chunks = 0;
   for (int nc = 0; nc < num_components; nc++)
-    chunks =
-        add_dft(components[nc], where, freq, Nfreq, include_dV_and_interp_weights, stored_weight,
-                chunks, sqrt_dV_and_interp_weights, extra_weight, use_centered_grid);
+    chunks = add_dft(components[nc], where, freq, Nfreq, include_dV_and_interp_weights,
+                     stored_weight, chunks, sqrt_dV_and_interp_weights, extra_weight,
+                     use_centered_grid, 0, phase_recurrence, decimation_factor);
 
   return dft_fields(chunks, freq, Nfreq, where);
 }
@@ -864,6 +1039,93 @@ complex<double> dft_chunk::process_dft_component(int rank, direction *ds, ivec m
   return integral;
 }
 
+/***************************************************************/
+/* the locations of the points of the chunk and the weights    */
+/* of their DFT values, as in process_dft_component with       */
+/* retain_interp_weights, so that the local dft[] data can be  */
+/* used without assembling the global array.                   */
+/***************************************************************/
+void dft_chunk::get_points(vec *loc, complex<double> *weight) {
+  vec s0i(s0), s1i(s1), e0i(e0), e1i(e1);
+  LOOP_OVER_DIRECTIONS(fc->gv.dim, d) {
+    if (!empty_dim[d]) {
+      s0i.set_direction(d, 1.0);
+      s1i.set_direction(d, 1.0);
+      e0i.set_direction(d, 1.0);
+      e1i.set_direction(d, 1.0);
+    }
+  }
+
+  vec rshift(shift * (0.5 * fc->gv.inva));
+  size_t n = 0;
+  LOOP_OVER_IVECS(fc->gv, is, ie, idx) {
+    IVEC_LOOP_LOC(fc->gv, l);
+    loc[n] = S.transform(l, sn) + rshift;
+    double w = IVEC_LOOP_WEIGHT(s0, s1, e0, e1, dV0 + dV1 * loop_i2);
+    double interp_w = IVEC_LOOP_WEIGHT(s0i, s1i, e0i, e1i, 1.0);
+    weight[n] = interp_w / stored_weight;
+    if (include_dV_and_interp_weights) weight[n] /= (sqrt_dV_and_interp_weights ? sqrt(w) : w);
+    ++n;
+  }
+}
+
+dft_change::dft_change(dft_chunk *chunks_, component c_, int freq_)
+    : chunks(chunks_), c(c_), freq(freq_), N(0), previous(NULL), norm_change_(1.0),
+      mean_change_(1.0) {
+  for (dft_chunk *cur = chunks; cur; cur = cur->next_in_dft) {
+    if (cur->c != c) continue;
+    if (freq < 0 || size_t(freq) >= cur->omega.size())
+      meep::abort("dft_change: frequency index %d is out of range", freq);
+    N += cur->N;
+  }
+}
+
+dft_change::~dft_change() { delete[] previous; }
+
+double dft_change::update() {
+  bool first = !previous;
+  if (first) previous = new complex<double>[N];
+
+  // local sums of |diff|^2, |previous|^2, |diff|, |diff|/|previous|, and the numbers
+  // of points and of points with previous == 0, reduced over the processes
+  double sums[6] = {0, 0, 0, 0, 0, 0};
+  size_t n = 0;
+  for (dft_chunk *cur = chunks; cur; cur = cur->next_in_dft) {
+    if (cur->c != c) continue;
+    vec *loc = new vec[cur->N];
+    complex<double> *weight = new complex<double>[cur->N];
+    cur->get_points(loc, weight);
+    size_t Nomega = cur->omega.size();
+    for (size_t idx = 0; idx < cur->N; ++idx, ++n) {
+      complex<double> val = cur->dft[Nomega * idx + freq] * weight[idx];
+      if (!first) {
+        double diff = abs(val - previous[n]), prev = abs(previous[n]);
+        sums[0] += diff * diff;
+        sums[1] += prev * prev;
+        sums[2] += diff;
+        if (prev != 0)
+          sums[3] += diff / prev;
+        else
+          sums[5] += 1;
+      }
+      previous[n] = val;
+      sums[4] += 1;
+    }
+    delete[] weight;
+    delete[] loc;
+  }
+
+  double sums_all[6];
+  sum_to_all(sums, sums_all, 6);
+  if (first) {
+    norm_change_ = mean_change_ = 1.0;
+    return norm_change_;
+  }
+  norm_change_ = sums_all[1] != 0 ? sqrt(sums_all[0] / sums_all[1]) : 1.0;
+  mean_change_ = sums_all[2] == 0 ? 0.0 : (sums_all[5] == 0 ? sums_all[3] / sums_all[4] : 1.0);
+  return norm_change_;
+}
+
 /***************************************************************/
 /* low-level [actually intermediate-level, since it calls      */
 /* dft_chunk::process_dft_component(), which is the true       */
@@ -1093,6 +1355,158 @@ complex<double> *fields::get_dft_array(dft_fields fdft, component c, int num_fre
   return collapse_array(array, rank, dims, dirs, fdft.where);
 }
 
+/***************************************************************/
+/* fetch the arrays of the components cs[0..num_components-1]  */
+/* at the frequencies freqs[0..num_freqs-1] of a dft_fields    */
+/* object all at once. The arrays of component cs[i], which    */
+/* are identical to those returned by get_dft_array, are       */
+/* stored one after the other (in the order of freqs) starting */
+/* at arrays[i], and are consolidated on all processes in a    */
+/* single pass over the entries of all of the components.      */
+/*                                                             */
+/* on return, ranks[i] and dims[3*i..3*i+2] are the rank and   */
+/* dimensions of the (collapsed) arrays of component cs[i], or */
+/* ranks[i] = -1 if no chunk stores cs[i] (e.g. if it is not   */
+/* excited by any source), in which case arrays[i] is not      */
+/* written. Returns the total number of entries; if arrays is  */
+/* null, only the ranks and dimensions are computed (this is   */
+/* still a collective operation).                              */
+/***************************************************************/
+// copy n entries between buf and the concatenation of the arrays[i] with sizes[i] entries,
+// starting at entry offset of arrays[i]; on return, (i, offset) is the entry after the last
+static void copy_dft_arrays(complex<double> **arrays, const size_t *sizes, int &i, size_t &offset,
+                            complex<double> *buf, size_t n, bool to_arrays) {
+  for (size_t nbuf = 0; nbuf < n;) {
+    if (offset == sizes[i]) {
+      ++i;
+      offset = 0;
+      continue;
+    }
+    size_t m = std::min(sizes[i] - offset, n - nbuf);
+    if (to_arrays)
+      memcpy(arrays[i] + offset, buf + nbuf, m * sizeof(complex<double>));
+    else
+      memcpy(buf + nbuf, arrays[i] + offset, m * sizeof(complex<double>));
+    nbuf += m;
+    offset += m;
+  }
+}
+
+size_t fields::get_dft_arrays(dft_fields fdft, const component *cs, int num_components,
+                              const int *freqs, int num_freqs, complex<double> **arrays,
+                              int *ranks, size_t *dims) {
+  // bounding boxes of the chunks storing each component, as in process_dft_component,
+  // reduced across processes for all components at once
+  int *corners = new int[10 * num_components];
+  int *all_corners = new int[10 * num_components];
+  for (int i = 0; i < num_components; ++i) {
+    if (component_index(cs[i]) == -1)
+      meep::abort("get_dft_arrays: invalid component %s", component_name(cs[i]));
+    ivec min_corner = gv.round_vec(v.get_max_corner()) + one_ivec(gv.dim);
+    ivec max_corner = gv.round_vec(v.get_min_corner()) - one_ivec(gv.dim);
+    for (dft_chunk *chunk = fdft.chunks; chunk; chunk = chunk->next_in_dft) {
+      if (chunk->c != cs[i]) continue;
+      ivec isS = chunk->S.transform(chunk->is, chunk->sn) + chunk->shift;
+      ivec ieS = chunk->S.transform(chunk->ie, chunk->sn) + chunk->shift;
+      min_corner = min(min_corner, min(isS, ieS));
+      max_corner = max(max_corner, max(isS, ieS));
+    }
+    for (int d = 0; d < 5; ++d) {
+      corners[10 * i + d] = -min_corner.in_direction(direction(d));
+      corners[10 * i + 5 + d] = max_corner.in_direction(direction(d));
+    }
+  }
+  am_now_working_on(MpiAllTime);
+  max_to_all(corners, all_corners, 10 * num_components);
+  finished_working();
+
+  size_t ntot = 0;
+  size_t *sizes = new size_t[num_components];
+  for (int i = 0; i < num_components; ++i) {
+    ivec min_corner(gv.dim), max_corner(gv.dim);
+    for (int d = 0; d < 5; ++d) {
+      min_corner.set_direction(direction(d), -all_corners[10 * i + d]);
+      max_corner.set_direction(direction(d), all_corners[10 * i + 5 + d]);
+    }
+    int rank = 0;
+    size_t full_dims[3];
+    direction dirs[3];
+    size_t full_size = 1;
+    bool empty = false;
+    LOOP_OVER_DIRECTIONS(gv.dim, d) {
+      if (max_corner.in_direction(d) < min_corner.in_direction(d)) empty = true;
+      size_t n = std::max(0, (max_corner.in_direction(d) - min_corner.in_direction(d)) / 2 + 1);
+      if (n > 1) {
+        dirs[rank] = d;
+        full_dims[rank++] = n;
+        full_size *= n;
+      }
+    }
+    if (empty) {
+      ranks[i] = -1;
+      sizes[i] = 0;
+      continue;
+    }
+
+    // the rank and dimensions after collapse_array
+    int crank = 0;
+    size_t size = 1;
+    for (int r = 0; r < rank; ++r)
+      if (fdft.where.in_direction(dirs[r]) != 0.0) {
+        dims[3 * i + crank++] = full_dims[r];
+        size *= full_dims[r];
+      }
+    ranks[i] = crank;
+    sizes[i] = size * num_freqs;
+    ntot += sizes[i];
+
+    if (arrays) {
+      for (size_t n = 0; n < sizes[i]; ++n)
+        arrays[i][n] = 0.0;
+      if (rank > 0)
+        for (int nf = 0; nf < num_freqs; ++nf) {
+          complex<double> *field_array = new complex<double>[full_size];
+          for (dft_chunk *chunk = fdft.chunks; chunk; chunk = chunk->next_in_dft)
+            if (chunk->c == cs[i])
+              chunk->process_dft_component(rank, dirs, min_corner, max_corner, freqs[nf], 0, 0, 0,
+                                           field_array, 0, 0, (int)Ex, true, this);
+          int r = rank;
+          size_t rdims[3] = {full_dims[0], full_dims[1], full_dims[2]};
+          direction rdirs[3] = {dirs[0], dirs[1], dirs[2]};
+          field_array = collapse_array(field_array, &r, rdims, rdirs, fdft.where);
+          memcpy(arrays[i] + nf * size, field_array, size * sizeof(complex<double>));
+          delete[] field_array;
+        }
+    }
+  }
+  delete[] corners;
+  delete[] all_corners;
+
+  if (arrays) {
+    // consolidate the arrays on all processes, in pieces of the concatenation of all of
+    // the arrays (which only depend on sizes, so that every process makes the same calls)
+    complex<double> *sendbuf = new complex<double>[BUFSIZE];
+    complex<double> *buf = new complex<double>[BUFSIZE];
+    int i = 0;
+    size_t offset = 0;
+    for (size_t remaining = ntot; remaining != 0;) {
+      size_t size = (remaining > BUFSIZE ? BUFSIZE : remaining);
+      int i0 = i;
+      size_t offset0 = offset;
+      copy_dft_arrays(arrays, sizes, i, offset, sendbuf, size, false);
+      am_now_working_on(MpiAllTime);
+      sum_to_all(sendbuf, buf, size);
+      finished_working();
+      copy_dft_arrays(arrays, sizes, i0, offset0, buf, size, true);
+      remaining -= size;
+    }
+    delete[] sendbuf;
+    delete[] buf;
+  }
+  delete[] sizes;
+  return ntot;
+}
+
 /***************************************************************/
 /* wrapper around process_dft_component that writes HDF5       */
 /* datasets for all components at all frequencies stored in    */
@@ -33,6 +33,8 @@ fields::fields(structure *s, double m, double beta, bool zero_fields_near_cylori
     : S(s->S), gv(s->gv), user_volume(s->user_volume), v(s->v), m(m), beta(beta) {
   shared_chunks = s->shared_chunks;
   components_allocated = false;
+  divergence_check_interval = 100;
+  num_threads = 1;
   synchronized_magnetic_fields = 0;
   outdir = new char[strlen(s->outdir) + 1];
   strcpy(outdir, s->outdir);
@@ -48,6 +50,7 @@ fields::fields(structure *s, double m, double beta, bool zero_fields_near_cylori
   t = 0;
   sources = NULL;
   fluxes = NULL;
+  probes = NULL;
   // Time stuff:
   reset_timers();
   last_step_output_wall_time = -1;
@@ -85,6 +88,8 @@ fields::fields(const fields &thef)
     : S(thef.S), gv(thef.gv), user_volume(thef.user_volume), v(thef.v) {
   shared_chunks = thef.shared_chunks;
   components_allocated = thef.components_allocated;
+  divergence_check_interval = thef.divergence_check_interval;
+  num_threads = thef.num_threads;
   synchronized_magnetic_fields = thef.synchronized_magnetic_fields;
   outdir = new char[strlen(thef.outdir) + 1];
   strcpy(outdir, thef.outdir);
@@ -101,6 +106,7 @@ fields::fields(const fields &thef)
   t = thef.t;
   sources = NULL;
   fluxes = NULL;
+  probes = NULL;
   // Time stuff:
   reset_timers();
   last_step_output_wall_time = -1;
@@ -133,6 +139,7 @@ fields::~fields() {
   }
   delete sources;
   delete fluxes;
+  delete probes;
   delete[] outdir;
 }
 
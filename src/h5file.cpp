@@ -542,6 +542,23 @@ void h5file::create_data(const char *dataname, int rank, const size_t *dims, boo
 #endif
 }
 
+/* Make the existing dataset <dataname> the current dataset for subsequent
+   write_chunk calls, e.g. to write the chunks of several datasets
+   (previously allocated by create_data) in turn.  Unlike create_data,
+   this is not a collective operation. */
+void h5file::open_data(const char *dataname) {
+#ifdef HAVE_HDF5
+  if (is_cur(dataname)) return;
+  hid_t file_id = HID(get_id());
+  CHECK(file_id >= 0, "error opening HDF5 file");
+  CHECK(dataset_exists(dataname), "missing dataset in HDF5 file");
+  hid_t data_id = H5Dopen(file_id, dataname);
+  set_cur(dataname, &data_id);
+#else
+  meep::abort("not compiled with HDF5, required for HDF5 output");
+#endif
+}
+
 /* Assumed data already created with append_data == true, and is
    already open; extends it and increments cur_dindex.  Like
    create_data, this is a collective operation and must be called from
@@ -108,7 +108,7 @@ static void integrate_chunkloop(fields_chunk *fc, int ichunk, component cgrid, i
             tr += (ie[idx] + ie[idx + ieos[2 * k]] + ie[idx + ieos[1 + 2 * k]] +
                    ie[idx + ieos[2 * k] + ieos[1 + 2 * k]]);
           else
-            tr += 4; // default inveps == 1
+            tr += 4 * fc->s->uniform_chi1inv[iecs[k]]; // uniform inveps, 1 by default
         }
         fvals[i] = (4 * data->ninveps) / tr;
       }
@@ -120,7 +120,7 @@ static void integrate_chunkloop(fields_chunk *fc, int ichunk, component cgrid, i
             tr += (im[idx] + im[idx + imos[2 * k]] + im[idx + imos[1 + 2 * k]] +
                    im[idx + imos[2 * k] + imos[1 + 2 * k]]);
           else
-            tr += 4; // default invmu == 1
+            tr += 4 * fc->s->uniform_chi1inv[imcs[k]]; // uniform invmu, 1 by default
         }
         fvals[i] = (4 * data->ninvmu) / tr;
       }
@@ -147,7 +147,7 @@ static void integrate_chunkloop(fields_chunk *fc, int ichunk, component cgrid, i
             tr += (ie[idx] + ie[idx + ieos[2 * k]] + ie[idx + ieos[1 + 2 * k]] +
                    ie[idx + ieos[2 * k] + ieos[1 + 2 * k]]);
           else
-            tr += 4; // default inveps == 1
+            tr += 4 * fc2->s->uniform_chi1inv[iecs[k]]; // uniform inveps, 1 by default
         }
         fvals[i] = (4 * data->ninveps) / tr;
       }
@@ -159,7 +159,7 @@ static void integrate_chunkloop(fields_chunk *fc, int ichunk, component cgrid, i
             tr += (im[idx] + im[idx + imos[2 * k]] + im[idx + imos[1 + 2 * k]] +
                    im[idx + imos[2 * k] + imos[1 + 2 * k]]);
           else
-            tr += 4; // default invmu == 1
+            tr += 4 * fc2->s->uniform_chi1inv[imcs[k]]; // uniform invmu, 1 by default
         }
         fvals[i] = (4 * data->ninvmu) / tr;
       }
@@ -416,6 +416,8 @@ public:
 
   const char *file_name() const { return filename; }
 
+  void open_data(const char *dataname); // select an existing dataset for write_chunk
+
   void prevent_deadlock(); // hackery for exclusive mode
   bool dataset_exists(const char *name);
 
@@ -507,6 +509,10 @@ public:
                                double tol = DEFAULT_SUBPIXEL_TOL,
                                int maxeval = DEFAULT_SUBPIXEL_MAXEVAL);
 
+  /* true if eff_chi1inv_row may be called concurrently from several threads,
+     which allows the subpixel averaging to be parallelized with OpenMP */
+  virtual bool thread_safe() { return false; }
+
   /* polarizability sigma function: return c'th row of tensor */
   virtual void sigma_row(component c, double sigrow[3], const vec &r) {
     (void)c;
@@ -575,6 +581,9 @@ public:
   realnum *chi3[NUM_FIELD_COMPONENTS], *chi2[NUM_FIELD_COMPONENTS];
   realnum *chi1inv[NUM_FIELD_COMPONENTS][5];
   bool trivial_chi1inv[NUM_FIELD_COMPONENTS][5];
+  // value of the diagonal chi1inv[c][component_direction(c)] when that array is not allocated:
+  // 1 by default, or the constant value of a homogeneous chunk whose array was compressed away
+  realnum uniform_chi1inv[NUM_FIELD_COMPONENTS];
   realnum *conductivity[NUM_FIELD_COMPONENTS][5];
   realnum *condinv[NUM_FIELD_COMPONENTS][5]; // cache of 1/(1+conduct*dt/2)
   bool condinv_stale;                        // true if condinv needs to be recomputed
@@ -587,15 +596,21 @@ public:
       cost; // The cost of this chunk's grid_volume as computed by split_by_cost and fragment_stats
 
   int refcount; // reference count of objects using this structure_chunk
+  double averaging_time; // wall time spent in set_chi1inv (subpixel averaging)
 
   ~structure_chunk();
   structure_chunk(const grid_volume &gv, const volume &vol_limit, double Courant, int proc_num);
   structure_chunk(const structure_chunk *);
   void set_chi1inv(component c, material_function &eps, bool use_anisotropic_averaging, double tol,
-                   int maxeval);
+                   int maxeval, const std::vector<volume> *where = NULL, int num_threads = 1);
   bool has_chi(component c, direction d) const;
   bool has_chisigma(component c, direction d) const;
   bool has_chi1inv(component c, direction d) const;
+  realnum chi1inv_at(component c, direction d, ptrdiff_t idx) const {
+    return chi1inv[c][d] ? chi1inv[c][d][idx]
+                         : (d == component_direction(c) ? uniform_chi1inv[c] : 0);
+  }
+  size_t material_storage(bool uncompressed = false) const;
   void set_conductivity(component c, material_function &eps);
   void update_condinv();
   void set_chi3(component c, material_function &eps);
@@ -802,22 +817,28 @@ public:
   grid_volume *effort_volumes;
   double *effort;
   int num_effort_volumes;
+  // OpenMP threads for the subpixel averaging and the timestepping of the chunks of each
+  // process (0 for the OpenMP default), which also determines the chunk layout
+  int num_threads;
 
   ~structure();
   structure(const grid_volume &gv, material_function &eps,
             const boundary_region &br = boundary_region(), const symmetry &s = meep::identity(),
             int num_chunks = 0, double Courant = 0.5, bool use_anisotropic_averaging = false,
             double tol = DEFAULT_SUBPIXEL_TOL, int maxeval = DEFAULT_SUBPIXEL_MAXEVAL,
-            const binary_partition *_bp = NULL);
+            const binary_partition *_bp = NULL, int num_threads = 1);
   structure(const grid_volume &gv, double eps(const vec &),
             const boundary_region &br = boundary_region(), const symmetry &s = meep::identity(),
             int num_chunks = 0, double Courant = 0.5, bool use_anisotropic_averaging = false,
             double tol = DEFAULT_SUBPIXEL_TOL, int maxeval = DEFAULT_SUBPIXEL_MAXEVAL,
-            const binary_partition *_bp = NULL);
+            const binary_partition *_bp = NULL, int num_threads = 1);
   structure(const structure &);
 
   void set_materials(material_function &mat, bool use_anisotropic_averaging = true,
                      double tol = DEFAULT_SUBPIXEL_TOL, int maxeval = DEFAULT_SUBPIXEL_MAXEVAL);
+  void update_materials(material_function &mat, const volume &where,
+                        bool use_anisotropic_averaging = true, double tol = DEFAULT_SUBPIXEL_TOL,
+                        int maxeval = DEFAULT_SUBPIXEL_MAXEVAL);
   void set_chi1inv(component c, material_function &eps, bool use_anisotropic_averaging = true,
                    double tol = DEFAULT_SUBPIXEL_TOL, int maxeval = DEFAULT_SUBPIXEL_MAXEVAL);
   bool has_chi(component c, direction d) const;
@@ -876,6 +897,9 @@ public:
   std::complex<double> get_mu(const vec &loc, double frequency = 0) const;
   double max_eps() const;
   double estimated_cost(int process = my_rank());
+  // bytes of the chi1inv and conductivity arrays of all processes; uncompressed=true counts
+  // the homogeneous chunks whose chi1inv was compressed to a single value as full arrays
+  size_t material_storage(bool uncompressed = false) const;
   // Returns the binary partition that was used to partition the volume into chunks. The returned
   // pointer is only valid for the lifetime of this `structure` instance.
   const binary_partition *get_binary_partition() const;
@@ -896,9 +920,10 @@ private:
   std::unique_ptr<binary_partition> bp;
 };
 
-// defined in structure.cpp
+// defined in structure.cpp; num_threads is the number of threads that timestep
+// the chunks of each process (see chunk_process)
 std::unique_ptr<binary_partition> choose_chunkdivision(grid_volume &gv, volume &v, int num_chunks,
-                                                       const symmetry &s);
+                                                       const symmetry &s, int num_threads = 1);
 
 // defined in structure_dump.cpp
 void split_by_binarytree(grid_volume gvol,
@@ -976,6 +1001,8 @@ public:
   }
   virtual std::complex<double> frequency() const { return 0.0; }
   virtual void set_frequency(std::complex<double> f) { (void)f; }
+  // bandwidth of the source, or 0 if unknown (e.g. for custom sources)
+  virtual double get_fwidth() const { return 0.0; }
 
 private:
   double current_time;
@@ -997,6 +1024,7 @@ public:
   virtual bool is_equal(const src_time &t) const;
   virtual std::complex<double> frequency() const { return freq; }
   virtual void set_frequency(std::complex<double> f) { freq = real(f); }
+  virtual double get_fwidth() const { return 1.0 / width; }
   std::complex<double> fourier_transform(const double f);
 
 private:
@@ -1057,6 +1085,54 @@ private:
   double start_time, end_time;
 };
 
+/* A set of (component, point) probes that are sampled inside fields::step on
+   every timestep, without any communication: each process only records its
+   own contribution (from the grid points that it owns) to each interpolated
+   field value, and the contributions are summed over processes only when the
+   samples are requested, at the cost of a single reduction. */
+class field_probes {
+public:
+  field_probes(fields *f);
+  ~field_probes();
+
+  int add_point(component c, const vec &pt); // returns index of the new probe
+  int num_probes() const { return nprobes; }
+  size_t num_samples() const { return nsamples; }
+
+  void sample(); // record the (local) field values at the current time
+  void clear();  // discard all the samples, including the time series
+  // max |field|^2 of each probe over the samples since the last call,
+  // which are then discarded; must be called on all processes
+  std::vector<double> max_abs2();
+
+  // sum the pending samples over all processes and append them to the
+  // time series; must be called on all processes
+  void gather();
+  // time series gathered so far: a contiguous, row-major
+  // time_series_length() x num_probes() array (NULL if empty), which is
+  // invalidated by the next gather()
+  const std::complex<double> *time_series() const { return series.empty() ? NULL : &series[0]; }
+  size_t time_series_length() const { return nprobes ? series.size() / nprobes : 0; }
+  void reserve(size_t n); // preallocate the time series for n samples
+
+  int decimation_factor; // only every decimation_factor-th call of sample() is recorded
+  field_probes *next;
+
+private:
+  fields *f;
+  int nprobes;
+  size_t nsamples;
+  size_t ncalls; // calls of sample() since the last clear(), for decimation
+  // interpolation stencil for the probes, restricted to the grid points
+  // owned by this process: samples[probe] += weight * f[chunk][c][index]
+  std::vector<int> st_probe, st_chunk;
+  std::vector<component> st_c;
+  std::vector<ptrdiff_t> st_index;
+  std::vector<std::complex<double> > st_weight;
+  std::vector<std::complex<double> > samples; // nsamples x nprobes local contributions
+  std::vector<std::complex<double> > series;  // gathered samples (sum over processes)
+};
+
 class monitor_point {
 public:
   monitor_point();
@@ -1097,6 +1173,9 @@ public:
   ~dft_chunk();
 
   void update_dft(double time);
+  void update_dft_direct(double time);
+  void update_dft_tiled(double time);
+  void update_dft_phase(double time);
 
   void scale_dft(std::complex<double> scale);
 
@@ -1111,6 +1190,10 @@ public:
 
   void operator-=(const dft_chunk &chunk);
 
+  // the location of each of the N points of the chunk, and the weight by which
+  // dft[] is multiplied in the arrays returned by fields::get_dft_array
+  void get_points(vec *loc, std::complex<double> *weight);
+
   // the frequencies to loop_in_chunks
   std::vector<double> omega;
 
@@ -1170,6 +1253,21 @@ public:
   // cache of exp(iwt) * scale, of length Nomega
   std::complex<double> *dft_phase;
 
+  /* If phase_recurrence is true, update_dft uses the tiled kernel and
+     advances dft_phase by multiplying by dft_phase_step = exp(iw*dft_phase_dt)
+     rather than recomputing exp(iwt) for every frequency on every timestep;
+     the phases are recomputed exactly every DFT_PHASE_RESYNC updates (or
+     whenever the time increment changes) to bound the roundoff drift.
+     Otherwise, the original direct kernel is used. */
+  bool phase_recurrence;
+  std::complex<double> *dft_phase_step; // exp(iw*dft_phase_dt), of length Nomega
+  double dft_phase_time;                // time at which dft_phase was last computed
+  double dft_phase_dt;                  // time increment used for dft_phase_step
+  int dft_phase_count;                  // updates since dft_phase was computed exactly
+
+  // the dft is only updated every decimation_factor timesteps
+  int decimation_factor;
+
   ptrdiff_t avg1, avg2; // index offsets for average to get epsilon grid
 
   int vc; // component descriptor from the original volume
@@ -1180,6 +1278,33 @@ void load_dft_hdf5(dft_chunk *dft_chunks, component c, h5file *file, const char
 void save_dft_hdf5(dft_chunk *dft_chunks, const char *name, h5file *file, const char *dprefix = 0);
 void load_dft_hdf5(dft_chunk *dft_chunks, const char *name, h5file *file, const char *dprefix = 0);
 
+// the change of the DFT of component c at frequency index freq in a list of dft
+// chunks between successive calls to update(), for checking the convergence of
+// the DFT without assembling the arrays of the fields (which get_dft_array does)
+class dft_change {
+public:
+  dft_change(dft_chunk *chunks_, component c_, int freq_);
+  ~dft_change();
+
+  // compare the current DFT with that of the previous call and keep a copy of it;
+  // this is a collective operation, returning norm_change()
+  double update();
+
+  // |current - previous| / |previous| in the L2 norm over the points (1 if |previous| = 0)
+  double norm_change() const { return norm_change_; }
+  // mean over the points of |current - previous| / |previous|
+  // (0 if there is no change, 1 if previous is zero anywhere or on the first update)
+  double mean_change() const { return mean_change_; }
+
+private:
+  dft_chunk *chunks;
+  component c;
+  int freq;
+  size_t N;                       // number of points in the local chunks of component c
+  std::complex<double> *previous; // the DFT at the previous update, or NULL
+  double norm_change_, mean_change_;
+};
+
 // dft.cpp (normally created with fields::add_dft_flux)
 class dft_flux {
 public:
@@ -1324,6 +1449,14 @@ public:
   double *get_farfields_array(const volume &where, int &rank, size_t *dims, size_t &N,
                               double resolution);
 
+  /* Return the equivalent sources of all processes as an N x (5 + 2*Nfreq) array
+     of (x, y, z, component, m, Re/Im of the DFT at each frequency) records */
+  std::vector<double> get_near_sources();
+
+  /* Return a newly allocated 6 x 2 x (end - start) x Nfreq array of the far fields at
+     the points [start, end) of the (row-major) grid of get_farfields_array */
+  double *get_farfields_block(const volume &where, double resolution, size_t start, size_t end);
+
   /* output far fields on a grid to an HDF5 file */
   void save_farfields(const char *fname, const char *prefix, const volume &where,
                       double resolution);
@@ -1350,6 +1483,7 @@ public:
   direction periodic_d[2];
   int periodic_n[2];
   double periodic_k[2], period[2];
+  int num_threads; // OpenMP threads of the far-field computation (those of the fields)
 
   std::vector<sourcedata> near_sourcedata(const vec &x_0, double* farpt_list, size_t nfar_pts, std::complex<double>* dJ);
 };
@@ -1517,6 +1651,9 @@ public:
     solve_cw_omega = 0.0;
   }
 
+  // step.cpp
+  ptrdiff_t first_nonfinite(component &c) const;
+
 private:
   // we set a flag during cw_solve to replace some
   // time-dependent stuff with the analogous frequency-domain operation
@@ -1542,7 +1679,7 @@ private:
   // boundaries.cpp
   void alloc_extra_connections(field_type, connect_phase, in_or_out, size_t);
   // dft.cpp
-  void update_dfts(double timeE, double timeH);
+  void update_dfts(double timeE, double timeH, int current_step);
 
   void changing_structure();
 };
@@ -1558,6 +1695,7 @@ enum time_sink {
   FourierTransforming,
   MPBTime,
   GetFarfieldsTime,
+  SubpixelAveraging,
   Other
 };
 
@@ -1644,6 +1782,7 @@ public:
   fields_chunk **chunks;
   src_time *sources;
   flux_vol *fluxes;
+  field_probes *probes;
   symmetry S;
 
   double a, dt; // The resolution a and timestep dt=Courant/a
@@ -1657,6 +1796,10 @@ public:
   boundary_condition boundaries[2][5];
   char *outdir;
   bool components_allocated;
+  int divergence_check_interval; // check for NaN/Inf fields every this many steps (0 = never)
+  // OpenMP threads over which the chunks of this process are timestepped
+  // (0 = the OpenMP default); ignored unless compiled --with-openmp
+  int num_threads;
 
   // fields.cpp methods:
   fields(structure *, double m = 0, double beta = 0, bool zero_fields_near_cylorigin = true);
@@ -1779,6 +1922,8 @@ public:
   double last_step_output_wall_time;
   int last_step_output_t;
   void step();
+  void step_n(int n); // same as n calls of step()
+  void check_divergence();
 
   // when comparing times, e.g. for source cutoffs, it
   // is useful to round to float to avoid gratuitous sensitivity
@@ -1814,6 +1959,8 @@ public:
   void _require_component(component c, bool aniso2d);
   void require_component(component c) { _require_component(c, is_aniso2d()); sync_chunk_connections(); }
   void add_srcdata(struct sourcedata cur_data, src_time *src, size_t n, std::complex<double>* amp_arr);
+  std::vector<sourcedata> point_sourcedata(component c, double *pt_list, size_t npts,
+                                           std::complex<double> *amp_list, size_t namps);
 
   // mpb.cpp
 
@@ -1888,25 +2035,26 @@ public:
                      std::complex<double> stored_weight = 1.0, dft_chunk *chunk_next = 0,
                      bool sqrt_dV_and_interp_weights = false,
                      std::complex<double> extra_weight = 1.0, bool use_centered_grid = true,
-                     int vc = 0) {
+                     int vc = 0, bool phase_recurrence = true, int decimation_factor = 1) {
     return add_dft(c, where, linspace(freq_min, freq_max, Nfreq), include_dV_and_interp_weights,
                    stored_weight, chunk_next, sqrt_dV_and_interp_weights, extra_weight,
-                   use_centered_grid, vc);
+                   use_centered_grid, vc, phase_recurrence, decimation_factor);
   }
   dft_chunk *add_dft(component c, const volume &where, const double *freq, size_t Nfreq,
                      bool include_dV_and_interp_weights = true,
                      std::complex<double> stored_weight = 1.0, dft_chunk *chunk_next = 0,
                      bool sqrt_dV_and_interp_weights = false,
                      std::complex<double> extra_weight = 1.0, bool use_centered_grid = true,
-                     int vc = 0);
+                     int vc = 0, bool phase_recurrence = true, int decimation_factor = 1);
   dft_chunk *add_dft(component c, const volume &where, const std::vector<double> freq,
                      bool include_dV_and_interp_weights = true,
                      std::complex<double> stored_weight = 1.0, dft_chunk *chunk_next = 0,
                      bool sqrt_dV_and_interp_weights = false,
                      std::complex<double> extra_weight = 1.0, bool use_centered_grid = true,
-                     int vc = 0) {
+                     int vc = 0, bool phase_recurrence = true, int decimation_factor = 1) {
     return add_dft(c, where, freq.data(), freq.size(), include_dV_and_interp_weights, stored_weight,
-                   chunk_next, sqrt_dV_and_interp_weights, extra_weight, use_centered_grid, vc);
+                   chunk_next, sqrt_dV_and_interp_weights, extra_weight, use_centered_grid, vc,
+                   phase_recurrence, decimation_factor);
   }
   dft_chunk *add_dft_pt(component c, const vec &where, double freq_min, double freq_max,
                         int Nfreq) {
@@ -1922,26 +2070,37 @@ public:
   dft_chunk *add_dft(const volume_list *where, const std::vector<double> freq,
                      bool include_dV = true);
   void update_dfts();
+  int dft_decimation_factor(const double *freq, size_t Nfreq) const;
   dft_flux add_dft_flux(const volume_list *where, const double *freq, size_t Nfreq,
-                        bool use_symmetry = true, bool centered_grid = true);
+                        bool use_symmetry = true, bool centered_grid = true,
+                        bool phase_recurrence = true, int decimation_factor = 1);
   dft_flux add_dft_flux(const volume_list *where, const std::vector<double> freq,
-                        bool use_symmetry = true, bool centered_grid = true) {
-    return add_dft_flux(where, freq.data(), freq.size(), use_symmetry, centered_grid);
+                        bool use_symmetry = true, bool centered_grid = true,
+                        bool phase_recurrence = true, int decimation_factor = 1) {
+    return add_dft_flux(where, freq.data(), freq.size(), use_symmetry, centered_grid,
+                        phase_recurrence, decimation_factor);
   }
   dft_flux add_dft_flux(const volume_list *where, double freq_min, double freq_max, int Nfreq,
-                        bool use_symmetry = true, bool centered_grid = true) {
-    return add_dft_flux(where, linspace(freq_min, freq_max, Nfreq), use_symmetry, centered_grid);
+                        bool use_symmetry = true, bool centered_grid = true,
+                        bool phase_recurrence = true, int decimation_factor = 1) {
+    return add_dft_flux(where, linspace(freq_min, freq_max, Nfreq), use_symmetry, centered_grid,
+                        phase_recurrence, decimation_factor);
   }
   dft_flux add_dft_flux(direction d, const volume &where, double freq_min, double freq_max,
-                        int Nfreq, bool use_symmetry = true, bool centered_grid = true) {
-    return add_dft_flux(d, where, linspace(freq_min, freq_max, Nfreq), use_symmetry, centered_grid);
+                        int Nfreq, bool use_symmetry = true, bool centered_grid = true,
+                        bool phase_recurrence = true, int decimation_factor = 1) {
+    return add_dft_flux(d, where, linspace(freq_min, freq_max, Nfreq), use_symmetry, centered_grid,
+                        phase_recurrence, decimation_factor);
   }
   dft_flux add_dft_flux(direction d, const volume &where, const std::vector<double> freq,
-                        bool use_symmetry = true, bool centered_grid = true) {
-    return add_dft_flux(d, where, freq.data(), freq.size(), use_symmetry, centered_grid);
+                        bool use_symmetry = true, bool centered_grid = true,
+                        bool phase_recurrence = true, int decimation_factor = 1) {
+    return add_dft_flux(d, where, freq.data(), freq.size(), use_symmetry, centered_grid,
+                        phase_recurrence, decimation_factor);
   }
   dft_flux add_dft_flux(direction d, const volume &where, const double *freq, size_t Nfreq,
-                        bool use_symmetry = true, bool centered_grid = true);
+                        bool use_symmetry = true, bool centered_grid = true,
+                        bool phase_recurrence = true, int decimation_factor = 1);
   dft_flux add_dft_flux_box(const volume &where, double freq_min, double freq_max, int Nfreq);
   dft_flux add_dft_flux_box(const volume &where, const std::vector<double> freq);
   dft_flux add_dft_flux_plane(const volume &where, double freq_min, double freq_max, int Nfreq);
@@ -1949,27 +2108,37 @@ public:
 
   // a "mode monitor" is just a dft_flux with symmetry reduction turned off.
   dft_flux add_mode_monitor(direction d, const volume &where, double freq_min, double freq_max,
-                            int Nfreq, bool centered_grid = true) {
-    return add_mode_monitor(d, where, linspace(freq_min, freq_max, Nfreq), centered_grid);
+                            int Nfreq, bool centered_grid = true, bool phase_recurrence = true,
+                            int decimation_factor = 1) {
+    return add_mode_monitor(d, where, linspace(freq_min, freq_max, Nfreq), centered_grid,
+                            phase_recurrence, decimation_factor);
   }
-  dft_flux add_mode_monitor(direction d, const volume &where, const std::vector<double> freq, bool centered_grid = true) {
-    return add_mode_monitor(d, where, freq.data(), freq.size(), centered_grid);
+  dft_flux add_mode_monitor(direction d, const volume &where, const std::vector<double> freq,
+                            bool centered_grid = true, bool phase_recurrence = true,
+                            int decimation_factor = 1) {
+    return add_mode_monitor(d, where, freq.data(), freq.size(), centered_grid, phase_recurrence,
+                            decimation_factor);
   }
-  dft_flux add_mode_monitor(direction d, const volume &where, const double *freq, size_t Nfreq, bool centered_grid = true);
+  dft_flux add_mode_monitor(direction d, const volume &where, const double *freq, size_t Nfreq,
+                            bool centered_grid = true, bool phase_recurrence = true,
+                            int decimation_factor = 1);
 
   dft_fields add_dft_fields(component *components, int num_components, const volume where,
                             double freq_min, double freq_max, int Nfreq,
-                            bool use_centered_grid = true) {
+                            bool use_centered_grid = true, bool phase_recurrence = true,
+                            int decimation_factor = 1) {
     return add_dft_fields(components, num_components, where, linspace(freq_min, freq_max, Nfreq),
-                          use_centered_grid);
+                          use_centered_grid, phase_recurrence, decimation_factor);
   }
   dft_fields add_dft_fields(component *components, int num_components, const volume where,
-                            const std::vector<double> freq, bool use_centered_grid = true) {
+                            const std::vector<double> freq, bool use_centered_grid = true,
+                            bool phase_recurrence = true, int decimation_factor = 1) {
     return add_dft_fields(components, num_components, where, freq.data(), freq.size(),
-                          use_centered_grid);
+                          use_centered_grid, phase_recurrence, decimation_factor);
   }
   dft_fields add_dft_fields(component *components, int num_components, const volume where,
-                            const double *freq, size_t Nfreq, bool use_centered_grid = true);
+                            const double *freq, size_t Nfreq, bool use_centered_grid = true,
+                            bool phase_recurrence = true, int decimation_factor = 1);
 
   /********************************************************/
   /* process_dft_component is an intermediate-level       */
@@ -2005,6 +2174,9 @@ public:
                                       size_t dims[3]);
   std::complex<double> *get_dft_array(dft_near2far n2f, component c, int num_freq, int *rank,
                                       size_t dims[3]);
+  // get the arrays of several components and frequencies at once, in a single collective
+  size_t get_dft_arrays(dft_fields fdft, const component *cs, int num_components, const int *freqs,
+                        int num_freqs, std::complex<double> **arrays, int *ranks, size_t *dims);
 
   // overlap integrals between eigenmode fields and DFT flux fields
   void get_overlap(void *mode1_data, void *mode2_data, dft_flux flux, int num_freq,
@@ -2014,34 +2186,47 @@ public:
   void get_mode_mode_overlap(void *mode1_data, void *mode2_data, dft_flux flux,
                              std::complex<double> overlaps[2]);
 
-  dft_energy add_dft_energy(const volume_list *where, double freq_min, double freq_max, int Nfreq) {
-    return add_dft_energy(where, linspace(freq_min, freq_max, Nfreq));
+  dft_energy add_dft_energy(const volume_list *where, double freq_min, double freq_max, int Nfreq,
+                            bool phase_recurrence = true, int decimation_factor = 1) {
+    return add_dft_energy(where, linspace(freq_min, freq_max, Nfreq), phase_recurrence,
+                          decimation_factor);
   }
-  dft_energy add_dft_energy(const volume_list *where, const std::vector<double> freq) {
-    return add_dft_energy(where, freq.data(), freq.size());
+  dft_energy add_dft_energy(const volume_list *where, const std::vector<double> freq,
+                            bool phase_recurrence = true, int decimation_factor = 1) {
+    return add_dft_energy(where, freq.data(), freq.size(), phase_recurrence, decimation_factor);
   }
-  dft_energy add_dft_energy(const volume_list *where, const double *freq, size_t Nfreq);
+  dft_energy add_dft_energy(const volume_list *where, const double *freq, size_t Nfreq,
+                            bool phase_recurrence = true, int decimation_factor = 1);
 
   // stress.cpp
-  dft_force add_dft_force(const volume_list *where, double freq_min, double freq_max, int Nfreq) {
-    return add_dft_force(where, linspace(freq_min, freq_max, Nfreq));
+  dft_force add_dft_force(const volume_list *where, double freq_min, double freq_max, int Nfreq,
+                          bool phase_recurrence = true, int decimation_factor = 1) {
+    return add_dft_force(where, linspace(freq_min, freq_max, Nfreq), phase_recurrence,
+                         decimation_factor);
   }
-  dft_force add_dft_force(const volume_list *where, const std::vector<double> freq) {
-    return add_dft_force(where, freq.data(), freq.size());
+  dft_force add_dft_force(const volume_list *where, const std::vector<double> freq,
+                          bool phase_recurrence = true, int decimation_factor = 1) {
+    return add_dft_force(where, freq.data(), freq.size(), phase_recurrence, decimation_factor);
   }
-  dft_force add_dft_force(const volume_list *where, const double *freq, size_t Nfreq);
+  dft_force add_dft_force(const volume_list *where, const double *freq, size_t Nfreq,
+                          bool phase_recurrence = true, int decimation_factor = 1);
 
   // near2far.cpp
   dft_near2far add_dft_near2far(const volume_list *where, double freq_min, double freq_max,
-                                int Nfreq, int Nperiods = 1) {
-    return add_dft_near2far(where, linspace(freq_min, freq_max, Nfreq), Nperiods);
+                                int Nfreq, int Nperiods = 1, bool phase_recurrence = true,
+                                int decimation_factor = 1) {
+    return add_dft_near2far(where, linspace(freq_min, freq_max, Nfreq), Nperiods, phase_recurrence,
+                            decimation_factor);
   }
   dft_near2far add_dft_near2far(const volume_list *where, const std::vector<double> freq,
-                                int Nperiods = 1) {
-    return add_dft_near2far(where, freq.data(), freq.size(), Nperiods);
+                                int Nperiods = 1, bool phase_recurrence = true,
+                                int decimation_factor = 1) {
+    return add_dft_near2far(where, freq.data(), freq.size(), Nperiods, phase_recurrence,
+                            decimation_factor);
   }
   dft_near2far add_dft_near2far(const volume_list *where, const double *freq, size_t Nfreq,
-                                int Nperiods = 1);
+                                int Nperiods = 1, bool phase_recurrence = true,
+                                int decimation_factor = 1);
   // monitor.cpp
   std::complex<double> get_chi1inv(component, direction, const vec &loc, double frequency = 0,
                                    bool parallel = true) const;
@@ -2057,6 +2242,8 @@ public:
   std::complex<double> get_field(int c, const vec &loc, bool parallel = true) const;
   std::complex<double> get_field(component c, const vec &loc, bool parallel = true) const;
   double get_field(derived_component c, const vec &loc, bool parallel = true) const;
+  field_probes *add_field_probes();
+  void remove_field_probes(field_probes *p);
 
   // energy_and_flux.cpp
   void synchronize_magnetic_fields();
@@ -2100,6 +2287,7 @@ public:
   void unset_solve_cw_omega();
 
 private:
+  friend class field_probes;
   int synchronized_magnetic_fields; // count number of nested synchs
   double last_wall_time;
 #define MEEP_TIMING_STACK_SZ 10
@@ -2121,6 +2309,7 @@ private:
   void locate_volume_source_in_user_volume(const vec p1, const vec p2, vec newp1[8], vec newp2[8],
                                            std::complex<double> kphase[8], int &ncopies) const;
   // step.cpp
+  int chunk_threads() const;
   void phase_material();
   void step_db(field_type ft);
   void step_source(field_type ft, bool including_integrated = false);
@@ -2142,6 +2331,7 @@ public:
   void am_now_working_on(time_sink);
   void finished_working();
   void reset_timers();
+  void update_averaging_time();
 
  private:
   // The following is an array that is num_chunks by num_chunks.  Actually
@@ -57,6 +57,7 @@ int my_rank();
 bool am_really_master();
 inline int am_master() { return my_rank() == 0; }
 bool with_mpi();
+bool with_openmp();
 
 void send(int from, int to, double *data, int size = 1);
 void broadcast(int from, float *data, int size);
@@ -72,10 +73,13 @@ bool broadcast(int from, bool);
 double max_to_master(double); // Only returns the correct value to proc 0.
 double max_to_all(double);
 int max_to_all(int);
+void max_to_all(const int *in, int *out, int size);
 float sum_to_master(float);   // Only returns the correct value to proc 0.
 double sum_to_master(double); // Only returns the correct value to proc 0.
 double sum_to_all(double);
 void sum_to_all(const double *in, double *out, int size);
+// concatenates the size elements of in from every process, in rank order, into out on all processes
+void gather_to_all(const double *in, int size, double *out);
 void sum_to_master(const float *in, float *out, int size);
 void sum_to_master(const double *in, double *out, int size);
 void sum_to_all(const float *in, double *out, int size);
@@ -101,11 +101,11 @@ void step_curl(realnum *f, component c, const realnum *g1, const realnum *g2,
                const realnum *sigu, const realnum *kapu, const realnum *siginvu, realnum dt,
                const realnum *cnd, const realnum *cndinv, realnum *fcnd);
 
-void step_update_EDHB(realnum *f, component fc, const grid_volume &gv, const ivec is, const ivec ie, const realnum *g,
-                      const realnum *g1, const realnum *g2, const realnum *u, const realnum *u1,
-                      const realnum *u2, ptrdiff_t s, ptrdiff_t s1, ptrdiff_t s2,
-                      const realnum *chi2, const realnum *chi3, realnum *fw, direction dsigw,
-                      const realnum *sigw, const realnum *kapw);
+void step_update_EDHB(realnum *f, component fc, const grid_volume &gv, const ivec is, const ivec ie,
+                      const realnum *g, const realnum *g1, const realnum *g2, const realnum *u,
+                      const realnum *u1, const realnum *u2, realnum u0, ptrdiff_t s, ptrdiff_t s1,
+                      ptrdiff_t s2, const realnum *chi2, const realnum *chi3, realnum *fw,
+                      direction dsigw, const realnum *sigw, const realnum *kapw);
 
 void step_beta(realnum *f, component c, const realnum *g, const grid_volume &gv, const ivec is, const ivec ie, realnum betadt,
                direction dsig, const realnum *siginv, realnum *fu, direction dsigu,
@@ -121,11 +121,12 @@ void step_curl_stride1(realnum *f, component c, const realnum *g1, const realnum
                        const realnum *sigu, const realnum *kapu, const realnum *siginvu, realnum dt,
                        const realnum *cnd, const realnum *cndinv, realnum *fcnd);
 
-void step_update_EDHB_stride1(realnum *f, component fc, const grid_volume &gv, const ivec is, const ivec ie, const realnum *g,
-                              const realnum *g1, const realnum *g2, const realnum *u,
-                              const realnum *u1, const realnum *u2, ptrdiff_t s, ptrdiff_t s1,
-                              ptrdiff_t s2, const realnum *chi2, const realnum *chi3, realnum *fw,
-                              direction dsigw, const realnum *sigw, const realnum *kapw);
+void step_update_EDHB_stride1(realnum *f, component fc, const grid_volume &gv, const ivec is,
+                              const ivec ie, const realnum *g, const realnum *g1, const realnum *g2,
+                              const realnum *u, const realnum *u1, const realnum *u2, realnum u0,
+                              ptrdiff_t s, ptrdiff_t s1, ptrdiff_t s2, const realnum *chi2,
+                              const realnum *chi3, realnum *fw, direction dsigw,
+                              const realnum *sigw, const realnum *kapw);
 
 void step_beta_stride1(realnum *f, component c, const realnum *g, const grid_volume &gv, const ivec is, const ivec ie,
                        realnum betadt, direction dsig, const realnum *siginv, realnum *fu,
@@ -148,15 +149,15 @@ void step_beta_stride1(realnum *f, component c, const realnum *g, const grid_vol
                 siginvu, dt, cnd, cndinv, fcnd);                                                   \
   } while (0)
 
-#define STEP_UPDATE_EDHB(f, fc, gv, is, ie, g, g1, g2, u, u1, u2, s, s1, s2, chi2, chi3, fw, dsigw, sigw,  \
-                         kapw)                                                                     \
+#define STEP_UPDATE_EDHB(f, fc, gv, is, ie, g, g1, g2, u, u1, u2, u0, s, s1, s2, chi2, chi3, fw,   \
+                         dsigw, sigw, kapw)                                                        \
   do {                                                                                             \
     if (LOOPS_ARE_STRIDE1(gv))                                                                     \
-      step_update_EDHB_stride1(f, fc, gv, is, ie, g, g1, g2, u, u1, u2, s, s1, s2, chi2, chi3, fw, dsigw,  \
-                               sigw, kapw);                                                        \
+      step_update_EDHB_stride1(f, fc, gv, is, ie, g, g1, g2, u, u1, u2, u0, s, s1, s2, chi2, chi3, \
+                               fw, dsigw, sigw, kapw);                                             \
     else                                                                                           \
-      step_update_EDHB(f, fc, gv, is, ie, g, g1, g2, u, u1, u2, s, s1, s2, chi2, chi3, fw, dsigw, sigw,    \
-                       kapw);                                                                      \
+      step_update_EDHB(f, fc, gv, is, ie, g, g1, g2, u, u1, u2, u0, s, s1, s2, chi2, chi3, fw,     \
+                       dsigw, sigw, kapw);                                                         \
   } while (0)
 
 #define STEP_BETA(f, c, g, gv, is, ie, betadt, dsig, siginv, fu, dsigu, siginvu, cndinv, fcnd)             \
@@ -636,6 +636,79 @@ struct pol {
   struct pol *next;
 };
 
+static bool is_constant(material_type md) {
+  return md->which_subclass == material_data::MEDIUM ||
+         md->which_subclass == material_data::PERFECT_METAL;
+}
+
+static bool boxes_intersect(const geom_box &b1, const geom_box &b2) {
+  return b1.low.x <= b2.high.x && b2.low.x <= b1.high.x && b1.low.y <= b2.high.y &&
+         b2.low.y <= b1.high.y && b1.low.z <= b2.high.z && b2.low.z <= b1.high.z;
+}
+
+static bool box_contains_box(const geom_box &b, const geom_box &inner) {
+  return b.low.x <= inner.low.x && inner.high.x <= b.high.x && b.low.y <= inner.low.y &&
+         inner.high.y <= b.high.y && b.low.z <= inner.low.z && inner.high.z <= b.high.z;
+}
+
+/* Find the distinct (object, periodic shift) pairs in the tree t whose
+   bounding boxes intersect b, stopping once nfound reaches 2. */
+static void find_box_objects(const geom_box &b, geom_box_tree t, const geom_box_object *found[2],
+                             int &nfound) {
+  if (!t || nfound > 1 || !boxes_intersect(b, t->b)) return;
+  for (int i = 0; i < t->nobjects && nfound < 2; ++i) {
+    const geom_box_object *gbo = t->objects + i;
+    if (!boxes_intersect(b, gbo->box)) continue;
+    if (nfound == 1 && found[0]->o == gbo->o && vector3_equal(found[0]->shiftby, gbo->shiftby))
+      continue; // same object, stored in more than one node of the tree
+    found[nfound++] = gbo;
+  }
+  if (boxes_intersect(b, t->b1)) find_box_objects(b, t->t1, found, nfound);
+  if (boxes_intersect(b, t->b2)) find_box_objects(b, t->t2, found, nfound);
+}
+
+static bool is_convex(const geometric_object *o) {
+  switch (o->which_subclass) {
+    case geometric_object::BLOCK: // includes ellipsoids
+    case geometric_object::SPHERE: return true;
+    case geometric_object::CYLINDER: // includes cones, but wedges may be concave
+      return o->subclass.cylinder_data->which_subclass != cylinder::WEDGE;
+    default: return false;
+  }
+}
+
+/* Fast path of get_front_object for the common case of a pixel v that lies
+   entirely inside a single (convex) object or that intersects the bounding
+   box of no object at all, in which case it has the constant material mat
+   and there is nothing to average.  This only needs a single search of the
+   tree (the bounding boxes and, if there is an object, the corners of the
+   pixel), and it returns false whenever the full algorithm is needed. */
+static bool get_uniform_material(const meep::volume &v, geom_box_tree t, material_type &mat) {
+  geom_box pixel = gv2box(v);
+  if (!box_contains_box(t->b, pixel)) return false;
+
+  const geom_box_object *found[2];
+  int nfound = 0;
+  find_box_objects(pixel, t, found, nfound);
+  if (nfound == 0) {
+    mat = (material_type)default_material;
+    return is_constant(mat);
+  }
+  if (nfound > 1) return false;
+
+  const geometric_object *o = found[0]->o;
+  mat = (material_type)o->material;
+  if (!is_constant(mat) || !is_convex(o)) return false;
+  for (int i = 0; i < 8; ++i) {
+    vector3 q;
+    q.x = (i & 1) ? pixel.high.x : pixel.low.x;
+    q.y = (i & 2) ? pixel.high.y : pixel.low.y;
+    q.z = (i & 4) ? pixel.high.z : pixel.low.z;
+    if (!point_in_fixed_objectp(vector3_minus(q, found[0]->shiftby), *o)) return false;
+  }
+  return true;
+}
+
 // structure to hold a conductivity profile (for scalar absorbing layers)
 struct cond_profile {
   double L;     // thickness
@@ -676,6 +749,7 @@ public:
   virtual double chi1p1(meep::field_type ft, const meep::vec &r);
   virtual void eff_chi1inv_row(meep::component c, double chi1inv_row[3], const meep::volume &v,
                                double tol, int maxeval);
+  virtual bool thread_safe();
 
   void eff_chi1inv_matrix(meep::component c, symmetric_matrix *chi1inv_matrix,
                           const meep::volume &v, double tol, int maxeval, bool &fallback);
@@ -1034,6 +1108,28 @@ static bool get_front_object(const meep::volume &v, geom_box_tree geometry_tree,
   return true;
 }
 
+/* Whether the averaging only involves constant materials, since variable and
+   file materials store their value at the current point in the (shared)
+   material_data, and whether the objects only use reentrant libctl routines
+   (prisms store intersection points in a shared workspace). */
+static bool thread_safe_object(const geometric_object &o) {
+  if (o.which_subclass == geometric_object::PRISM) return false;
+  if (o.which_subclass == geometric_object::COMPOUND_GEOMETRIC_OBJECT) {
+    const geometric_object_list &l = o.subclass.compound_geometric_object_data->component_objects;
+    for (int i = 0; i < l.num_items; ++i)
+      if (!thread_safe_object(l.items[i])) return false;
+    return true;
+  }
+  return is_constant((material_type)o.material);
+}
+
+bool geom_epsilon::thread_safe() {
+  if (!is_constant((material_type)default_material)) return false;
+  for (int i = 0; i < geometry.num_items; ++i)
+    if (!thread_safe_object(geometry.items[i])) return false;
+  return true;
+}
+
 void geom_epsilon::eff_chi1inv_row(meep::component c, double chi1inv_row[3], const meep::volume &v,
                                    double tol, int maxeval) {
   symmetric_matrix meps_inv;
@@ -1083,6 +1179,8 @@ void geom_epsilon::eff_chi1inv_matrix(meep::component c, symmetric_matrix *chi1i
     return;
   }
 
+  if (get_uniform_material(v, restricted_tree, mat)) goto trivial;
+
   if (!get_front_object(v, geometry_tree, p, &o, shiftby, mat, mat_behind)) {
     get_material_pt(mat, v.center());
     if (mat && (mat->which_subclass == material_data::MATERIAL_USER ||
@@ -1931,7 +2029,8 @@ void add_absorbing_layer(absorber_list alist, double thickness, int direction, i
 void set_materials_from_geometry(meep::structure *s, geometric_object_list g, vector3 center,
                                  bool use_anisotropic_averaging, double tol, int maxeval,
                                  bool _ensure_periodicity, material_type _default_material,
-                                 absorber_list alist, material_type_list extra_materials) {
+                                 absorber_list alist, material_type_list extra_materials,
+                                 const meep::volume *where) {
   // set global variables in libctlgeom based on data fields in s
   geom_initialize();
   geometry_center = center;
@@ -2005,7 +2104,11 @@ void set_materials_from_geometry(meep::structure *s, geometric_object_list g, ve
   /***************************************************************/
   /***************************************************************/
   /***************************************************************/
-  s->set_materials(geps, use_anisotropic_averaging, tol, maxeval);
+  // if where is given, only the materials near where have changed since the last call
+  if (where)
+    s->update_materials(geps, *where, use_anisotropic_averaging, tol, maxeval);
+  else
+    s->set_materials(geps, use_anisotropic_averaging, tol, maxeval);
   s->remove_susceptibilities();
   geps.add_susceptibilities(s);
 
@@ -2787,6 +2890,50 @@ void material_grids_addgradient(double *v, size_t ng, std::complex<double> *fiel
   }
 }
 
+/* Same as material_grids_addgradient, but with the adjoint and forward fields given
+   by the process-local data of the dft_chunks of the design region (in the order of
+   the dft arrays of the chunks, as for the chunks list itself), so that no process
+   needs the fields of the whole design region. The gradient contributions of all the
+   processes are summed into v. */
+void material_grids_addgradient_chunks(double *v, size_t ng, const std::complex<double> *fields_a,
+                                       const std::complex<double> *fields_f, size_t nfields,
+                                       meep::dft_chunk *chunks, double *frequencies, size_t nf,
+                                       double scalegrad, geom_box_tree geometry_tree) {
+  double *vlocal = new double[ng * nf];
+  memset(vlocal, 0, sizeof(double) * ng * nf);
+
+  size_t offset = 0;
+  for (meep::dft_chunk *chunk = chunks; chunk; chunk = chunk->next_in_dft) {
+    if (chunk->omega.size() != nf)
+      meep::abort("material_grids_addgradient_chunks: %zu frequencies, expected %zu",
+                  chunk->omega.size(), nf);
+    if (offset + chunk->N * nf > nfields)
+      meep::abort("material_grids_addgradient_chunks: fields arrays are too small");
+    meep::vec *loc = new meep::vec[chunk->N];
+    std::complex<double> *weight = new std::complex<double>[chunk->N];
+    chunk->get_points(loc, weight);
+    for (size_t n = 0; n < chunk->N; ++n) {
+      vector3 p = vec_to_vector3(loc[n]);
+      for (size_t i = 0; i < nf; ++i, ++offset)
+        material_grids_addgradient_point(vlocal + ng * i, fields_a[offset] * weight[n],
+                                         fields_f[offset] * weight[n], chunk->c, p, scalegrad,
+                                         frequencies[i], geometry_tree);
+    }
+    delete[] loc;
+    delete[] weight;
+  }
+  if (offset != nfields)
+    meep::abort("material_grids_addgradient_chunks: fields arrays have %zu entries, expected %zu",
+                nfields, offset);
+
+  double *vsum = new double[ng * nf];
+  meep::sum_to_all(vlocal, vsum, ng * nf);
+  for (size_t i = 0; i < ng * nf; ++i)
+    v[i] += vsum[i];
+  delete[] vsum;
+  delete[] vlocal;
+}
+
 static void find_array_min_max(int n, const double *data, double &min_val, double &max_val) {
   min_val = data[0];
   max_val = data[0];
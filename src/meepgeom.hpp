@@ -161,7 +161,8 @@ void set_materials_from_geometry(meep::structure *s, geometric_object_list g,
                                  int maxeval = DEFAULT_SUBPIXEL_MAXEVAL,
                                  bool ensure_periodicity = false,
                                  material_type _default_material = vacuum, absorber_list alist = 0,
-                                 material_type_list extra_materials = material_type_list());
+                                 material_type_list extra_materials = material_type_list(),
+                                 const meep::volume *where = NULL);
 
 material_type make_dielectric(double epsilon);
 material_type make_user_material(user_material_func user_func, void *user_data, bool do_averaging);
@@ -229,6 +230,10 @@ void material_grids_addgradient(double *v, size_t ng, std::complex<double> *fiel
                                 std::complex<double> *fields_f, double *frequencies,
                                 size_t nf, double scalegrad, const meep::volume &where,
                                 geom_box_tree geometry_tree, meep::fields *f);
+void material_grids_addgradient_chunks(double *v, size_t ng, const std::complex<double> *fields_a,
+                                       const std::complex<double> *fields_f, size_t nfields,
+                                       meep::dft_chunk *chunks, double *frequencies, size_t nf,
+                                       double scalegrad, geom_box_tree geometry_tree);
 
 /***************************************************************/
 /* routines in GDSIIgeom.cc ************************************/
@@ -163,6 +163,111 @@ complex<double> fields_chunk::get_field(component c, const ivec &iloc) const {
     return 0.0;
 }
 
+field_probes::field_probes(fields *f_)
+    : decimation_factor(1), next(NULL), f(f_), nprobes(0), nsamples(0), ncalls(0) {}
+
+field_probes::~field_probes() { delete next; }
+
+/* Add a probe of component c at the point pt, interpolated the same way as
+   in fields::get_field(c, pt); we only store the stencil points that are
+   owned by this process (by the same logic as fields::get_field(c, ivec)). */
+int field_probes::add_point(component c, const vec &pt) {
+  if (is_derived(c) || c == Dielectric || c == Permeability || c == NO_COMPONENT)
+    meep::abort("field_probes only support field components, not %s", component_name(c));
+  clear(); // the layout of the samples changes
+
+  std::complex<double> kzphase = 1.0;
+  if (f->gv.dim == D2 && pt.in_direction(Z) != 0) // special_kz handling
+    kzphase = std::polar(1.0, 2 * pi * f->beta * pt.in_direction(Z));
+
+  ivec ilocs[8];
+  double w[8];
+  f->gv.interpolate(c, pt, ilocs, w);
+  for (int argh = 0; argh < 8 && w[argh]; argh++) {
+    ivec iloc = ilocs[argh];
+    complex<double> kphase = 1.0;
+    f->locate_point_in_user_volume(&iloc, &kphase);
+    bool found = false;
+    for (int sn = 0; sn < f->S.multiplicity() && !found; sn++)
+      for (int i = 0; i < f->num_chunks && !found; i++)
+        if (f->chunks[i]->gv.owns(f->S.transform(iloc, sn))) {
+          found = true;
+          if (f->chunks[i]->is_mine()) {
+            component cs = f->S.transform(c, sn);
+            st_probe.push_back(nprobes);
+            st_chunk.push_back(i);
+            st_c.push_back(cs);
+            st_index.push_back(f->chunks[i]->gv.index(cs, f->S.transform(iloc, sn)));
+            st_weight.push_back(w[argh] * f->S.phase_shift(c, sn) * kphase * kzphase);
+          }
+        }
+  }
+  return nprobes++;
+}
+
+void field_probes::clear() {
+  samples.clear();
+  series.clear();
+  nsamples = 0;
+  ncalls = 0;
+}
+
+void field_probes::sample() {
+  if (decimation_factor <= 0) meep::abort("invalid decimation_factor %d", decimation_factor);
+  if (ncalls++ % decimation_factor) return;
+  const size_t offset = samples.size();
+  samples.resize(offset + nprobes, 0.0);
+  for (size_t k = 0; k < st_probe.size(); ++k) {
+    const realnum *const *fc = f->chunks[st_chunk[k]]->f[st_c[k]];
+    if (!fc[0]) continue;
+    complex<double> val = fc[1] ? getcm(fc, st_index[k]) : complex<double>(fc[0][st_index[k]]);
+    samples[offset + st_probe[k]] += st_weight[k] * val;
+  }
+  ++nsamples;
+}
+
+std::vector<double> field_probes::max_abs2() {
+  std::vector<complex<double> > all(samples.size());
+  sum_to_all(samples.data(), all.data(), int(samples.size()));
+  std::vector<double> maxes(nprobes, 0.0);
+  for (size_t n = 0; n < nsamples; ++n)
+    for (int i = 0; i < nprobes; ++i)
+      maxes[i] = std::max(maxes[i], norm(all[n * nprobes + i]));
+  samples.clear();
+  nsamples = 0;
+  return maxes;
+}
+
+void field_probes::gather() {
+  const size_t offset = series.size();
+  series.resize(offset + samples.size());
+  sum_to_all(samples.data(), series.data() + offset, int(samples.size()));
+  samples.clear();
+  nsamples = 0;
+}
+
+void field_probes::reserve(size_t n) {
+  samples.reserve(n * nprobes);
+  series.reserve(n * nprobes);
+}
+
+field_probes *fields::add_field_probes() {
+  field_probes *p = new field_probes(this);
+  p->next = probes;
+  probes = p;
+  return p;
+}
+
+void fields::remove_field_probes(field_probes *p) {
+  for (field_probes **cur = &probes; *cur; cur = &(*cur)->next)
+    if (*cur == p) {
+      *cur = p->next;
+      p->next = NULL;
+      delete p;
+      return;
+    }
+}
+
 complex<double> fields::get_chi1inv(component c, direction d, const ivec &origloc, double frequency,
                                     bool parallel) const {
   ivec iloc = origloc;
@@ -262,8 +367,7 @@ complex<double> structure_chunk::get_chi1inv_at_pt(component c, direction d, int
                                                    double frequency) const {
   complex<double> res(0.0, 0.0);
   if (is_mine()) {
-    if (frequency == 0)
-      return chi1inv[c][d] ? chi1inv[c][d][idx] : (d == component_direction(c) ? 1.0 : 0);
+    if (frequency == 0) return chi1inv_at(c, d, idx);
     // ----------------------------------------------------------------- //
     // ---- Step 1: Get instantaneous chi1 tensor ----------------------
     // ----------------------------------------------------------------- //
@@ -307,8 +411,8 @@ complex<double> structure_chunk::get_chi1inv_at_pt(component c, direction d, int
     // Set up the chi1inv tensor with the DC components
     for (int com_it = 0; com_it < 3; com_it++) {
       for (int dir_int = 0; dir_int < 3; dir_int++) {
-        if (chi1inv[comp_list[com_it]][dir_int])
-          chi1_inv_tensor[com_it + 3 * dir_int] = chi1inv[comp_list[com_it]][dir_int][idx];
+        chi1_inv_tensor[com_it + 3 * dir_int] =
+            chi1inv_at(comp_list[com_it], (direction)dir_int, idx);
       }
     }
 
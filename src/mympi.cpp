@@ -129,7 +129,15 @@ int verbosity = 1; // defined in meep.h
 
 initialize::initialize(int &argc, char **&argv) {
 #ifdef HAVE_MPI
+#ifdef HAVE_OPENMP
+  // MPI is only called outside of the OpenMP parallel regions (hybrid MPI + threads)
+  int provided;
+  MPI_Init_thread(&argc, &argv, MPI_THREAD_FUNNELED, &provided);
+  if (provided < MPI_THREAD_FUNNELED)
+    master_printf("WARNING: MPI does not support OpenMP threads (MPI_THREAD_FUNNELED)\n");
+#else
   MPI_Init(&argc, &argv);
+#endif
   int major, minor;
   MPI_Get_version(&major, &minor);
   if (verbosity > 0)
@@ -322,6 +330,14 @@ int max_to_all(int in) {
   return out;
 }
 
+void max_to_all(const int *in, int *out, int size) {
+#ifdef HAVE_MPI
+  MPI_Allreduce((void *)in, out, size, MPI_INT, MPI_MAX, mycomm);
+#else
+  memcpy(out, in, sizeof(int) * size);
+#endif
+}
+
 ivec max_to_all(const ivec &pt) {
   int in[5], out[5];
   for (int i = 0; i < 5; ++i)
@@ -367,6 +383,23 @@ void sum_to_all(const double *in, double *out, int size) {
 #endif
 }
 
+void gather_to_all(const double *in, int size, double *out) {
+#ifdef HAVE_MPI
+  int n = count_processors();
+  int *sizes = new int[n];
+  int *offsets = new int[n];
+  MPI_Allgather(&size, 1, MPI_INT, sizes, 1, MPI_INT, mycomm);
+  offsets[0] = 0;
+  for (int i = 1; i < n; ++i)
+    offsets[i] = offsets[i - 1] + sizes[i - 1];
+  MPI_Allgatherv((void *)in, size, MPI_DOUBLE, out, sizes, offsets, MPI_DOUBLE, mycomm);
+  delete[] offsets;
+  delete[] sizes;
+#else
+  memcpy(out, in, sizeof(double) * size);
+#endif
+}
+
 void sum_to_master(const float *in, float *out, int size) {
 #ifdef HAVE_MPI
   MPI_Reduce((void *)in, out, size, MPI_FLOAT, MPI_SUM, 0, mycomm);
@@ -571,6 +604,14 @@ bool with_mpi() {
 #endif
 }
 
+bool with_openmp() {
+#ifdef HAVE_OPENMP
+  return true;
+#else
+  return false;
+#endif
+}
+
 // IO Routines...
 
 bool am_really_master() { return (my_global_rank() == 0); }
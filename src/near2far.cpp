@@ -24,6 +24,8 @@
 #include <assert.h>
 #include "config.h"
 #include <math.h>
+#include <string.h>
+#include <vector>
 
 using namespace std;
 
@@ -41,6 +43,7 @@ dft_near2far::dft_near2far(dft_chunk *F_, double fmin, double fmax, int Nf, doub
     periodic_k[i] = periodic_k_[i];
     period[i] = period_[i];
   }
+  num_threads = 1;
 }
 
 dft_near2far::dft_near2far(dft_chunk *F_, const std::vector<double> freq_, double eps_, double mu_,
@@ -55,6 +58,7 @@ dft_near2far::dft_near2far(dft_chunk *F_, const std::vector<double> freq_, doubl
     periodic_k[i] = periodic_k_[i];
     period[i] = period_[i];
   }
+  num_threads = 1;
 }
 
 dft_near2far::dft_near2far(dft_chunk *F_, const double *freq_, size_t Nfreq, double eps_,
@@ -71,6 +75,7 @@ dft_near2far::dft_near2far(dft_chunk *F_, const double *freq_, size_t Nfreq, dou
     periodic_k[i] = periodic_k_[i];
     period[i] = period_[i];
   }
+  num_threads = 1;
 }
 
 dft_near2far::dft_near2far(const dft_near2far &f) : F(f.F), eps(f.eps), mu(f.mu), where(f.where) {
@@ -81,6 +86,7 @@ dft_near2far::dft_near2far(const dft_near2far &f) : F(f.F), eps(f.eps), mu(f.mu)
     periodic_k[i] = f.periodic_k[i];
     period[i] = f.period[i];
   }
+  num_threads = f.num_threads;
 }
 
 void dft_near2far::remove() {
@@ -354,7 +360,7 @@ void dft_near2far::farfield_lowlevel(std::complex<double> *EH, const vec &x) {
 
     vec rshift(f->shift * (0.5 * f->fc->gv.inva));
 #ifdef HAVE_OPENMP
-#pragma omp parallel for
+#pragma omp parallel for num_threads(num_threads)
 #endif
     for (size_t i = 0; i < Nfreq; ++i) {
       std::complex<double> EH6[6];
@@ -398,67 +404,233 @@ std::complex<double> *dft_near2far::farfield(const vec &x) {
   return EH;
 }
 
-double *dft_near2far::get_farfields_array(const volume &where, int &rank, size_t *dims, size_t &N,
-                                          double resolution) {
-  /* compute output grid size etc. */
-  double dx[3] = {0, 0, 0};
-  direction dirs[3] = {X, Y, Z};
-
-  rank = 0;
-  N = dims[0] = dims[1] = dims[2] = 1;
-
-  LOOP_OVER_DIRECTIONS(where.dim, d) {
-    dims[rank] = int(floor(where.in_direction(d) * resolution));
-    if (dims[rank] <= 1)
-      dims[rank] = 1;
-    else
-      dx[rank] = where.in_direction(d) / (dims[rank] - 1);
-    N *= dims[rank];
-    dirs[rank++] = d;
+/* near-field source points (with their DFTs at all frequencies) of the chunks
+   of a dft_near2far that are owned by this process */
+struct near_sources {
+  std::vector<vec> x;                     // (symmetry-transformed) positions
+  std::vector<component> c;               // equivalent source components
+  std::vector<int> m;                     // angular index m (for Dcyl)
+  std::vector<std::complex<double> > dft; // N x Nfreq array of DFT values
+};
+
+static void get_local_near_sources(const dft_near2far &n2f, ndim dim, near_sources &near) {
+  const size_t Nfreq = n2f.freq.size();
+  size_t N = 0;
+  for (dft_chunk *f = n2f.F; f; f = f->next_in_dft)
+    N += f->N;
+  near.x.assign(N, vec(dim));
+  near.c.resize(N);
+  near.m.resize(N);
+  near.dft.resize(N * Nfreq);
+  size_t n = 0;
+  for (dft_chunk *f = n2f.F; f; f = f->next_in_dft) {
+    assert(Nfreq == f->omega.size());
+    vec rshift(f->shift * (0.5 * f->fc->gv.inva));
+    size_t idx_dft = 0;
+    LOOP_OVER_IVECS(f->fc->gv, f->is, f->ie, idx) {
+      IVEC_LOOP_LOC(f->fc->gv, x0);
+      near.x[n] = f->S.transform(x0, f->sn) + rshift;
+      near.c[n] = component(f->vc);
+      near.m[n] = f->fc->m;
+      for (size_t i = 0; i < Nfreq; ++i)
+        near.dft[n * Nfreq + i] = f->dft[Nfreq * idx_dft + i];
+      n++;
+      idx_dft++;
+    }
   }
-  if (where.dim == Dcyl) dirs[2] = P; // otherwise Z is listed twice
+  if (n != N) meep::abort("bug in get_local_near_sources: %zd != %zd points", n, N);
+}
 
+/* coordinate slot (0, 1, or 2) of direction d in the get_near_sources records */
+static int near_source_slot(direction d) { return d == R ? 0 : (d == P ? 1 : int(d)); }
+
+/* Returns the equivalent sources of all processes as an N x (5 + 2*Nfreq) array of
+   records: the x, y, z (or r, phi, z) coordinates, the source component, the angular
+   index m, and the real and imaginary parts of the DFT at each frequency. */
+std::vector<double> dft_near2far::get_near_sources() {
   const size_t Nfreq = freq.size();
-  if (N * Nfreq < 1) return NULL; /* nothing to output */
+  const size_t L = 5 + 2 * Nfreq;
+  near_sources near;
+  get_local_near_sources(*this, where.dim, near);
+  const size_t nlocal = near.x.size();
+  std::vector<double> local(nlocal * L, 0.0);
+  for (size_t n = 0; n < nlocal; ++n) {
+    double *rec = &local[n * L];
+    LOOP_OVER_DIRECTIONS(near.x[n].dim, d) { rec[near_source_slot(d)] = near.x[n].in_direction(d); }
+    rec[3] = near.c[n];
+    rec[4] = near.m[n];
+    for (size_t i = 0; i < Nfreq; ++i) {
+      rec[5 + 2 * i] = real(near.dft[n * Nfreq + i]);
+      rec[6 + 2 * i] = imag(near.dft[n * Nfreq + i]);
+    }
+  }
 
-  /* 6 x 2 x N x Nfreq array of fields in row-major order */
-  double *EH = new double[6 * 2 * N * Nfreq];
-  double *EH_ = new double[6 * 2 * N * Nfreq]; // temp array for sum_to_all
+  std::vector<double> all(sum_to_all(nlocal) * L);
+  gather_to_all(local.data(), int(nlocal * L), all.data());
+  return all;
+}
 
-  /* fields for farfield_lowlevel for a single output point x */
-  std::complex<double> *EH1 = new std::complex<double>[6 * Nfreq];
+/* tile sizes (far points x near points) for the far-field evaluation */
+#define FARFIELD_TILE_FAR 16
+#define FARFIELD_TILE_NEAR 256
+
+/* Adds the far fields of n2f at the far points x[0..nx-1] from the near points
+   [n0, n1) to EH, a nx x Nfreq x 6 array. */
+static void farfield_tile(const dft_near2far &n2f, std::complex<double> *EH, const vec *x,
+                          size_t nx, const near_sources &near, size_t n0, size_t n1) {
+  const std::vector<double> &freq = n2f.freq;
+  const direction *periodic_d = n2f.periodic_d;
+  const int *periodic_n = n2f.periodic_n;
+  const double *periodic_k = n2f.periodic_k, *period = n2f.period;
+  const double eps = n2f.eps, mu = n2f.mu;
+  const size_t Nfreq = freq.size();
+  greenfunc green = x[0].dim == D2 ? green2d : green3d;
+  std::complex<double> EH6[6];
+  for (size_t ix = 0; ix < nx; ++ix)
+    for (size_t n = n0; n < n1; ++n) {
+      const vec &x0 = near.x[n];
+      vec xs(x0);
+      for (int i0 = -periodic_n[0]; i0 <= periodic_n[0]; ++i0) {
+        if (periodic_d[0] != NO_DIRECTION)
+          xs.set_direction(periodic_d[0], x0.in_direction(periodic_d[0]) + i0 * period[0]);
+        double phase0 = i0 * periodic_k[0];
+        for (int i1 = -periodic_n[1]; i1 <= periodic_n[1]; ++i1) {
+          if (periodic_d[1] != NO_DIRECTION)
+            xs.set_direction(periodic_d[1], x0.in_direction(periodic_d[1]) + i1 * period[1]);
+          double phase = phase0 + i1 * periodic_k[1];
+          std::complex<double> cphase = std::polar(1.0, phase);
+          for (size_t i = 0; i < Nfreq; ++i) {
+            if (x[ix].dim == Dcyl)
+              greencyl(EH6, x[ix], freq[i], eps, mu, xs, near.c[n], near.dft[n * Nfreq + i],
+                       near.m[n], 1e-3);
+            else
+              green(EH6, x[ix], freq[i], eps, mu, xs, near.c[n], near.dft[n * Nfreq + i]);
+            for (int j = 0; j < 6; ++j)
+              EH[(ix * Nfreq + i) * 6 + j] += EH6[j] * cphase;
+          }
+        }
+      }
+    }
+}
 
-  double start = wall_time();
-  size_t last_point = 0;
+/* number of doubles (far points x Nfreq x 6 x 2) of far fields computed at a time */
+#define FARFIELD_BLOCK_SIZE (1 << 20)
+
+/* row-major grid of far points in where with the given resolution, as output by
+   get_farfields_array and save_farfields */
+struct farfield_grid {
+  const volume &where;
+  size_t dims[3];    // number of points along dirs[i]
+  double dx[3];      // grid spacing along dirs[i]
+  direction dirs[3]; // directions of the grid dimensions
+  int rank;          // number of grid dimensions
+  size_t N;          // total number of points
+
+  farfield_grid(const volume &where_, double resolution) : where(where_) {
+    rank = 0;
+    N = dims[0] = dims[1] = dims[2] = 1;
+    dx[0] = dx[1] = dx[2] = 0;
+    dirs[0] = X;
+    dirs[1] = Y;
+    dirs[2] = Z;
+    LOOP_OVER_DIRECTIONS(where.dim, d) {
+      dims[rank] = int(floor(where.in_direction(d) * resolution));
+      if (dims[rank] <= 1)
+        dims[rank] = 1;
+      else
+        dx[rank] = where.in_direction(d) / (dims[rank] - 1);
+      N *= dims[rank];
+      dirs[rank++] = d;
+    }
+    if (where.dim == Dcyl) dirs[2] = P; // otherwise Z is listed twice
+  }
 
-  vec x(where.dim);
-  for (size_t i0 = 0; i0 < dims[0]; ++i0) {
+  vec point(size_t idx) const {
+    size_t i2 = idx % dims[2], i1 = (idx / dims[2]) % dims[1], i0 = idx / (dims[2] * dims[1]);
+    vec x(where.dim);
     x.set_direction(dirs[0], where.in_direction_min(dirs[0]) + i0 * dx[0]);
-    for (size_t i1 = 0; i1 < dims[1]; ++i1) {
-      x.set_direction(dirs[1], where.in_direction_min(dirs[1]) + i1 * dx[1]);
-      for (size_t i2 = 0; i2 < dims[2]; ++i2) {
-        x.set_direction(dirs[2], where.in_direction_min(dirs[2]) + i2 * dx[2]);
-        double t;
-        if (verbosity > 0 && (t = wall_time()) > start + MEEP_MIN_OUTPUT_TIME) {
-          size_t this_point = (dims[1] * i0 + i1) * dims[2] + i2 + 1;
-          master_printf("get_farfields_array working on point %zu of %zu (%d%% done), %g s/point\n",
-                        this_point, N, (int)((double)this_point / N * 100),
-                        (t - start) / (std::max(1, (int)(this_point - last_point))));
-          start = t;
-          last_point = this_point;
+    x.set_direction(dirs[1], where.in_direction_min(dirs[1]) + i1 * dx[1]);
+    x.set_direction(dirs[2], where.in_direction_min(dirs[2]) + i2 * dx[2]);
+    return x;
+  }
+};
+
+/* Computes the far fields at the grid points [start, end) into EH, a
+   6 x 2 x (end - start) x Nfreq row-major array, on every process.  Every process
+   adds up the far fields of its own near-field sources at all of the points, in
+   tiles of far points x near points (for cache reuse) that are distributed among
+   the threads, and the far fields are then summed over the processes. */
+static void farfields_block(const dft_near2far &n2f, const farfield_grid &g,
+                            const near_sources &near, size_t start, size_t end, double *EH) {
+  const size_t Nfreq = n2f.freq.size();
+  const size_t Nnear = near.x.size();
+  const size_t n = end - start;
+  const size_t Ntiles = Nnear == 0 ? 0 : (n + FARFIELD_TILE_FAR - 1) / FARFIELD_TILE_FAR;
+
+  /* the far fields of my near-field sources, in the output order */
+  std::vector<double> EH_(6 * 2 * n * Nfreq, 0.0);
+#ifdef HAVE_OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(n2f.num_threads)
+#endif
+  for (size_t tile = 0; tile < Ntiles; ++tile) {
+    const size_t p0 = start + tile * FARFIELD_TILE_FAR;
+    const size_t nx = std::min(end, p0 + FARFIELD_TILE_FAR) - p0;
+    vec x[FARFIELD_TILE_FAR];
+    for (size_t ix = 0; ix < nx; ++ix)
+      x[ix] = g.point(p0 + ix);
+    std::vector<std::complex<double> > EH1(nx * Nfreq * 6, 0.0);
+    for (size_t n0 = 0; n0 < Nnear; n0 += FARFIELD_TILE_NEAR)
+      farfield_tile(n2f, EH1.data(), x, nx, near, n0, std::min(Nnear, n0 + FARFIELD_TILE_NEAR));
+    for (size_t ix = 0; ix < nx; ++ix)
+      for (size_t i = 0; i < Nfreq; ++i)
+        for (int k = 0; k < 6; ++k) {
+          const size_t idx = p0 - start + ix;
+          EH_[((k * 2 + 0) * n + idx) * Nfreq + i] = real(EH1[(ix * Nfreq + i) * 6 + k]);
+          EH_[((k * 2 + 1) * n + idx) * Nfreq + i] = imag(EH1[(ix * Nfreq + i) * 6 + k]);
         }
-        farfield_lowlevel(EH1, x);
-        if (verbosity > 1) all_wait(); // Allow consistent progress updates from master
-        ptrdiff_t idx = (i0 * dims[1] + i1) * dims[2] + i2;
-        for (size_t i = 0; i < Nfreq; ++i)
-          for (int k = 0; k < 6; ++k) {
-            EH_[((k * 2 + 0) * N + idx) * Nfreq + i] = real(EH1[i * 6 + k]);
-            EH_[((k * 2 + 1) * N + idx) * Nfreq + i] = imag(EH1[i * 6 + k]);
-          }
-      }
+  }
+
+  sum_to_all(EH_.data(), EH, int(EH_.size()));
+}
+
+/* number of far points per call to farfields_block */
+static size_t farfields_block_points(size_t Nfreq) {
+  return std::max(size_t(FARFIELD_TILE_FAR), FARFIELD_BLOCK_SIZE / (Nfreq * 6 * 2));
+}
+
+double *dft_near2far::get_farfields_array(const volume &where, int &rank, size_t *dims, size_t &N,
+                                          double resolution) {
+  farfield_grid g(where, resolution);
+  rank = g.rank;
+  for (int i = 0; i < 3; ++i)
+    dims[i] = g.dims[i];
+  N = g.N;
+
+  const size_t Nfreq = freq.size();
+  if (N * Nfreq < 1) return NULL; /* nothing to output */
+  if (where.dim != D3 && where.dim != D2 && where.dim != Dcyl)
+    meep::abort("only 2d or 3d or cylindrical far-field computation is supported");
+
+  near_sources near;
+  get_local_near_sources(*this, where.dim, near);
+
+  double *EH = new double[6 * 2 * N * Nfreq];
+  const size_t block = farfields_block_points(Nfreq);
+  std::vector<double> EHblock(6 * 2 * std::min(N, block) * Nfreq);
+  double t0 = wall_time(), last_output_time = t0;
+  for (size_t start = 0; start < N; start += block) {
+    const size_t end = std::min(N, start + block);
+    farfields_block(*this, g, near, start, end, EHblock.data());
+    for (int k = 0; k < 12; ++k)
+      memcpy(EH + (k * N + start) * Nfreq, EHblock.data() + k * (end - start) * Nfreq,
+             sizeof(double) * (end - start) * Nfreq);
+    double t = wall_time();
+    if (verbosity > 0 && t > last_output_time + MEEP_MIN_OUTPUT_TIME) {
+      master_printf("get_farfields_array working on point %zu of %zu (%d%% done), %g s/point\n",
+                    end, N, (int)((double)end / N * 100), (t - t0) / end);
+      last_output_time = t;
     }
   }
-  sum_to_all(EH_, EH, 6 * 2 * N * Nfreq);
 
   /* collapse singleton dimensions */
   int ireduced = 0;
@@ -467,41 +639,110 @@ double *dft_near2far::get_farfields_array(const volume &where, int &rank, size_t
   }
   rank = ireduced;
 
-  delete[] EH_;
-  delete[] EH1;
   return EH;
 }
 
-void dft_near2far::save_farfields(const char *fname, const char *prefix, const volume &where,
-                                  double resolution) {
-  size_t dims[4] = {1, 1, 1, 1};
-  int rank = 0;
-  size_t N = 1;
+double *dft_near2far::get_farfields_block(const volume &where, double resolution, size_t start,
+                                          size_t end) {
+  farfield_grid g(where, resolution);
+  if (where.dim != D3 && where.dim != D2 && where.dim != Dcyl)
+    meep::abort("only 2d or 3d or cylindrical far-field computation is supported");
+  if (start > end || end > g.N)
+    meep::abort("invalid range [%zu, %zu) of %zu far-field points", start, end, g.N);
 
-  double *EH = get_farfields_array(where, rank, dims, N, resolution);
-  if (!EH) return; /* nothing to output */
+  near_sources near;
+  get_local_near_sources(*this, where.dim, near);
+  double *EH = new double[6 * 2 * (end - start) * freq.size()];
+  farfields_block(*this, g, near, start, end, EH);
+  return EH;
+}
 
+void dft_near2far::save_farfields(const char *fname, const char *prefix, const volume &where,
+                                  double resolution) {
+  farfield_grid g(where, resolution);
   const size_t Nfreq = freq.size();
-  /* frequencies are the last dimension */
+  if (g.N * Nfreq < 1) return; /* nothing to output */
+  if (where.dim != D3 && where.dim != D2 && where.dim != Dcyl)
+    meep::abort("only 2d or 3d or cylindrical far-field computation is supported");
+
+  /* The far fields are computed and written in blocks of contiguous grid points that
+     are hyperslabs of the output datasets: a range [a, a + count) of the grid index jb,
+     with all the indices of the faster-varying dimensions. */
+  const size_t block = farfields_block_points(Nfreq);
+  int jb = 0;
+  size_t stride = g.N / g.dims[0]; /* number of grid points per index of dimension jb */
+  while (stride > block)
+    stride /= g.dims[++jb];
+  const size_t count = std::max(size_t(1), std::min(g.dims[jb], block / stride));
+
+  /* output to a file with one dataset per component & real/imag part, with
+     the singleton dimensions removed and the frequencies as the last dimension */
+  int rank = 0;
+  size_t dims[4];
+  for (int i = 0; i < 3; ++i)
+    if (g.dims[i] > 1) dims[rank++] = g.dims[i];
   if (Nfreq > 1) dims[rank++] = Nfreq;
 
-  /* output to a file with one dataset per component & real/imag part */
+  component c[6] = {Ex, Ey, Ez, Hx, Hy, Hz};
+  char datanames[12][128];
+  for (int k = 0; k < 6; ++k)
+    for (int reim = 0; reim < 2; ++reim)
+      snprintf(datanames[k * 2 + reim], 128, "%s.%c", component_name(c[k]), "ri"[reim]);
+
+  h5file *ff = NULL;
   if (am_master()) {
     const int buflen = 1024;
     static char filename[buflen];
     snprintf(filename, buflen, "%s%s%s.h5", prefix ? prefix : "", prefix && prefix[0] ? "-" : "",
              fname);
-    h5file ff(filename, h5file::WRITE, false);
-    component c[6] = {Ex, Ey, Ez, Hx, Hy, Hz};
-    char dataname[128];
-    for (int k = 0; k < 6; ++k)
-      for (int reim = 0; reim < 2; ++reim) {
-        snprintf(dataname, 128, "%s.%c", component_name(c[k]), "ri"[reim]);
-        ff.write(dataname, rank, dims, EH + (k * 2 + reim) * N * Nfreq);
+    ff = new h5file(filename, h5file::WRITE, false);
+    for (int k = 0; k < 12; ++k)
+      ff->create_data(datanames[k], rank, dims, false, false /* single_precision */);
+  }
+
+  near_sources near;
+  get_local_near_sources(*this, where.dim, near);
+
+  std::vector<double> EH(6 * 2 * count * stride * Nfreq);
+  double t0 = wall_time(), last_output_time = t0;
+  for (size_t start = 0; start < g.N; start += g.dims[jb] * stride) {
+    for (size_t a = 0; a < g.dims[jb]; a += count) {
+      const size_t n = std::min(count, g.dims[jb] - a) * stride;
+      const size_t p0 = start + a * stride;
+      farfields_block(*this, g, near, p0, p0 + n, EH.data());
+
+      if (ff) {
+        /* the hyperslab of the block in the output datasets */
+        size_t chunk_start[4] = {0, 0, 0, 0}, chunk_dims[4] = {1, 1, 1, 1};
+        int r = 0;
+        for (int i = 0; i < 3; ++i) {
+          if (g.dims[i] == 1) continue;
+          size_t stride_i = 1;
+          for (int j = i + 1; j < 3; ++j)
+            stride_i *= g.dims[j];
+          chunk_start[r] = (p0 / stride_i) % g.dims[i];
+          chunk_dims[r++] = i < jb ? 1 : (i == jb ? n / stride : g.dims[i]);
+        }
+        if (Nfreq > 1) {
+          chunk_start[r] = 0;
+          chunk_dims[r++] = Nfreq;
+        }
+        for (int k = 0; k < 12; ++k) {
+          ff->open_data(datanames[k]);
+          ff->write_chunk(rank, chunk_start, chunk_dims, EH.data() + k * n * Nfreq);
+        }
+      }
+
+      double t = wall_time();
+      if (verbosity > 0 && t > last_output_time + MEEP_MIN_OUTPUT_TIME) {
+        master_printf("save_farfields working on point %zu of %zu (%d%% done), %g s/point\n",
+                      p0 + n, g.N, (int)((double)(p0 + n) / g.N * 100), (t - t0) / (p0 + n));
+        last_output_time = t;
       }
+    }
   }
 
-  delete[] EH;
+  delete ff;
 }
 
 double *dft_near2far::flux(direction df, const volume &where, double resolution) {
@@ -557,7 +798,7 @@ double *dft_near2far::flux(direction df, const volume &where, double resolution)
 static double approxeq(double a, double b) { return fabs(a - b) < 0.5e-11 * (fabs(a) + fabs(b)); }
 
 dft_near2far fields::add_dft_near2far(const volume_list *where, const double *freq, size_t Nfreq,
-                                      int Nperiods) {
+                                      int Nperiods, bool phase_recurrence, int decimation_factor) {
   dft_chunk *F = 0; /* E and H chunks*/
   double eps = 0, mu = 0;
   volume everywhere = where->v;
@@ -631,13 +872,15 @@ dft_near2far fields::add_dft_near2far(const volume_list *where, const double *fr
         double s = j == 0 ? 1 : -1; /* sign of n x c */
         if (is_electric(c)) s = -s;
 
-        F = add_dft(c, w->v, freq, Nfreq, true, s * w->weight, F, false, 1.0, false, c0);
+        F = add_dft(c, w->v, freq, Nfreq, true, s * w->weight, F, false, 1.0, false, c0,
+                    phase_recurrence, decimation_factor);
       }
     }
   }
 
-  return dft_near2far(F, freq, Nfreq, eps, mu, everywhere, periodic_d, periodic_n, periodic_k,
-                      period);
+  dft_near2far n2f(F, freq, Nfreq, eps, mu, everywhere, periodic_d, periodic_n, periodic_k, period);
+  n2f.num_threads = chunk_threads();
+  return n2f;
 }
 
 //Modified from farfield_lowlevel
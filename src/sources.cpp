@@ -21,6 +21,7 @@
 #include <stdlib.h>
 #include <math.h>
 #include <complex>
+#include <map>
 
 #include "meep.hpp"
 #include "meep_internals.hpp"
@@ -264,10 +265,8 @@ static void src_vol_chunkloop(fields_chunk *fc, int ichunk, component c, ivec is
     /* for "D" sources, multiply by epsilon.  FIXME: this is not quite
        right because it doesn't handle non-diagonal chi1inv!
        similarly, for "B" sources, multiply by mu. */
-    if (is_D(c) && fc->s->chi1inv[c - Dx + Ex][cd])
-      amps_array[idx_vol] /= fc->s->chi1inv[c - Dx + Ex][cd][idx];
-    if (is_B(c) && fc->s->chi1inv[c - Bx + Hx][cd])
-      amps_array[idx_vol] /= fc->s->chi1inv[c - Bx + Hx][cd][idx];
+    if (is_D(c)) amps_array[idx_vol] /= fc->s->chi1inv_at(component(c - Dx + Ex), cd, idx);
+    if (is_B(c)) amps_array[idx_vol] /= fc->s->chi1inv_at(component(c - Bx + Hx), cd, idx);
 
     index_array[idx_vol++] = idx;
   }
@@ -296,6 +295,99 @@ void fields::add_srcdata(struct sourcedata cur_data, src_time *src, size_t n, st
   //     after all add_srcdata calls are complete.
 }
 
+struct point_sourcedata_chunkloop_data {
+  complex<double> amp;         // delta-function units factor
+  const complex<double> *amps; // namps amplitudes of the current point
+  size_t namps;
+  std::vector<sourcedata> *data;                  // per-chunk source data being accumulated
+  std::vector<std::map<ptrdiff_t, size_t> > *pos; // per-chunk index -> position in idx_arr
+};
+
+/* Like src_vol_chunkloop, but instead of adding a src_vol to the chunk, accumulates
+   the weighted amplitudes of the current point into the per-chunk sourcedata, so
+   that many point sources can be merged into a single src_vol per chunk. */
+static void point_sourcedata_chunkloop(fields_chunk *fc, int ichunk, component c, ivec is, ivec ie,
+                                       vec s0, vec s1, vec e0, vec e1, double dV0, double dV1,
+                                       ivec shift, complex<double> shift_phase, const symmetry &S,
+                                       int sn, void *data_) {
+  point_sourcedata_chunkloop_data *data = (point_sourcedata_chunkloop_data *)data_;
+
+  (void)S;
+  (void)sn; // these should be the identity
+  (void)dV0;
+  (void)dV1; // grid_volume weighting is included in data->amp
+  (void)shift;
+
+  sourcedata &sd = (*data->data)[ichunk];
+  std::map<ptrdiff_t, size_t> &pos = (*data->pos)[ichunk];
+  sd.near_fd_comp = c;
+  sd.fc_idx = ichunk;
+
+  complex<double> amp = data->amp * conj(shift_phase);
+  direction cd = component_direction(c);
+
+  LOOP_OVER_IVECS(fc->gv, is, ie, idx) {
+    IVEC_LOOP_ILOC(fc->gv, iloc);
+    if (!fc->gv.owns(iloc)) continue;
+
+    complex<double> w = IVEC_LOOP_WEIGHT(s0, s1, e0, e1, 1) * amp;
+    if (is_D(c)) w /= fc->s->chi1inv_at(component(c - Dx + Ex), cd, idx);
+    if (is_B(c)) w /= fc->s->chi1inv_at(component(c - Bx + Hx), cd, idx);
+
+    std::map<ptrdiff_t, size_t>::iterator it = pos.find(idx);
+    size_t ipos;
+    if (it == pos.end()) {
+      ipos = sd.idx_arr.size();
+      pos[idx] = ipos;
+      sd.idx_arr.push_back(idx);
+      sd.amp_arr.resize(sd.amp_arr.size() + data->namps, 0.0);
+    }
+    else
+      ipos = it->second;
+    for (size_t j = 0; j < data->namps; ++j)
+      sd.amp_arr[ipos * data->namps + j] += w * data->amps[j];
+  }
+}
+
+/* Returns the source data (for add_srcdata) of point sources of component c located at the
+   npts points (pt_list[3*i], pt_list[3*i+1], pt_list[3*i+2]), merged into one sourcedata per
+   local chunk.  Each point has namps amplitudes amp_list[i*namps + j], and the amp_arr of
+   each returned sourcedata is an idx_arr.size() x namps array (row-major), so that
+   add_srcdata with column j of amp_arr is equivalent to add_point_source at every point
+   with the amplitudes amp_list[i*namps + j], but with a single src_vol per chunk. */
+std::vector<sourcedata> fields::point_sourcedata(component c, double *pt_list, size_t npts,
+                                                 std::complex<double> *amp_list, size_t namps) {
+  std::vector<sourcedata> data(num_chunks);
+  std::vector<std::map<ptrdiff_t, size_t> > pos(num_chunks);
+
+  point_sourcedata_chunkloop_data cdata;
+  cdata.amp = 1.0;
+  LOOP_OVER_DIRECTIONS(gv.dim, d) {
+    if (!nosize_direction(d)) cdata.amp *= gv.a; // correct units for J delta-function amplitude
+  }
+  cdata.namps = namps;
+  cdata.data = &data;
+  cdata.pos = &pos;
+
+  for (size_t i = 0; i < npts; ++i) {
+    const double *x = pt_list + 3 * i;
+    vec p;
+    switch (gv.dim) {
+      case D1: p = vec(x[2]); break;
+      case D2: p = vec(x[0], x[1]); break;
+      case D3: p = vec(x[0], x[1], x[2]); break;
+      case Dcyl: p = veccyl(x[0], x[2]); break;
+    }
+    cdata.amps = amp_list + i * namps;
+    loop_in_chunks(point_sourcedata_chunkloop, (void *)&cdata, volume(p, p), c, false);
+  }
+
+  std::vector<sourcedata> result;
+  for (int i = 0; i < num_chunks; ++i)
+    if (!data[i].idx_arr.empty()) result.push_back(data[i]);
+  return result;
+}
+
 static double *amp_func_data_re = NULL;
 static double *amp_func_data_im = NULL;
 static const volume *amp_func_vol = NULL;
@@ -16,6 +16,9 @@
 */
 
 #include <array>
+#include <limits>
+#include <stdint.h>
+#include <string.h>
 #include <map>
 #include <stdio.h>
 #include <stdlib.h>
@@ -26,6 +29,10 @@
 
 #include "config.h"
 
+#ifdef HAVE_OPENMP
+#include <omp.h>
+#endif
+
 #define RESTRICT
 
 using namespace std;
@@ -88,6 +95,8 @@ void fields::step() {
   if (fluxes) fluxes->update();
   t += 1;
   update_dfts();
+  for (field_probes *p = probes; p; p = p->next)
+    p->sample();
   finished_working();
 
   // re-synch magnetic fields if they were previously synchronized
@@ -98,8 +107,103 @@ void fields::step() {
 
   changed_materials = false; // any material changes were handled in connect_chunks()
 
-  if (!std::isfinite(get_field(D_EnergyDensity, gv.center(), false)))
-    meep::abort("simulation fields are NaN or Inf");
+  if (divergence_check_interval > 0 && t % divergence_check_interval == 0) check_divergence();
+}
+
+/* Take n timesteps, e.g. between two calls of (Python) step functions.
+   Synchronized magnetic fields are only restored and re-synchronized once,
+   rather than for every step. */
+void fields::step_n(int n) {
+  if (n < 0) meep::abort("step_n: invalid number of steps %d", n);
+  if (n == 0) return;
+  int save_synchronized_magnetic_fields = synchronized_magnetic_fields;
+  if (synchronized_magnetic_fields) {
+    synchronized_magnetic_fields = 1; // reset synchronization count
+    restore_magnetic_fields();
+  }
+  for (int i = 0; i < n; ++i)
+    step();
+  if (save_synchronized_magnetic_fields) {
+    synchronize_magnetic_fields();
+    synchronized_magnetic_fields = save_synchronized_magnetic_fields;
+  }
+}
+
+/* Check whether all of x[0..n-1] are finite, i.e. don't have an all-ones
+   exponent.  This only uses integer operations (on a copy of the bits),
+   so that the loop vectorizes, unlike a loop over std::isfinite. */
+template <typename T, typename U> static bool all_finite_bits(const T *x, size_t n, U expmask) {
+  U bad = 0;
+  for (size_t i = 0; i < n; ++i) {
+    U u;
+    memcpy(&u, x + i, sizeof(U));
+    bad |= U((u & expmask) == expmask);
+  }
+  return !bad;
+}
+static bool all_finite(const double *x, size_t n) {
+  return all_finite_bits(x, n, uint64_t(0x7ff0000000000000ULL));
+}
+static bool all_finite(const float *x, size_t n) {
+  return all_finite_bits(x, n, uint32_t(0x7f800000U));
+}
+
+/* Return the index of the first NaN or Inf value in the D or B fields of this
+   chunk (setting c to its component), or -1 if all the values are finite.
+   (It suffices to check D and B since all the other fields are computed
+   from these, so any divergence will show up here within a timestep.) */
+ptrdiff_t fields_chunk::first_nonfinite(component &c) const {
+  FOR_D_AND_B(cc) {
+    for (int cmp = 0; cmp < 2; ++cmp) {
+      const realnum *fc = f[cc][cmp];
+      if (!fc) continue;
+      const size_t n = gv.ntot();
+      if (!all_finite(fc, n))
+        for (size_t i = 0; i < n; ++i)
+          if (!std::isfinite(fc[i])) {
+            c = cc;
+            return i;
+          }
+    }
+  }
+  return -1;
+}
+
+/* Abort if any of the fields are NaN or Inf, reporting the chunk and
+   position of a bad value.  Each process only scans its own chunks, followed
+   by a single reduction, so this is cheap compared to a timestep. */
+void fields::check_divergence() {
+  int bad_chunk = -1;
+  char msg[256] = "";
+  for (int i = 0; i < num_chunks && bad_chunk < 0; i++)
+    if (chunks[i]->is_mine()) {
+      component c;
+      ptrdiff_t idx = chunks[i]->first_nonfinite(c);
+      if (idx >= 0) {
+        bad_chunk = i;
+        snprintf(msg, sizeof(msg), "%s at %s in chunk %d", component_name(c),
+                 chunks[i]->gv.loc(c, idx).str(), i);
+      }
+    }
+  am_now_working_on(MpiAllTime);
+  bad_chunk = max_to_all(bad_chunk);
+  finished_working();
+  if (bad_chunk >= 0) {
+    broadcast(chunks[bad_chunk]->n_proc(), msg, sizeof(msg));
+    meep::abort("simulation fields are NaN or Inf (%s, time %g)", msg, time());
+  }
+}
+
+/* The number of OpenMP threads for the loops over the chunks of this process in
+   step(), which update each chunk independently (the chunks only communicate in
+   step_boundaries). Splitting the cell into more chunks than processes
+   gives the threads more work to share. */
+int fields::chunk_threads() const {
+#ifdef HAVE_OPENMP
+  return num_threads > 0 ? num_threads : omp_get_max_threads();
+#else
+  return 1;
+#endif
 }
 
 void fields::phase_material() {
@@ -252,6 +356,9 @@ void fields::step_boundaries(field_type ft) {
 
 void fields::step_source(field_type ft, bool including_integrated) {
   if (ft != D_stuff && ft != B_stuff) meep::abort("only step_source(D/B) is okay");
+#ifdef HAVE_OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(chunk_threads())
+#endif
   for (int i = 0; i < num_chunks; i++)
     if (chunks[i]->is_mine()) chunks[i]->step_source(ft, including_integrated);
 }
@@ -23,6 +23,7 @@
 
 #include "meep.hpp"
 #include "meep_internals.hpp"
+#include "config.h"
 
 #define RESTRICT
 
@@ -31,12 +32,17 @@ using namespace std;
 namespace meep {
 
 void fields::step_db(field_type ft) {
+  bool allocated = false;
+#ifdef HAVE_OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(chunk_threads()) reduction(|| : allocated)
+#endif
   for (int i = 0; i < num_chunks; i++)
     if (chunks[i]->is_mine())
-      if (chunks[i]->step_db(ft)) {
-       chunk_connections_valid = false;
-       assert(changed_materials);
-      }
+      if (chunks[i]->step_db(ft)) allocated = true;
+  if (allocated) {
+    chunk_connections_valid = false;
+    assert(changed_materials);
+  }
 }
 
 bool fields_chunk::step_db(field_type ft) {
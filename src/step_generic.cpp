@@ -353,6 +353,9 @@ inline realnum calc_nonlinear_u(const realnum Dsqr, const realnum Di, const real
    Here, g = (g,g1,g2) where g1 and g2 are the off-diagonal
    components, if any (g2 may be NULL).
 
+   If u is NULL, the (diagonal) u is the constant u0, which is 1
+   except in homogeneous chunks whose u array was compressed away.
+
    In PML (dsigw != NO_DIR), we have an additional auxiliary field fw,
    which is updated by the equations:
           fw = u * g
@@ -362,10 +365,11 @@ inline realnum calc_nonlinear_u(const realnum Dsqr, const realnum Di, const real
 
 */
 
-void step_update_EDHB(RPR f, component fc, const grid_volume &gv, const ivec is, const ivec ie, const RPR g, const RPR g1,
-                      const RPR g2, const RPR u, const RPR u1, const RPR u2, ptrdiff_t s,
-                      ptrdiff_t s1, ptrdiff_t s2, const RPR chi2, const RPR chi3, RPR fw,
-                      direction dsigw, const RPR sigw, const RPR kapw) {
+void step_update_EDHB(RPR f, component fc, const grid_volume &gv, const ivec is, const ivec ie,
+                      const RPR g, const RPR g1, const RPR g2, const RPR u, const RPR u1,
+                      const RPR u2, realnum u0, ptrdiff_t s, ptrdiff_t s1, ptrdiff_t s2,
+                      const RPR chi2, const RPR chi3, RPR fw, direction dsigw, const RPR sigw,
+                      const RPR kapw) {
   if (!f) return;
 
   if ((!g1 && g2) || (g1 && g2 && !u1 && u2)) { /* swap g1 and g2 */
@@ -489,6 +493,14 @@ void step_update_EDHB(RPR f, component fc, const grid_volume &gv, const ivec is,
           f[i] += (kapwkw + sigwkw) * fw[i] - (kapwkw - sigwkw) * fwprev;
         }
       }
+      else if (u0 != 1) {
+        LOOP_OVER_IVECS(gv, is, ie, i) {
+          DEF_kw;
+          realnum fwprev = fw[i], kapwkw = kapw[kw], sigwkw = sigw[kw];
+          fw[i] = g[i] * u0;
+          f[i] += (kapwkw + sigwkw) * fw[i] - (kapwkw - sigwkw) * fwprev;
+        }
+      }
       else {
         LOOP_OVER_IVECS(gv, is, ie, i) {
           DEF_kw;
@@ -580,6 +592,8 @@ void step_update_EDHB(RPR f, component fc, const grid_volume &gv, const ivec is,
           f[i] = (gs * us);
         }
       }
+      else if (u0 != 1)
+        LOOP_OVER_IVECS(gv, is, ie, i) { f[i] = g[i] * u0; }
       else
         LOOP_OVER_IVECS(gv, is, ie, i) { f[i] = g[i]; }
     }
@@ -35,11 +35,12 @@ typedef structure_chunk *structure_chunk_ptr;
 
 structure::structure(const grid_volume &thegv, material_function &eps, const boundary_region &br,
                      const symmetry &s, int num, double Courant, bool use_anisotropic_averaging,
-                     double tol, int maxeval, const binary_partition *_bp)
+                     double tol, int maxeval, const binary_partition *_bp, int num_threads)
     : Courant(Courant), v(D1) // Aaack, this is very hokey.
 {
   outdir = ".";
   shared_chunks = false;
+  this->num_threads = num_threads;
   if (!br.check_ok(thegv)) meep::abort("invalid boundary absorbers for this grid_volume");
   double tstart = wall_time();
   choose_chunkdivision(thegv, num, br, s, _bp);
@@ -49,11 +50,12 @@ structure::structure(const grid_volume &thegv, material_function &eps, const bou
 
 structure::structure(const grid_volume &thegv, double eps(const vec &), const boundary_region &br,
                      const symmetry &s, int num, double Courant, bool use_anisotropic_averaging,
-                     double tol, int maxeval, const binary_partition *_bp)
+                     double tol, int maxeval, const binary_partition *_bp, int num_threads)
     : Courant(Courant), v(D1) // Aaack, this is very hokey.
 {
   outdir = ".";
   shared_chunks = false;
+  this->num_threads = num_threads;
   if (!br.check_ok(thegv)) meep::abort("invalid boundary absorbers for this grid_volume");
   double tstart = wall_time();
   choose_chunkdivision(thegv, num, br, s, _bp);
@@ -64,10 +66,26 @@ structure::structure(const grid_volume &thegv, double eps(const vec &), const bo
   }
 }
 
-static std::unique_ptr<binary_partition> split_by_cost(int n, grid_volume gvol,
-                                                       bool fragment_cost, int &proc_id) {
-  if (n == 1) return std::unique_ptr<binary_partition>(new binary_partition(proc_id++
-                                                                            % count_processors()));
+/* The number of chunks for which each process gets consecutive chunks (in depth-first
+   order) rather than round-robin ones, or 0 for round-robin.  This is only done if the
+   chunks of each process are timestepped by several threads and there are more chunks
+   than processes: consecutive chunks tend to be adjacent, so that most of the chunk
+   boundaries are within a process rather than communicated via MPI. */
+static int consecutive_chunks(int num_chunks, int num_threads) {
+  return num_threads != 1 && with_openmp() && num_chunks > count_processors() ? num_chunks : 0;
+}
+
+/* The process of the i-th chunk in depth-first order (see consecutive_chunks). */
+static int chunk_process(int i, int num_consecutive) {
+  const int nprocs = count_processors();
+  return num_consecutive ? int((long long)i * nprocs / num_consecutive) : i % nprocs;
+}
+
+static std::unique_ptr<binary_partition> split_by_cost(int n, grid_volume gvol, bool fragment_cost,
+                                                       int &proc_id, int num_consecutive) {
+  if (n == 1)
+    return std::unique_ptr<binary_partition>(
+        new binary_partition(chunk_process(proc_id++, num_consecutive)));
 
   int best_split_point;
   direction best_split_direction;
@@ -88,10 +106,10 @@ static std::unique_ptr<binary_partition> split_by_cost(int n, grid_volume gvol,
   split_plane optimal_plane{best_split_direction, best_split_position};
   grid_volume left_gvol = gvol.split_at_fraction(false, best_split_point, best_split_direction);
   grid_volume right_gvol = gvol.split_at_fraction(true, best_split_point, best_split_direction);
-  return std::unique_ptr<binary_partition>(
-      new binary_partition(optimal_plane,
-                           /*left=*/split_by_cost(num_left, left_gvol, fragment_cost, proc_id),
-                           /*right=*/split_by_cost(n - num_left, right_gvol, fragment_cost, proc_id)));
+  return std::unique_ptr<binary_partition>(new binary_partition(
+      optimal_plane,
+      /*left=*/split_by_cost(num_left, left_gvol, fragment_cost, proc_id, num_consecutive),
+      /*right=*/split_by_cost(n - num_left, right_gvol, fragment_cost, proc_id, num_consecutive)));
 }
 
 void structure::choose_chunkdivision(const grid_volume &thegv, int desired_num_chunks,
@@ -110,7 +128,7 @@ void structure::choose_chunkdivision(const grid_volume &thegv, int desired_num_c
   if (_bp) {
     bp.reset(new binary_partition(*_bp));
   } else {
-    bp = meep::choose_chunkdivision(gv, v, desired_num_chunks, s);
+    bp = meep::choose_chunkdivision(gv, v, desired_num_chunks, s, num_threads);
   }
 
   // create the chunks:
@@ -153,7 +171,8 @@ void structure::choose_chunkdivision(const grid_volume &thegv, int desired_num_c
 }
 
 std::unique_ptr<binary_partition> choose_chunkdivision(grid_volume &gv, volume &v,
-                                                       int desired_num_chunks, const symmetry &S) {
+                                                       int desired_num_chunks, const symmetry &S,
+                                                       int num_threads) {
 
   if (desired_num_chunks == 0) desired_num_chunks = count_processors();
   if (gv.dim == Dcyl && gv.get_origin().r() < 0) meep::abort("r < 0 origins are not supported");
@@ -191,16 +210,17 @@ std::unique_ptr<binary_partition> choose_chunkdivision(grid_volume &gv, volume &
   }
 
   int proc_id = 0;
+  const int num_consecutive = consecutive_chunks(desired_num_chunks, num_threads);
   if (meep_geom::fragment_stats::resolution == 0 ||
       meep_geom::fragment_stats::split_chunks_evenly) {
     if (verbosity > 0 && desired_num_chunks > 1)
       master_printf("Splitting into %d chunks by voxels\n", desired_num_chunks);
-    return split_by_cost(desired_num_chunks, gv, false, proc_id);
+    return split_by_cost(desired_num_chunks, gv, false, proc_id, num_consecutive);
   }
   else {
     if (verbosity > 0 && desired_num_chunks > 1)
       master_printf("Splitting into %d chunks by cost\n", desired_num_chunks);
-    return split_by_cost(desired_num_chunks, gv, true, proc_id);
+    return split_by_cost(desired_num_chunks, gv, true, proc_id, num_consecutive);
   }
 }
 
@@ -339,9 +359,9 @@ void structure::add_to_effort_volumes(const grid_volume &new_effort_volume, doub
 }
 
 structure::structure(const structure &s)
-    : num_chunks{s.num_chunks}, shared_chunks{false}, gv(s.gv),
-      user_volume(s.user_volume), a{s.a}, Courant{s.Courant}, dt{s.dt}, v(s.v), S(s.S),
-      outdir(s.outdir), num_effort_volumes{s.num_effort_volumes},
+    : num_chunks{s.num_chunks}, shared_chunks{false}, gv(s.gv), user_volume(s.user_volume), a{s.a},
+      Courant{s.Courant}, dt{s.dt}, v(s.v), S(s.S), outdir(s.outdir),
+      num_effort_volumes{s.num_effort_volumes}, num_threads{s.num_threads},
       bp(new binary_partition(*s.bp)) {
   chunks = new structure_chunk_ptr[num_chunks];
   for (int i = 0; i < num_chunks; i++) {
@@ -393,12 +413,62 @@ void structure::set_materials(material_function &mat, bool use_anisotropic_avera
   }
 }
 
+/* Like set_materials, but only recomputes chi1inv (including the subpixel averaging) at the
+   pixels near the volume where (and its symmetry images), e.g. after the weights of a
+   MaterialGrid covering where have changed.  Chunks that do not intersect where are left
+   untouched; the (inexpensive) conductivities and nonlinearities are recomputed in the
+   remaining chunks.  The susceptibilities are not updated. */
+void structure::update_materials(material_function &mat, const volume &where_,
+                                 bool use_anisotropic_averaging, double tol, int maxeval) {
+  double tstart = wall_time();
+  if (gv.dim != where_.dim) meep::abort("incorrect dimensionality in update_materials");
+
+  // pad by two pixels, which includes all pixels whose averaging cell touches where
+  volume where(where_);
+  LOOP_OVER_DIRECTIONS(gv.dim, d) {
+    where.set_direction_min(d, where.in_direction_min(d) - 2 * gv.inva);
+    where.set_direction_max(d, where.in_direction_max(d) + 2 * gv.inva);
+  }
+  std::vector<volume> wheres;
+  for (int sn = 0; sn < S.multiplicity(); ++sn)
+    wheres.push_back(S.transform(where, sn));
+
+  changing_chunks();
+  for (int i = 0; i < num_chunks; i++) {
+    if (!chunks[i]->is_mine()) continue;
+    volume v = chunks[i]->gv.pad().surroundings();
+    bool intersects = false;
+    for (size_t k = 0; k < wheres.size(); ++k)
+      intersects = intersects || v.intersects(wheres[k]);
+    if (!intersects) continue;
+
+    FOR_ELECTRIC_COMPONENTS(c) {
+      chunks[i]->set_chi1inv(c, mat, use_anisotropic_averaging, tol, maxeval, &wheres, num_threads);
+    }
+    if (mat.has_mu()) FOR_MAGNETIC_COMPONENTS(c) {
+        chunks[i]->set_chi1inv(c, mat, use_anisotropic_averaging, tol, maxeval, &wheres,
+                               num_threads);
+      }
+    FOR_D_AND_B(c) {
+      if (mat.has_conductivity(c)) chunks[i]->set_conductivity(c, mat);
+    }
+    FOR_E_AND_H(c) {
+      if (mat.has_chi3(c)) chunks[i]->set_chi3(c, mat);
+    }
+    FOR_E_AND_H(c) {
+      if (mat.has_chi2(c)) chunks[i]->set_chi2(c, mat);
+    }
+  }
+  all_wait(); // sync so that timing results are accurate
+  if (verbosity > 0) master_printf("time for update_materials = %g s\n", wall_time() - tstart);
+}
+
 void structure::set_chi1inv(component c, material_function &eps, bool use_anisotropic_averaging,
                             double tol, int maxeval) {
   changing_chunks();
   for (int i = 0; i < num_chunks; i++)
     if (chunks[i]->is_mine())
-      chunks[i]->set_chi1inv(c, eps, use_anisotropic_averaging, tol, maxeval);
+      chunks[i]->set_chi1inv(c, eps, use_anisotropic_averaging, tol, maxeval, NULL, num_threads);
 }
 
 void structure::set_epsilon(material_function &eps, bool use_anisotropic_averaging, double tol,
@@ -547,7 +617,7 @@ bool structure_chunk::has_chisigma(component c, direction d) const {
 }
 
 bool structure_chunk::has_chi1inv(component c, direction d) const {
-  return is_mine() && chi1inv[c][d] && !trivial_chi1inv[c][d];
+  return is_mine() && (chi1inv[c][d] || d == component_direction(c)) && !trivial_chi1inv[c][d];
 }
 
 void structure::mix_with(const structure *oth, double f) {
@@ -578,12 +648,15 @@ structure_chunk::~structure_chunk() {
 
 void structure_chunk::mix_with(const structure_chunk *n, double f) {
   FOR_COMPONENTS(c) FOR_DIRECTIONS(d) {
-    if (!chi1inv[c][d] && n->chi1inv[c][d]) {
+    const bool diag = component_direction(c) == d;
+    if (!chi1inv[c][d] &&
+        (n->chi1inv[c][d] || (diag && n->uniform_chi1inv[c] != uniform_chi1inv[c]))) {
       chi1inv[c][d] = new realnum[gv.ntot()];
-      trivial_chi1inv[c][d] = n->trivial_chi1inv[c][d];
-      if (component_direction(c) == d) // diagonal components = 1 by default
+      if (diag) { // diagonal components = 1 by default, unless compressed
         for (size_t i = 0; i < gv.ntot(); i++)
-          chi1inv[c][d][i] = 1.0;
+          chi1inv[c][d][i] = uniform_chi1inv[c];
+        uniform_chi1inv[c] = 1.0;
+      }
       else
         for (size_t i = 0; i < gv.ntot(); i++)
           chi1inv[c][d][i] = 0.0;
@@ -599,7 +672,7 @@ void structure_chunk::mix_with(const structure_chunk *n, double f) {
         for (size_t i = 0; i < gv.ntot(); i++)
           chi1inv[c][d][i] += f * (n->chi1inv[c][d][i] - chi1inv[c][d][i]);
       else {
-        double nval = component_direction(c) == d ? 1.0 : 0.0; // default
+        double nval = diag ? n->uniform_chi1inv[c] : 0.0; // default
         for (size_t i = 0; i < gv.ntot(); i++)
           chi1inv[c][d][i] += f * (nval - chi1inv[c][d][i]);
       }
@@ -703,6 +776,7 @@ void structure_chunk::update_condinv() {
 
 structure_chunk::structure_chunk(const structure_chunk *o) : v(o->v) {
   refcount = 1;
+  averaging_time = o->averaging_time;
 
   FOR_FIELD_TYPES(ft) {
     {
@@ -748,6 +822,7 @@ structure_chunk::structure_chunk(const structure_chunk *o) : v(o->v) {
     }
   }
   FOR_COMPONENTS(c) FOR_DIRECTIONS(d) { trivial_chi1inv[c][d] = true; }
+  FOR_COMPONENTS(c) { uniform_chi1inv[c] = is_mine() ? o->uniform_chi1inv[c] : 1.0; }
   FOR_COMPONENTS(c) FOR_DIRECTIONS(d) {
     if (is_mine()) {
       trivial_chi1inv[c][d] = o->trivial_chi1inv[c][d];
@@ -802,7 +877,8 @@ void structure_chunk::set_chi3(component c, material_function &epsilon) {
   if (!chi1inv[c][component_direction(c)]) { // require chi1 if we have chi3
     chi1inv[c][component_direction(c)] = new realnum[gv.ntot()];
     for (size_t i = 0; i < gv.ntot(); ++i)
-      chi1inv[c][component_direction(c)][i] = 1.0;
+      chi1inv[c][component_direction(c)][i] = uniform_chi1inv[c];
+    uniform_chi1inv[c] = 1.0;
   }
 
   if (!chi3[c]) chi3[c] = new realnum[gv.ntot()];
@@ -838,7 +914,8 @@ void structure_chunk::set_chi2(component c, material_function &epsilon) {
   if (!chi1inv[c][component_direction(c)]) { // require chi1 if we have chi2
     chi1inv[c][component_direction(c)] = new realnum[gv.ntot()];
     for (size_t i = 0; i < gv.ntot(); ++i)
-      chi1inv[c][component_direction(c)][i] = 1.0;
+      chi1inv[c][component_direction(c)][i] = uniform_chi1inv[c];
+    uniform_chi1inv[c] = 1.0;
   }
 
   if (!chi2[c]) chi2[c] = new realnum[gv.ntot()];
@@ -877,6 +954,7 @@ void structure_chunk::set_conductivity(component c, material_function &C) {
   component c_C = is_electric(c) ? direction_component(Dx, c_d)
                                  : (is_magnetic(c) ? direction_component(Bx, c_d) : c);
   realnum *multby = is_electric(c) || is_magnetic(c) ? chi1inv[c][c_d] : 0;
+  const realnum multby0 = is_electric(c) || is_magnetic(c) ? uniform_chi1inv[c] : 1.0;
   if (!conductivity[c_C][c_d]) conductivity[c_C][c_d] = new realnum[gv.ntot()];
   if (!conductivity[c_C][c_d]) meep::abort("Memory allocation error.\n");
   bool trivial = true;
@@ -891,7 +969,7 @@ void structure_chunk::set_conductivity(component c, material_function &C) {
   else {
     LOOP_OVER_VOL(gv, c_C, i) {
       IVEC_LOOP_LOC(gv, here);
-      cnd[i] = C.conductivity(c, here);
+      cnd[i] = C.conductivity(c, here) * multby0;
       trivial = trivial && (cnd[i] == 0.0);
     }
   }
@@ -908,6 +986,7 @@ structure_chunk::structure_chunk(const grid_volume &thegv, const volume &vol_lim
                                  int pr)
     : Courant(Courant), v(thegv.surroundings() & vol_limit), cost(0.0) {
   refcount = 1;
+  averaging_time = 0;
   pml_fmin = 0.2;
   FOR_FIELD_TYPES(ft) { chiP[ft] = NULL; }
   gv = thegv;
@@ -919,6 +998,7 @@ structure_chunk::structure_chunk(const grid_volume &thegv, const volume &vol_lim
   // initialize materials arrays to NULL
   FOR_COMPONENTS(c) { chi3[c] = NULL; }
   FOR_COMPONENTS(c) { chi2[c] = NULL; }
+  FOR_COMPONENTS(c) { uniform_chi1inv[c] = 1.0; }
   FOR_COMPONENTS(c) FOR_DIRECTIONS(d) {
     trivial_chi1inv[c][d] = true;
     chi1inv[c][d] = NULL;
@@ -955,10 +1035,30 @@ double structure_chunk::max_eps() const {
     if (chi1inv[c][d])
       for (size_t i = 0; i < gv.ntot(); i++)
         themax = max(themax, 1 / chi1inv[c][d][i]);
+    else if (uniform_chi1inv[c] != 1)
+      themax = max(themax, 1 / double(uniform_chi1inv[c]));
   }
   return themax;
 }
 
+size_t structure::material_storage(bool uncompressed) const {
+  size_t bytes = 0;
+  for (int i = 0; i < num_chunks; i++)
+    if (chunks[i]->is_mine()) bytes += chunks[i]->material_storage(uncompressed);
+  return sum_to_all(bytes);
+}
+
+size_t structure_chunk::material_storage(bool uncompressed) const {
+  size_t narrays = 0;
+  FOR_COMPONENTS(c) FOR_DIRECTIONS(d) {
+    if (chi1inv[c][d] || (uncompressed && d == component_direction(c) && uniform_chi1inv[c] != 1))
+      narrays++;
+    if (conductivity[c][d]) narrays++;
+    if (condinv[c][d]) narrays++;
+  }
+  return narrays * gv.ntot() * sizeof(realnum);
+}
+
 bool structure::equal_layout(const structure &s) const {
   if (a != s.a || num_chunks != s.num_chunks || v != s.v || S != s.S) return false;
   for (int i = 0; i < num_chunks; ++i)
@@ -85,49 +85,153 @@ void structure::dump_chunk_layout(const char *filename) {
   delete[] nums;
 }
 
-void structure::dump(const char *filename) {
-  if (verbosity > 0) master_printf("creating epsilon output file \"%s\"...\n", filename);
+// The arrays of the structure chunks that are dumped, indexed by component and direction
+// (chi2 and chi3 only have a single "direction").
+typedef realnum *&(*chunk_array_func)(structure_chunk *sc, int c, int d);
+static realnum *&chi1inv_array(structure_chunk *sc, int c, int d) { return sc->chi1inv[c][d]; }
+static realnum *&conductivity_array(structure_chunk *sc, int c, int d) {
+  return sc->conductivity[c][d];
+}
+static realnum *&chi2_array(structure_chunk *sc, int c, int d) {
+  (void)d;
+  return sc->chi2[c];
+}
+static realnum *&chi3_array(structure_chunk *sc, int c, int d) {
+  (void)d;
+  return sc->chi3[c];
+}
 
-  // make/save a num_chunks x NUM_FIELD_COMPONENTS x 5 array counting
-  // the number of entries in the chi1inv array for each chunk.
-  size_t *num_chi1inv_ = new size_t[num_chunks * NUM_FIELD_COMPONENTS * 5];
-  memset(num_chi1inv_, 0, sizeof(size_t) * size_t(num_chunks * NUM_FIELD_COMPONENTS * 5));
+// Write the non-NULL arrays of all chunks consecutively to the dataset dname, along with
+// a num_chunks x NUM_FIELD_COMPONENTS x ndirs array num_<dname> counting the number of
+// entries of each array (0 if NULL).
+static void dump_chunk_arrays(h5file *file, const char *dname, chunk_array_func array, int ndirs,
+                              structure_chunk **chunks, int num_chunks) {
+  const size_t narrays = size_t(num_chunks) * NUM_FIELD_COMPONENTS * ndirs;
+  size_t *num_ = new size_t[narrays];
+  memset(num_, 0, sizeof(size_t) * narrays);
   size_t my_ntot = 0;
   for (int i = 0; i < num_chunks; i++)
     if (chunks[i]->is_mine()) {
       size_t ntot = chunks[i]->gv.ntot();
       for (int c = 0; c < NUM_FIELD_COMPONENTS; ++c)
-        for (int d = 0; d < 5; ++d)
-          if (chunks[i]->chi1inv[c][d])
-            my_ntot += (num_chi1inv_[(i * NUM_FIELD_COMPONENTS + c) * 5 + d] = ntot);
+        for (int d = 0; d < ndirs; ++d)
+          if (array(chunks[i], c, d))
+            my_ntot += (num_[(i * NUM_FIELD_COMPONENTS + c) * ndirs + d] = ntot);
     }
-  size_t *num_chi1inv = new size_t[num_chunks * NUM_FIELD_COMPONENTS * 5];
-  sum_to_master(num_chi1inv_, num_chi1inv, num_chunks * NUM_FIELD_COMPONENTS * 5);
-  delete[] num_chi1inv_;
+  size_t *num = new size_t[narrays];
+  sum_to_master(num_, num, narrays);
+  delete[] num_;
 
   // determine total dataset size and offset of this process's data
   size_t my_start = partial_sum_to_all(my_ntot) - my_ntot;
   size_t ntotal = sum_to_all(my_ntot);
 
-  h5file file(filename, h5file::WRITE, true);
-  size_t dims[3] = {(size_t)num_chunks, NUM_FIELD_COMPONENTS, 5};
+  char num_dname[64];
+  snprintf(num_dname, 64, "num_%s", dname);
+  size_t dims[3] = {(size_t)num_chunks, NUM_FIELD_COMPONENTS, (size_t)ndirs};
   size_t start[3] = {0, 0, 0};
-  file.create_data("num_chi1inv", 3, dims);
-  if (am_master()) file.write_chunk(3, start, dims, num_chi1inv);
-  delete[] num_chi1inv;
+  file->create_data(num_dname, 3, dims);
+  if (am_master()) file->write_chunk(3, start, dims, num);
+  delete[] num;
 
   // write the data
-  file.create_data("chi1inv", 1, &ntotal, false /* append_data */, false /* single_precision */);
+  file->create_data(dname, 1, &ntotal, false /* append_data */, false /* single_precision */);
+  for (int i = 0; i < num_chunks; i++)
+    if (chunks[i]->is_mine()) {
+      size_t ntot = chunks[i]->gv.ntot();
+      for (int c = 0; c < NUM_FIELD_COMPONENTS; ++c)
+        for (int d = 0; d < ndirs; ++d)
+          if (array(chunks[i], c, d)) {
+            file->write_chunk(1, &my_start, &ntot, array(chunks[i], c, d));
+            my_start += ntot;
+          }
+    }
+}
+
+// Inverse of dump_chunk_arrays: (re)allocate the arrays of the chunks and read their data.
+static void load_chunk_arrays(h5file *file, const char *dname, chunk_array_func array, int ndirs,
+                              structure_chunk **chunks, int num_chunks) {
+  char num_dname[64];
+  snprintf(num_dname, 64, "num_%s", dname);
+  size_t *num = new size_t[size_t(num_chunks) * NUM_FIELD_COMPONENTS * ndirs];
+  int rank;
+  size_t dims[3], _dims[3] = {(size_t)num_chunks, NUM_FIELD_COMPONENTS, (size_t)ndirs};
+  size_t start[3] = {0, 0, 0};
+  file->read_size(num_dname, &rank, dims, 3);
+  if (rank != 3 || _dims[0] != dims[0] || _dims[1] != dims[1] || _dims[2] != dims[2])
+    meep::abort("chunk mismatch in structure::load");
+  if (am_master()) file->read_chunk(3, start, dims, num);
+
+  file->prevent_deadlock();
+  broadcast(0, num, dims[0] * dims[1] * dims[2]);
+
+  // allocate data as needed and check sizes
+  size_t my_ntot = 0;
   for (int i = 0; i < num_chunks; i++)
     if (chunks[i]->is_mine()) {
       size_t ntot = chunks[i]->gv.ntot();
       for (int c = 0; c < NUM_FIELD_COMPONENTS; ++c)
-        for (int d = 0; d < 5; ++d)
-          if (chunks[i]->chi1inv[c][d]) {
-            file.write_chunk(1, &my_start, &ntot, chunks[i]->chi1inv[c][d]);
+        for (int d = 0; d < ndirs; ++d) {
+          size_t n = num[(i * NUM_FIELD_COMPONENTS + c) * ndirs + d];
+          realnum *&data = array(chunks[i], c, d);
+          delete[] data;
+          data = NULL;
+          if (n != 0) {
+            if (n != ntot) meep::abort("grid size mismatch %zd vs %zd in structure::load", n, ntot);
+            data = new realnum[ntot];
+            my_ntot += ntot;
+          }
+        }
+    }
+  delete[] num;
+
+  // determine total dataset size and offset of this process's data
+  size_t my_start = partial_sum_to_all(my_ntot) - my_ntot;
+  size_t ntotal = sum_to_all(my_ntot);
+
+  // read the data
+  file->read_size(dname, &rank, dims, 1);
+  if (rank != 1 || dims[0] != ntotal) meep::abort("inconsistent data size in structure::load");
+  for (int i = 0; i < num_chunks; i++)
+    if (chunks[i]->is_mine()) {
+      size_t ntot = chunks[i]->gv.ntot();
+      for (int c = 0; c < NUM_FIELD_COMPONENTS; ++c)
+        for (int d = 0; d < ndirs; ++d)
+          if (array(chunks[i], c, d)) {
+            file->read_chunk(1, &my_start, &ntot, array(chunks[i], c, d));
             my_start += ntot;
           }
     }
+}
+
+void structure::dump(const char *filename) {
+  if (verbosity > 0) master_printf("creating epsilon output file \"%s\"...\n", filename);
+
+  h5file file(filename, h5file::WRITE, true);
+  dump_chunk_arrays(&file, "chi1inv", chi1inv_array, 5, chunks, num_chunks);
+  dump_chunk_arrays(&file, "conductivity", conductivity_array, 5, chunks, num_chunks);
+  dump_chunk_arrays(&file, "chi2", chi2_array, 1, chunks, num_chunks);
+  dump_chunk_arrays(&file, "chi3", chi3_array, 1, chunks, num_chunks);
+
+  // the values of the compressed (homogeneous) diagonal chi1inv arrays
+  {
+    const size_t n = size_t(num_chunks) * NUM_FIELD_COMPONENTS;
+    double *uniform_ = new double[n];
+    memset(uniform_, 0, sizeof(double) * n);
+    for (int i = 0; i < num_chunks; i++)
+      for (int c = 0; c < NUM_FIELD_COMPONENTS; ++c)
+        if (chunks[i]->is_mine())
+          uniform_[i * NUM_FIELD_COMPONENTS + c] = chunks[i]->uniform_chi1inv[c];
+    double *uniform = new double[n];
+    sum_to_master(uniform_, uniform, n);
+    delete[] uniform_;
+    size_t dims[2] = {(size_t)num_chunks, NUM_FIELD_COMPONENTS};
+    size_t start[2] = {0, 0};
+    file.create_data("uniform_chi1inv", 2, dims, false /* append_data */,
+                     false /* single_precision */);
+    if (am_master()) file.write_chunk(2, start, dims, uniform);
+    delete[] uniform;
+  }
 
   // Get the sizes of susceptibility lists for chiP[E_stuff] and chiP[H_stuff]
   // Since this info is copied to each chunk, we can just get it from the first chunk
@@ -547,59 +651,45 @@ void structure::load(const char *filename) {
 
   if (verbosity > 0) master_printf("reading epsilon from file \"%s\"...\n", filename);
 
-  // make/save a num_chunks x NUM_FIELD_COMPONENTS x 5 array counting
-  // the number of entries in the chi1inv array for each chunk.
-  size_t *num_chi1inv = new size_t[num_chunks * NUM_FIELD_COMPONENTS * 5];
-  int rank;
-  size_t dims[3], _dims[3] = {(size_t)num_chunks, NUM_FIELD_COMPONENTS, 5};
-  size_t start[3] = {0, 0, 0};
-  file.read_size("num_chi1inv", &rank, dims, 3);
-  if (rank != 3 || _dims[0] != dims[0] || _dims[1] != dims[1] || _dims[2] != dims[2])
-    meep::abort("chunk mismatch in structure::load");
-  if (am_master()) file.read_chunk(3, start, dims, num_chi1inv);
-
-  file.prevent_deadlock();
-  broadcast(0, num_chi1inv, dims[0] * dims[1] * dims[2]);
-
   changing_chunks();
 
-  // allocate data as needed and check sizes
-  size_t my_ntot = 0;
+  load_chunk_arrays(&file, "chi1inv", chi1inv_array, 5, chunks, num_chunks);
   for (int i = 0; i < num_chunks; i++)
-    if (chunks[i]->is_mine()) {
-      size_t ntot = chunks[i]->gv.ntot();
+    FOR_COMPONENTS(c) { chunks[i]->uniform_chi1inv[c] = 1.0; }
+  if (file.dataset_exists("uniform_chi1inv")) {
+    const size_t n = size_t(num_chunks) * NUM_FIELD_COMPONENTS;
+    double *uniform = new double[n];
+    int rank;
+    size_t dims[2], start[2] = {0, 0};
+    file.read_size("uniform_chi1inv", &rank, dims, 2);
+    if (rank != 2 || dims[0] * dims[1] != n) meep::abort("chunk mismatch in structure::load");
+    if (am_master()) file.read_chunk(2, start, dims, uniform);
+    file.prevent_deadlock();
+    broadcast(0, uniform, n);
+    for (int i = 0; i < num_chunks; i++)
       for (int c = 0; c < NUM_FIELD_COMPONENTS; ++c)
-        for (int d = 0; d < 5; ++d) {
-          size_t n = num_chi1inv[(i * NUM_FIELD_COMPONENTS + c) * 5 + d];
-          if (n == 0) {
-            delete[] chunks[i]->chi1inv[c][d];
-            chunks[i]->chi1inv[c][d] = NULL;
-          }
-          else {
-            if (n != ntot) meep::abort("grid size mismatch %zd vs %zd in structure::load", n, ntot);
-            chunks[i]->chi1inv[c][d] = new realnum[ntot];
-            my_ntot += ntot;
-          }
-        }
+        if (chunks[i]->is_mine())
+          chunks[i]->uniform_chi1inv[c] = uniform[i * NUM_FIELD_COMPONENTS + c];
+    delete[] uniform;
+  }
+  for (int i = 0; i < num_chunks; i++)
+    FOR_COMPONENTS(c) FOR_DIRECTIONS(d) {
+      chunks[i]->trivial_chi1inv[c][d] =
+          !chunks[i]->chi1inv[c][d] &&
+          (d != component_direction(c) || chunks[i]->uniform_chi1inv[c] == 1);
     }
 
-  // determine total dataset size and offset of this process's data
-  size_t my_start = partial_sum_to_all(my_ntot) - my_ntot;
-  size_t ntotal = sum_to_all(my_ntot);
+  // older files only contain chi1inv and the susceptibilities
+  if (file.dataset_exists("num_conductivity")) {
+    load_chunk_arrays(&file, "conductivity", conductivity_array, 5, chunks, num_chunks);
+    for (int i = 0; i < num_chunks; i++)
+      chunks[i]->condinv_stale = true;
+  }
+  if (file.dataset_exists("num_chi2")) {
+    load_chunk_arrays(&file, "chi2", chi2_array, 1, chunks, num_chunks);
+    load_chunk_arrays(&file, "chi3", chi3_array, 1, chunks, num_chunks);
+  }
 
-  // read the data
-  file.read_size("chi1inv", &rank, dims, 1);
-  if (rank != 1 || dims[0] != ntotal) meep::abort("inconsistent data size in structure::load");
-  for (int i = 0; i < num_chunks; i++)
-    if (chunks[i]->is_mine()) {
-      size_t ntot = chunks[i]->gv.ntot();
-      for (int c = 0; c < NUM_FIELD_COMPONENTS; ++c)
-        for (int d = 0; d < 5; ++d)
-          if (chunks[i]->chi1inv[c][d]) {
-            file.read_chunk(1, &my_start, &ntot, chunks[i]->chi1inv[c][d]);
-            my_start += ntot;
-          }
-    }
   // Create susceptibilites from params datasets
   set_chiP_from_file(&file, "E_params", E_stuff);
   set_chiP_from_file(&file, "H_params", H_stuff);
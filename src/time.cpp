@@ -51,7 +51,17 @@ void fields::reset_timers() {
   am_now_working_on(Other);
 }
 
+/* The subpixel averaging is done by the structure, typically before the
+   fields are created, so its time is accumulated by the structure chunks
+   rather than via am_now_working_on. */
+void fields::update_averaging_time() {
+  times_spent[SubpixelAveraging] = 0;
+  for (int i = 0; i < num_chunks; i++)
+    if (chunks[i]->is_mine()) times_spent[SubpixelAveraging] += chunks[i]->s->averaging_time;
+}
+
 std::vector<double> fields::time_spent_on(time_sink s) {
+  update_averaging_time();
   int n = count_processors();
   std::vector<double> time_spent_per_process(n), temp(n);
   for (int j = 0; j < n; ++j)
@@ -62,6 +72,7 @@ std::vector<double> fields::time_spent_on(time_sink s) {
 }
 
 double fields::mean_time_spent_on(time_sink s) {
+  update_averaging_time();
   int n = count_processors();
   double total_time_spent = sum_to_all(times_spent[s]);
   return total_time_spent / n;
@@ -78,6 +89,7 @@ static const char *ts2n(time_sink s) {
     case FourierTransforming: return "Fourier transforming";
     case MPBTime: return "MPB mode solver";
     case GetFarfieldsTime: return "far-field transform";
+    case SubpixelAveraging: return "subpixel averaging";
     case Other: break;
   }
   return "everything else";
@@ -95,6 +107,7 @@ static void pt(double mean[], double stddev[], time_sink s) {
 void fields::print_times() {
   double mean[Other + 1], square_times[Other + 1], stddev[Other + 1];
   int n = count_processors();
+  update_averaging_time();
 
   for (int i = 0; i <= Other; ++i)
     square_times[i] = times_spent[i] * times_spent[i];
@@ -136,6 +149,7 @@ void fields::output_times(const char *fname) {
   if (verbosity > 0) master_printf("outputting timing statistics to file \"%s\"...\n", fname);
   FILE *tf = master_fopen(fname, "w");
   if (!tf) meep::abort("Unable to create file %s!\n", fname);
+  update_averaging_time();
 
   int n = count_processors();
   double *alltimes_tmp = new double[n * (Other + 1)];
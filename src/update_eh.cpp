@@ -20,6 +20,7 @@
 
 #include "meep.hpp"
 #include "meep_internals.hpp"
+#include "config.h"
 
 using namespace std;
 
@@ -27,12 +28,17 @@ namespace meep {
 
 void fields::update_eh(field_type ft, bool skip_w_components) {
   if (ft != E_stuff && ft != H_stuff) meep::abort("update_eh only works with E/H");
+  bool allocated = false;
+#ifdef HAVE_OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(chunk_threads()) reduction(|| : allocated)
+#endif
   for (int i = 0; i < num_chunks; i++)
     if (chunks[i]->is_mine())
-      if (chunks[i]->update_eh(ft, skip_w_components)) {
-        chunk_connections_valid = false; // E/H allocated - reconnect chunks
-        assert(changed_materials);
-      }
+      if (chunks[i]->update_eh(ft, skip_w_components)) allocated = true;
+  if (allocated) {
+    chunk_connections_valid = false; // E/H allocated - reconnect chunks
+    assert(changed_materials);
+  }
 }
 
 bool fields_chunk::needs_W_prev(component c) const {
@@ -140,8 +146,8 @@ bool fields_chunk::update_eh(field_type ft, bool skip_w_components) {
       direction dsigw = s->sigsize[dsigw0] > 1 ? dsigw0 : NO_DIRECTION;
 
       // lazily allocate any E/H fields that are needed (H==B initially)
-      if (f[ec][cmp] == f[dc][cmp] &&
-          (s->chi1inv[ec][d_ec] || have_f_minus_p || dsigw != NO_DIRECTION)) {
+      if (f[ec][cmp] == f[dc][cmp] && (s->chi1inv[ec][d_ec] || s->uniform_chi1inv[ec] != 1 ||
+                                       have_f_minus_p || dsigw != NO_DIRECTION)) {
         f[ec][cmp] = new realnum[gv.ntot()];
         memcpy(f[ec][cmp], f[dc][cmp], gv.ntot() * sizeof(realnum));
         allocated_eh = true;
@@ -166,10 +172,11 @@ bool fields_chunk::update_eh(field_type ft, bool skip_w_components) {
 
       if (f[ec][cmp] != f[dc][cmp])
         STEP_UPDATE_EDHB(f[ec][cmp], ec, gv, gv.little_owned_corner(ec), gv.big_corner(),
-                         dmp[dc][cmp], dmp[dc_1][cmp], dmp[dc_2][cmp],
-                         s->chi1inv[ec][d_ec], dmp[dc_1][cmp] ? s->chi1inv[ec][d_1] : NULL,
-                         dmp[dc_2][cmp] ? s->chi1inv[ec][d_2] : NULL, s_ec, s_1, s_2, s->chi2[ec],
-                         s->chi3[ec], f_w[ec][cmp], dsigw, s->sig[dsigw], s->kap[dsigw]);
+                         dmp[dc][cmp], dmp[dc_1][cmp], dmp[dc_2][cmp], s->chi1inv[ec][d_ec],
+                         dmp[dc_1][cmp] ? s->chi1inv[ec][d_1] : NULL,
+                         dmp[dc_2][cmp] ? s->chi1inv[ec][d_2] : NULL, s->uniform_chi1inv[ec], s_ec,
+                         s_1, s_2, s->chi2[ec], s->chi3[ec], f_w[ec][cmp], dsigw, s->sig[dsigw],
+                         s->kap[dsigw]);
     }
   }
 
@@ -196,7 +203,7 @@ bool fields_chunk::update_eh(field_type ft, bool skip_w_components) {
         else
           for (int iZ = 0; iZ < nZ; iZ++) {
             const int i = yee_idx + iZ - sR;
-            E[i] = D[i];
+            E[i] = s->uniform_chi1inv[ec] * D[i];
           }
       }
     }
@@ -29,12 +29,17 @@ using namespace std;
 namespace meep {
 
 void fields::update_pols(field_type ft) {
+  bool allocated = false;
+#ifdef HAVE_OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(chunk_threads()) reduction(|| : allocated)
+#endif
   for (int i = 0; i < num_chunks; i++)
     if (chunks[i]->is_mine())
-      if (chunks[i]->update_pols(ft)) {
-        chunk_connections_valid = false;
-        assert(changed_materials);
-      }
+      if (chunks[i]->update_pols(ft)) allocated = true;
+  if (allocated) {
+    chunk_connections_valid = false;
+    assert(changed_materials);
+  }
 }
 
 bool fields_chunk::update_pols(field_type ft) {
@@ -207,6 +207,39 @@ bench bench_2d_te_nonlinear(const double xmax, const double ymax, double eps(con
   return b;
 }
 
+/* DFT benchmark: per-step cost of accumulating the DFT of Ez over the
+   whole cell at nfreq frequencies, using either the direct kernel or the
+   tiled phase-recurrence kernel; the sum of |dft|^2 is returned in *dftsum
+   so that the two kernels can be checked against each other. */
+bench bench_2d_dft(const double xmax, const double ymax, int nfreq, bool phase_recurrence,
+                   double *dftsum) {
+  const double a = 10.0;
+  const double gridpts = a * a * xmax * ymax;
+  const double ttot = 20.0;
+
+  grid_volume gv = voltwo(xmax, ymax, a);
+  structure s(gv, one);
+  fields f(&s);
+  f.add_point_source(Ez, 0.8, 0.6, 0.0, 4.0, vec(0.401, 0.301));
+  component c = Ez;
+  dft_fields dft =
+      f.add_dft_fields(&c, 1, gv.surroundings(), 0.5, 1.1, nfreq, true, phase_recurrence);
+
+  double start = wall_time();
+  while (f.time() < ttot)
+    f.step();
+  bench b;
+  b.time = (wall_time() - start);
+  b.gridsteps = ttot * a * 2 * gridpts;
+
+  double sum = 0;
+  for (dft_chunk *cur = dft.chunks; cur; cur = cur->next_in_dft)
+    for (size_t i = 0; i < cur->N * cur->omega.size(); ++i)
+      sum += norm(cur->dft[i]);
+  *dftsum = sum_to_all(sum);
+  return b;
+}
+
 #define showbench(name, bb)                                                                        \
   {                                                                                                \
     bench b = bb;                                                                                  \
@@ -308,6 +341,20 @@ int main(int argc, char **argv) {
   showbench("2D TE 10x11 nonlinear ", bench_2d_te_nonlinear(10.0, 11.0, one));
   showbench("2D TE 10x11 ", bench_2d_te(10.0, 11.0, one));
 
+  const int dft_nfreqs[] = {1, 10, 100, 200, 400};
+  for (int i = 0; i < 5; ++i) {
+    const int nfreq = dft_nfreqs[i];
+    double sum_direct, sum_recurrence;
+    char name[64];
+    snprintf(name, 64, "2D DFT 6x4 nfreq=%d direct ", nfreq);
+    showbench(name, bench_2d_dft(6.0, 4.0, nfreq, false, &sum_direct));
+    snprintf(name, 64, "2D DFT 6x4 nfreq=%d recurrence ", nfreq);
+    showbench(name, bench_2d_dft(6.0, 4.0, nfreq, true, &sum_recurrence));
+    if (fabs(sum_direct - sum_recurrence) > 1e-8 * fabs(sum_direct))
+      meep::abort("DFT kernels disagree for nfreq=%d: %g vs. %g\n", nfreq, sum_direct,
+                  sum_recurrence);
+  }
+
   master_printf("\nnote: 1 Mgs = 1 million grid point time steps\n");
 
   return 0;
@@ -30,6 +30,39 @@ double two(const vec &) { return 2.0; }
 
 const int EHcomp[10] = {0, 1, 0, 1, 2, 3, 4, 3, 4, 5};
 
+/* Check the far fields that get_farfields_array computes in blocks of points (from the
+   near-field sources of each process, summed over the processes) against the far
+   fields at each point from farfield_lowlevel, on a line of far points. */
+int check_farfields_array(dft_near2far &n2f, const volume &where, double resolution) {
+  int rank;
+  size_t dims[3], N;
+  double *EH = n2f.get_farfields_array(where, rank, dims, N, resolution);
+  const size_t Nfreq = n2f.freq.size();
+  complex<double> *EH_ = new complex<double>[6 * Nfreq];
+  complex<double> *EH0 = new complex<double>[6 * Nfreq];
+  double diff = 0.0, dot = 0.0;
+  for (size_t idx = 0; idx < N; ++idx) {
+    vec x = where.get_min_corner() +
+            (where.get_max_corner() - where.get_min_corner()) * (idx / (N - 1.0));
+    n2f.farfield_lowlevel(EH_, x);
+    sum_to_all(EH_, EH0, 6 * Nfreq);
+    for (size_t i = 0; i < Nfreq; ++i)
+      for (int k = 0; k < 6; ++k) {
+        complex<double> F(EH[((k * 2 + 0) * N + idx) * Nfreq + i],
+                          EH[((k * 2 + 1) * N + idx) * Nfreq + i]);
+        diff += norm(F - EH0[i * 6 + k]);
+        dot += norm(EH0[i * 6 + k]);
+      }
+  }
+  delete[] EH0;
+  delete[] EH_;
+  delete[] EH;
+  double relerr = sqrt(diff / dot);
+
+  master_printf("  FARFIELDS ARRAY: %zd points: relerr = %g\n", N, relerr);
+  return N > 1 && relerr < 1e-12;
+}
+
 int check_cyl(double sr, double sz, double a) {
   const double dpml = 1.0;
   grid_volume gv = volcyl(sr + dpml, dpml + sz + dpml, a);
@@ -110,6 +143,8 @@ int check_cyl(double sr, double sz, double a) {
     return 0;
   }
 
+  if (!check_farfields_array(n2f, volume(veccyl(0, 10.0 / w), veccyl(sr, 10.0 / w)), 8)) return 0;
+
   return 1;
 }
 
@@ -244,6 +279,10 @@ int check_2d_3d(ndim dim, const double xmax, double a, component c0, component c
     }
   }
 
+  vec xf0 = dim == D2 ? vec(xmax, 0.5 * xmax) : vec(xmax, 0.5 * xmax, 0.3 * xmax), xf1 = xf0;
+  xf1.set_direction(X, 2 * xmax);
+  if (!check_farfields_array(n2f, volume(xf0, xf1), 10)) return 0;
+
   return 1;
 }
 